@@ -0,0 +1,388 @@
+"""
+Benchmark suite over synthetic stories (see storygen.py).
+
+Each benchmark runs --repeat times on the same generated story and reports
+its min and median wall time plus the median per operation. Results are
+written as JSON stamped with the git commit and the generator options, so two
+runs can be compared:
+
+    python bench.py --nodes 20000 --out before.json
+    ... change something ...
+    python bench.py --nodes 20000 --out after.json --compare before.json
+
+With --compare, benchmarks that got slower by more than --threshold are
+reported and the exit code is 1 (handy in CI).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import narranode as engine
+import storycache
+import storygen
+
+FORMAT_VERSION = 1
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.10    # Slower than the baseline by more than this is a regression
+LIST_ROWS = 30              # Visible rows of the headless node list
+
+# Filter strings typed into the editor's list box: none, prefix, substring, short substring
+LIST_FILTERS = ("", "^node_1", "node_12", "de_", "e_9")
+
+
+class _HeadlessListbox:
+    """Stand-in for nodelist.VirtualListbox without a display: slices out the visible rows."""
+    def __init__(self, rows=LIST_ROWS):
+        self.rows = rows
+        self.items = []
+        self.visible = []
+        self.selected = None
+
+    def set_items(self, items):
+        self.items = items
+        self.visible = list(items[0:self.rows])
+
+
+class _FilterText:
+    def __init__(self, text=""):
+        self.text = text
+
+    def get(self):
+        return self.text
+
+
+# --- BENCHMARKS ---
+# Each one prepares its inputs and returns (run, operations): run() is what
+# gets timed, and operations is what the per-op figure divides by.
+def bench_load_from_json(ctx):
+    tree = engine.DialogueTree()
+    return (lambda: tree.load_from_json(ctx["path"])), len(ctx["tree"].nodes)
+
+
+def bench_load_cached(ctx):
+    """A full load from a current story cache (written by the warm-up run)."""
+    tree = engine.DialogueTree()
+    return (lambda: tree.load_from_json(ctx["path"], cache=True)), len(ctx["tree"].nodes)
+
+
+def bench_save_to_json(ctx):
+    path = os.path.join(ctx["workdir"], "saved.json")
+    return (lambda: ctx["tree"].save_to_json(path)), len(ctx["tree"].nodes)
+
+
+GET_NODE_PASSES = 20    # Lookups are too quick to time in a single pass
+
+
+def bench_get_node(ctx):
+    tree = ctx["tree"]
+    ids = list(tree.nodes)
+    random.Random(0).shuffle(ids)
+
+    def run():
+        get_node = tree.get_node
+        for _ in range(GET_NODE_PASSES):
+            for node_id in ids:
+                get_node(node_id)
+    return run, len(ids) * GET_NODE_PASSES
+
+
+def bench_traversal(ctx):
+    """Breadth-first walk of every reachable node through get_node()/targets()."""
+    tree = ctx["tree"]
+    start = next(iter(tree.nodes))
+
+    def run():
+        seen = {start}
+        queue = [start]
+        for node_id in queue:
+            for target in tree.get_node(node_id).targets():
+                if target not in seen and target in tree.nodes:
+                    seen.add(target)
+                    queue.append(target)
+        return len(seen)
+    return run, len(tree.nodes)
+
+
+def _choice_logic(tree, key):
+    return [choice[key] for node in tree.nodes.values() for choice in node.choices if choice[key]]
+
+
+def bench_check_requirements(ctx):
+    tree = ctx["tree"]
+    requirements = _choice_logic(tree, "requirements")
+
+    def run():
+        tree.state = tree.initial_state.copy()
+        check = tree.check_requirements
+        for reqs in requirements:
+            check(reqs)
+    return run, max(1, len(requirements))
+
+
+def bench_apply_effects(ctx):
+    tree = ctx["tree"]
+    effects = _choice_logic(tree, "effects")
+
+    def run():
+        tree.state = tree.initial_state.copy()
+        apply = tree.apply_effects
+        for changes in effects:
+            apply(changes)
+    return run, max(1, len(effects))
+
+
+def bench_refresh_list(ctx):
+    """The editor's refresh_list() for a few filters, on a headless list widget."""
+    import editor     # tkinter imports fine without a display; only creating windows needs one
+    import nodelist
+
+    app = editor.NodeEditorApp.__new__(editor.NodeEditorApp)
+    app.tree = ctx["tree"]
+    app.node_index = nodelist.NodeIndex(app.tree.nodes)
+    app.node_list = _HeadlessListbox()
+    app.filter_var = _FilterText()
+
+    def run():
+        for text in LIST_FILTERS:
+            app.filter_var.text = text
+            app.refresh_list()
+    return run, len(LIST_FILTERS)
+
+
+def bench_layout_full(ctx):
+    import visualizer
+    return (lambda: visualizer.StoryLayout().full_layout(ctx["tree"])), len(ctx["tree"].nodes)
+
+
+def bench_layout_update(ctx):
+    """Incremental re-layout after one new node is linked in, and again once it is removed."""
+    import visualizer
+    tree = ctx["tree"]
+    layout = visualizer.StoryLayout()
+    layout.full_layout(tree)
+    anchor = next(iter(tree.nodes))
+    changes = []
+    tree.edge_listeners.append(lambda *change: changes.append(change))
+
+    def run():
+        node = engine.DialogueNode("bench_new_node", "Narrator", "Inserted.")
+        tree.add_node(node)
+        tree.add_choice(anchor, "Bench link", node.node_id)
+        layout.update(tree, changes=changes)
+        # Undo the edit so every repeat starts from the same story
+        tree.get_node(anchor).choices.pop()
+        tree.get_node(anchor).compiled_choices.pop()
+        tree.mark_dirty(anchor)
+        tree.remove_node(node.node_id)
+        layout.update(tree, changes=changes)
+        changes.clear()
+    return run, 1
+
+
+# --- STARTUP ---
+# Timed in a fresh interpreter, as a player or the editor would start them
+def _run_script(args, until=None):
+    """
+    Starts python with args in this folder and reads its output until until(line)
+    is true, then stops it. Without until, waits for it to exit.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen([sys.executable, "-u", *args], cwd=here, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, text=True)
+    try:
+        for line in process.stdout:
+            if until is not None and until(line):
+                return
+        if until is not None:
+            raise RuntimeError(f"'{' '.join(args)}' exited before printing what was waited for")
+    finally:
+        process.kill()
+        process.wait()
+        process.stdin.close()
+        process.stdout.close()
+
+
+def _first_dialogue(path):
+    """Starts the CLI engine on path and returns once it shows its first line of dialogue."""
+    seen_stats = []
+
+    def shown(line):
+        if line.startswith("STATS: "):
+            seen_stats.append(line)
+        return bool(seen_stats) and line.startswith("[")
+    _run_script(["narranode.py", path], until=shown)
+
+
+def bench_startup_cold(ctx):
+    """CLI engine start to first dialogue with no story cache: parses the JSON, then writes the cache."""
+    path = ctx["path"]
+
+    def run():
+        storycache.StoryCache(path).clear()
+        _first_dialogue(path)
+    return run, 1
+
+
+def bench_startup_warm(ctx):
+    """CLI engine start to first dialogue from the story cache (written by the warm-up run)."""
+    return (lambda: _first_dialogue(ctx["path"])), 1
+
+
+def bench_import_editor(ctx):
+    """Importing the editor in a fresh interpreter (the map's networkx/matplotlib load on first use)."""
+    return (lambda: _run_script(["-c", "import editor"])), 1
+
+
+BENCHMARKS = {
+    "load_from_json": bench_load_from_json,
+    "load_cached": bench_load_cached,
+    "save_to_json": bench_save_to_json,
+    "get_node": bench_get_node,
+    "traversal": bench_traversal,
+    "check_requirements": bench_check_requirements,
+    "apply_effects": bench_apply_effects,
+    "refresh_list": bench_refresh_list,
+    "layout_full": bench_layout_full,
+    "layout_update": bench_layout_update,
+    "startup_cold": bench_startup_cold,
+    "startup_warm": bench_startup_warm,
+    "import_editor": bench_import_editor,
+}
+
+
+# --- RUNNER ---
+def _git_commit():
+    """(commit hash, has uncommitted changes), or (None, None) outside a git checkout."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=here, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=here,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def _time(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run_suite(options, names=None, repeat=DEFAULT_REPEAT, progress=None):
+    """Runs the named benchmarks (default: all) on one generated story. Returns the results dict."""
+    names = list(names or BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    commit, dirty = _git_commit()
+    report = {
+        "format": FORMAT_VERSION,
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "generator": dict(storygen.DEFAULTS, **options),
+        "repeat": repeat,
+        "results": {},
+    }
+
+    workdir = tempfile.mkdtemp(prefix="narranode_bench_")
+    try:
+        data = storygen.generate_data(**options)
+        path = os.path.join(workdir, "story.json")
+        with open(path, "w") as f:
+            json.dump(data, f)
+        ctx = {"path": path, "workdir": workdir, "tree": storygen.generate_story(**options)}
+
+        for name in names:
+            run, operations = BENCHMARKS[name](ctx)
+            run()   # Warm-up: imports, compile caches, file cache
+            timings = _time(run, repeat)
+            median = statistics.median(timings)
+            report["results"][name] = {
+                "operations": operations,
+                "min_s": min(timings),
+                "median_s": median,
+                "per_op_us": median / operations * 1e6,
+            }
+            if progress:
+                progress(name, report["results"][name])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """[(name, baseline median, new median, ratio, regressed), ...] for benchmarks in both."""
+    rows = []
+    for name, result in report["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        ratio = result["median_s"] / before["median_s"] if before["median_s"] else float("inf")
+        rows.append((name, before["median_s"], result["median_s"], ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark NarraNode on a synthetic story.")
+    storygen.add_arguments(parser)
+    parser.set_defaults(nodes=20000)
+    parser.add_argument("--only", help=f"Comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--out", help="Write the JSON results here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="Results JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown ratio above which a benchmark counts as a regression")
+    args = parser.parse_args(argv)
+
+    options = storygen.options_from_args(args)
+    names = [name.strip() for name in args.only.split(",")] if args.only else None
+    progress = lambda name, r: print(f"[Bench] {name:20s} {r['median_s'] * 1000:10.2f} ms "
+                                     f"({r['per_op_us']:.2f} us/op)", file=sys.stderr)
+    try:
+        report = run_suite(options, names, max(1, args.repeat), progress)
+    except ValueError as e:
+        parser.error(str(e))
+
+    text = json.dumps(report, indent=4)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"[Bench] Results written to {args.out}", file=sys.stderr)
+    else:
+        print(text)
+
+    if not args.compare:
+        return 0
+    with open(args.compare, "r") as f:
+        baseline = json.load(f)
+    if baseline.get("generator") != report["generator"]:
+        print("[Bench] Warning: baseline used different generator options; ratios are not comparable",
+              file=sys.stderr)
+    regressions = 0
+    for name, before, after, ratio, regressed in compare(report, baseline, args.threshold):
+        regressions += regressed
+        marker = "  <-- REGRESSION" if regressed else ""
+        print(f"[Compare] {name:20s} {before * 1000:10.2f} ms -> {after * 1000:10.2f} ms "
+              f"({ratio:.2f}x){marker}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import sys
+from collections import namedtuple
+from types import MappingProxyType
+
+import conditions
+
+# One shared, read-only mapping used in place of every empty effects/requirements dict
+EMPTY_MAPPING = MappingProxyType({})
+
+# Tuple-based choice: no per-instance __dict__, fields in the same order as the JSON dict,
+# plus the precompiled check(state) / apply(state) functions (shared via the conditions cache)
+Choice = namedtuple("Choice", ["text", "next_id", "effects", "requirements", "check", "apply"])
+
+
+class CompactNode:
+    """
+    Slotted, read-only-by-convention version of DialogueNode for loaded stories.
+    Choices are a tuple of Choice tuples.
+    """
+    __slots__ = ("node_id", "speaker", "text", "next_node_id", "choices")
+
+    def __init__(self, node_id, speaker, text, next_node_id=None, choices=()):
+        self.node_id = node_id
+        self.speaker = speaker
+        self.text = text
+        self.next_node_id = next_node_id
+        self.choices = choices
+
+    def __repr__(self):
+        return f"CompactNode({self.node_id!r}, {self.speaker!r}, choices={len(self.choices)})"
+
+
+class Compactor:
+    """
+    Builds CompactNodes while sharing objects between them: node IDs, speaker
+    names and stat keys are interned, and identical lines of text and
+    effect/requirement mappings are stored once.
+    """
+    def __init__(self):
+        self._mappings = {}
+        self._texts = {}
+
+    def intern(self, value):
+        if type(value) is str:
+            return sys.intern(value)
+        return value
+
+    def text(self, value):
+        """The first equal string seen (repeated lines like "Continue." share one object)."""
+        return self._texts.setdefault(value, value)
+
+    def mapping(self, data):
+        """Returns a shared read-only mapping equal to data."""
+        if not data:
+            return EMPTY_MAPPING
+        items = tuple((self.intern(k), v) for k, v in data.items())
+        try:
+            key = frozenset(items)
+        except TypeError:
+            # Unhashable values (hand-edited JSON): store unshared
+            return MappingProxyType(dict(items))
+        shared = self._mappings.get(key)
+        if shared is None:
+            shared = self._mappings[key] = MappingProxyType(dict(items))
+        return shared
+
+    def choice(self, choice):
+        effects = self.mapping(choice.get("effects"))
+        requirements = self.mapping(choice.get("requirements"))
+        return Choice(
+            self.text(choice["text"]),
+            self.intern(choice["next_id"]),
+            effects,
+            requirements,
+            conditions.compile_requirements(requirements),
+            conditions.compile_effects(effects),
+        )
+
+    def node_from_dict(self, node_data):
+        """Builds a CompactNode straight from a to_dict()/JSON node dictionary."""
+        return CompactNode(
+            self.intern(node_data["ID"]),
+            self.intern(node_data["Speaker"]),
+            self.text(node_data["Text"]),
+            self.intern(node_data.get("NextNode")),
+            tuple(self.choice(c) for c in node_data["Choices"]),
+        )
+
+    def node(self, node):
+        """Converts a DialogueNode (or anything with the same attributes)."""
+        return CompactNode(
+            self.intern(node.node_id),
+            self.intern(node.speaker),
+            self.text(node.text),
+            self.intern(node.next_node_id),
+            tuple(self.choice(c) for c in node.choices),
+        )
+
+
+def compact_nodes(nodes):
+    """Converts a {node_id: DialogueNode} dict into {node_id: CompactNode}."""
+    compactor = Compactor()
+    return {compactor.intern(node_id): compactor.node(node) for node_id, node in nodes.items()}
+
+
+def node_to_dict(node):
+    """The to_dict()/JSON form of a CompactNode (plain dicts, safe to pickle or dump)."""
+    return {
+        "ID": node.node_id,
+        "Speaker": node.speaker,
+        "Text": node.text,
+        "NextNode": node.next_node_id,
+        "Choices": [
+            {"text": c.text, "next_id": c.next_id,
+             "effects": dict(c.effects), "requirements": dict(c.requirements)}
+            for c in node.choices
+        ],
+    }
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    Approximate memory footprint of obj and everything it references, in bytes.
+    Objects reachable more than once (shared) are only counted once.
+    """
+    if seen is None:
+        seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+
+        if isinstance(item, (dict, MappingProxyType)):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+
+        if hasattr(item, "__dict__") and not isinstance(item, type):
+            stack.append(vars(item))
+        slots = getattr(type(item), "__slots__", ())
+        if isinstance(slots, str):
+            slots = (slots,)
+        for slot in slots:
+            if hasattr(item, slot):
+                stack.append(getattr(item, slot))
+    return total
+
+
+def bytes_per_node(nodes):
+    """Average deep size per node of a {node_id: node} dict, shared objects counted once."""
+    if not nodes:
+        return 0
+    return deep_sizeof(nodes) / len(nodes)
+
+
+class _BaselineNode:
+    """DialogueNode as it was before it had __slots__ or compiled choices: the "before" of the report."""
+    def __init__(self, node_id, speaker, text, next_node_id=None):
+        self.node_id = node_id
+        self.speaker = speaker
+        self.text = text
+        self.next_node_id = next_node_id
+        self.choices = []
+
+
+def _baseline_nodes(nodes):
+    """Unslotted replicas of nodes, each choice a fresh dict with its own effects/requirements."""
+    replicas = {}
+    for node_id, node in nodes.items():
+        replica = _BaselineNode(node.node_id, node.speaker, node.text, next_node_id=node.next_node_id)
+        for choice in node.choices:
+            replica.choices.append({
+                "text": choice["text"],
+                "next_id": choice["next_id"],
+                "effects": dict(choice["effects"]),
+                "requirements": dict(choice["requirements"]),
+            })
+        replicas[node_id] = replica
+    return replicas
+
+
+def _build_sample_tree(node_count):
+    """
+    A synthetic story with a few speakers, stats and mostly-empty choice logic,
+    round-tripped through a JSON file so strings are as fresh as load_from_json makes them.
+    """
+    import json
+    import os
+    import tempfile
+    import narranode as engine
+
+    speakers = ["Narrator", "Marcus", "Elena", "Guard"]
+    stats = ["gold", "hp", "intellect"]
+    nodes = {}
+    for i in range(node_count):
+        choices = []
+        for j in range(2):
+            choices.append({
+                "text": f"Option {j}",
+                "next_id": f"node_{(i + j + 1) % node_count}",
+                "effects": {stats[i % 3]: -1} if (i + j) % 5 == 0 else {},
+                "requirements": {stats[(i + 1) % 3]: 2} if (i + j) % 7 == 0 else {},
+            })
+        nodes[f"node_{i}"] = {
+            "ID": f"node_{i}",
+            "Speaker": speakers[i % len(speakers)],
+            "Text": f"Line of dialogue number {i}.",
+            "NextNode": None,
+            "Choices": choices,
+        }
+
+    fd, path = tempfile.mkstemp(suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump({"initial_state": {}, "nodes": nodes}, f)
+        tree = engine.DialogueTree()
+        tree.load_from_json(path)
+    finally:
+        os.remove(path)
+    return tree
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tree = _build_sample_tree(count)
+    before = bytes_per_node(_baseline_nodes(tree.nodes))
+    current = bytes_per_node(tree.nodes)
+    after = bytes_per_node(compact_nodes(tree.nodes))
+    print(f"[Memory] {count} nodes")
+    print(f"   Unslotted node: {before:8.1f} bytes/node")
+    print(f"   DialogueNode:   {current:8.1f} bytes/node ({current / before:.0%} of unslotted)")
+    print(f"   CompactNode:    {after:8.1f} bytes/node ({after / before:.0%} of unslotted)")
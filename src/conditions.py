@@ -0,0 +1,347 @@
+"""
+Requirement / effect language, compiled once into plain Python functions.
+
+Requirements (all entries must hold):
+    {"gold": 5}                     gold >= 5 (the original form)
+    {"gold": "<= 5"}                any of >=, <=, >, <, ==, != followed by a number
+    {"has_key": true}               flag is set (non-zero); false means unset
+    {"$if": "gold >= 5 and (has_key or not banished)"}
+                                    full expression: and/or/not (or &&, ||, !),
+                                    parentheses, comparisons and bare flags
+
+Effects:
+    {"gold": -5}                    add (the original form)
+    {"gold": "+= 5"} / "-= 5"       add / subtract
+    {"rank": "= 3"}                 set
+    {"has_key": true}               set flag (1 / 0)
+
+Missing stats read as 0 everywhere. compile_requirements() and
+compile_effects() return cached functions of the state dict, so the hot path
+does no parsing and no dict walking. The cache keeps the CACHE_SIZE most
+recently used mappings, so an editing session can't grow it without bound.
+Numbers must be finite: nan and inf are rejected when a mapping is compiled.
+"""
+import math
+import re
+from collections import OrderedDict
+
+EXPRESSION_KEY = "$if"
+
+_COMPARATORS = (">=", "<=", "==", "!=", ">", "<")
+_TOKEN = re.compile(r"\s*(?:(\d+(?:\.\d*)?|\.\d+)|(>=|<=|==|!=|>|<|&&|\|\||!|\(|\))|([A-Za-z_][\w.]*))")
+_KEYWORDS = {"and": "and", "or": "or", "not": "not", "&&": "and", "||": "or", "!": "not"}
+
+CACHE_SIZE = 4096
+
+_cache = OrderedDict()    # Cache key -> compiled function or analysis, least recently used first
+
+
+class ConditionError(ValueError):
+    """Raised for requirements/effects that can't be parsed."""
+
+
+# --- PARSING ---
+def _finite(value, text):
+    try:
+        finite = math.isfinite(value)
+    except OverflowError:   # An integer too big for a float (e.g. 1e400 written out in full)
+        finite = False
+    if not finite:
+        raise ConditionError(f"Expected a finite number, got '{text}'")
+    return value
+
+
+def _literal(text):
+    """Number or true/false -> a Python literal for generated code."""
+    lowered = text.strip().lower()
+    if lowered == "true":
+        return "1"
+    if lowered == "false":
+        return "0"
+    try:
+        value = float(lowered)
+    except ValueError:
+        raise ConditionError(f"Expected a number or true/false, got '{text}'")
+    _finite(value, text.strip())
+    return repr(int(value)) if value.is_integer() and "." not in lowered else repr(value)
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if not match:
+            raise ConditionError(f"Unexpected '{expression[pos:].strip()}' in condition '{expression}'")
+        number, symbol, name = match.groups()
+        if number is not None:
+            tokens.append(("num", number))
+        elif symbol is not None:
+            tokens.append(("op", _KEYWORDS.get(symbol, symbol)))
+        elif name.lower() in _KEYWORDS or name.lower() in ("true", "false"):
+            tokens.append(("op", name.lower()) if name.lower() in _KEYWORDS else ("num", name.lower()))
+        else:
+            tokens.append(("name", name))
+        pos = match.end()
+    return tokens
+
+
+class _ExpressionCompiler:
+    """Recursive-descent parser that emits Python source for one expression."""
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+
+    def compile(self):
+        source = self._or()
+        if self.pos != len(self.tokens):
+            raise ConditionError(f"Unexpected '{self.tokens[self.pos][1]}' in condition '{self.expression}'")
+        return source
+
+    def _peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _take(self, kind=None, value=None):
+        token = self._peek()
+        if token[0] is None or (kind and token[0] != kind) or (value and token[1] != value):
+            raise ConditionError(f"Incomplete condition '{self.expression}'")
+        self.pos += 1
+        return token
+
+    def _or(self):
+        parts = [self._and()]
+        while self._peek() == ("op", "or"):
+            self.pos += 1
+            parts.append(self._and())
+        return parts[0] if len(parts) == 1 else "(" + " or ".join(parts) + ")"
+
+    def _and(self):
+        parts = [self._not()]
+        while self._peek() == ("op", "and"):
+            self.pos += 1
+            parts.append(self._not())
+        return parts[0] if len(parts) == 1 else "(" + " and ".join(parts) + ")"
+
+    def _not(self):
+        if self._peek() == ("op", "not"):
+            self.pos += 1
+            return f"(not {self._not()})"
+        return self._atom()
+
+    def _operand(self):
+        kind, value = self._take()
+        if kind == "name":
+            return f"g({value!r}, 0)"
+        if kind == "num":
+            return _literal(value)
+        raise ConditionError(f"Unexpected '{value}' in condition '{self.expression}'")
+
+    def _atom(self):
+        if self._peek() == ("op", "("):
+            self.pos += 1
+            inner = self._or()
+            self._take("op", ")")
+            return inner
+        left = self._operand()
+        kind, value = self._peek()
+        if kind == "op" and value in _COMPARATORS:
+            self.pos += 1
+            return f"({left} {value} {self._operand()})"
+        # A bare stat (or literal) is a flag test
+        return f"({left} != 0)"
+
+
+def _requirement_source(stat, value):
+    if stat == EXPRESSION_KEY:
+        return _ExpressionCompiler(str(value)).compile()
+    read = f"g({stat!r}, 0)"
+    if isinstance(value, bool):
+        return f"({read} {'!=' if value else '=='} 0)"
+    if isinstance(value, (int, float)):
+        return f"({read} >= {_finite(value, value)!r})"
+    text = str(value).strip()
+    for op in _COMPARATORS:
+        if text.startswith(op):
+            return f"({read} {op} {_literal(text[len(op):])})"
+    # A plain number in a string keeps the original ">=" meaning
+    return f"({read} >= {_literal(text)})"
+
+
+def _number(text):
+    literal = _literal(text)
+    try:
+        return int(literal)
+    except ValueError:
+        return float(literal)
+
+
+def _parse_effect(value):
+    """("add" | "set", amount) for one effect value."""
+    if isinstance(value, bool):
+        return "set", 1 if value else 0
+    if isinstance(value, (int, float)):
+        return "add", _finite(value, value)
+    text = str(value).strip()
+    if text.startswith("+="):
+        return "add", _number(text[2:])
+    if text.startswith("-="):
+        return "add", -_number(text[2:])
+    if text.startswith("="):
+        return "set", _number(text[1:])
+    return "add", _number(text)
+
+
+def _effect_source(stat, value):
+    kind, amount = _parse_effect(value)
+    if kind == "set":
+        return f"s[{stat!r}] = {amount!r}"
+    return f"s[{stat!r}] = g({stat!r}, 0) + {amount!r}"
+
+
+# --- COMPILATION ---
+def _always_true(state):
+    return True
+
+
+def _no_effects(state):
+    return state
+
+
+def _cache_key(kind, mapping):
+    try:
+        # Type is part of the key: True (flag set) and 1 (>= 1) hash alike but differ
+        return (kind, frozenset((k, type(v), v) for k, v in mapping.items()))
+    except TypeError:
+        return None
+
+
+def _cached(key):
+    value = _cache.get(key)
+    if value is not None:
+        try:
+            _cache.move_to_end(key)
+        except KeyError:
+            pass    # Evicted by another thread in between
+    return value
+
+
+def _remember(key, value):
+    _cache[key] = value
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def _build(source, name):
+    namespace = {}
+    exec(compile(source, f"<narranode {name}>", "exec"), namespace)
+    return namespace[name]
+
+
+def compile_requirements(requirements):
+    """Returns check(state) -> bool for a requirements mapping (cached per distinct mapping)."""
+    if not requirements:
+        return _always_true
+    key = _cache_key("req", requirements)
+    check = _cached(key) if key else None
+    if check is None:
+        clauses = [_requirement_source(stat, value) for stat, value in requirements.items()]
+        source = "def check(s):\n    g = s.get\n    return " + " and ".join(clauses) + "\n"
+        check = _build(source, "check")
+        if key:
+            _remember(key, check)
+    return check
+
+
+def compile_effects(effects):
+    """Returns apply(state) -> state for an effects mapping (cached per distinct mapping)."""
+    if not effects:
+        return _no_effects
+    key = _cache_key("eff", effects)
+    apply = _cached(key) if key else None
+    if apply is None:
+        lines = [_effect_source(stat, value) for stat, value in effects.items()]
+        source = "def apply(s):\n    g = s.get\n" + "".join(f"    {line}\n" for line in lines) + "    return s\n"
+        apply = _build(source, "apply")
+        if key:
+            _remember(key, apply)
+    return apply
+
+
+def is_simple_requirements(requirements):
+    """True for the original {"stat": number} (>=) form."""
+    return all(type(v) in (int, float) for v in requirements.values())
+
+
+def is_simple_effects(effects):
+    """True for the original {"stat": number} (add) form."""
+    return all(type(v) in (int, float) for v in effects.values())
+
+
+# --- ANALYSIS ---
+def requirement_tests(requirements):
+    """
+    ((stat, op, number), ...) for every stat a requirements mapping reads, e.g.
+    {"gold": 5} -> (("gold", ">=", 5),). op is None when the stat's effect on the
+    result can't be reduced to one comparison with a constant (comparisons
+    between two stats, or anything under "not"), so callers must treat it exactly.
+    Cached per distinct mapping, like compile_requirements().
+    """
+    if not requirements:
+        return ()
+    key = _cache_key("req-tests", requirements)
+    tests = _cached(key) if key else None
+    if tests is None:
+        tests = tuple(_requirement_tests(requirements))
+        if key:
+            _remember(key, tests)
+    return tests
+
+
+def _requirement_tests(requirements):
+    tests = []
+    for stat, value in requirements.items():
+        if stat != EXPRESSION_KEY:
+            if isinstance(value, bool):
+                tests.append((stat, "!=" if value else "==", 0))
+            elif isinstance(value, (int, float)):
+                tests.append((stat, ">=", value))
+            else:
+                text = str(value).strip()
+                op = next((op for op in _COMPARATORS if text.startswith(op)), None)
+                tests.append((stat, op, _number(text[len(op):])) if op else (stat, ">=", _number(text)))
+            continue
+
+        tokens = _tokenize(str(value))
+        negated = ("op", "not") in tokens
+        flipped = {">=": "<=", "<=": ">=", ">": "<", "<": ">", "==": "==", "!=": "!="}
+        for i, (kind, name) in enumerate(tokens):
+            if kind != "name":
+                continue
+            before = tokens[i - 2:i] if i >= 2 else []
+            after = tokens[i + 1:i + 3]
+            if negated:
+                tests.append((name, None, None))
+            elif len(after) == 2 and after[0][1] in _COMPARATORS and after[1][0] == "num":
+                tests.append((name, after[0][1], _number(after[1][1])))
+            elif len(before) == 2 and before[1][1] in _COMPARATORS and before[0][0] == "num":
+                tests.append((name, flipped[before[1][1]], _number(before[0][1])))
+            elif (after and after[0][1] in _COMPARATORS) or (before and before[-1][1] in _COMPARATORS):
+                tests.append((name, None, None))
+            else:
+                tests.append((name, "!=", 0))
+    return tests
+
+
+def effect_updates(effects):
+    """((stat, "add" | "set", amount), ...) for an effects mapping (cached per distinct mapping)."""
+    if not effects:
+        return ()
+    key = _cache_key("eff-updates", effects)
+    updates = _cached(key) if key else None
+    if updates is None:
+        updates = tuple((stat,) + _parse_effect(value) for stat, value in effects.items())
+        if key:
+            _remember(key, updates)
+    return updates
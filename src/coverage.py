@@ -0,0 +1,235 @@
+"""
+Coverage reports from playthrough traces (see traces.py).
+
+Merges any number of trace files, written by `narranode.py --trace DIR` or
+`simulator.py --trace-dir DIR`, into one Coverage. Files are split across a
+process pool in batches, and each worker returns one partial Coverage, so the
+parent only merges counters. Against the story, the report lists:
+    - node and choice coverage, and what was never visited or taken
+    - the most common openings (first --depth nodes of each session)
+    - drop-off points: where sessions stopped without reaching an ending
+
+    python coverage.py story.json traces/ [more dirs or files] [--json] [--render coverage.svg]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter
+
+import events
+import narranode as engine
+import traces
+
+DEFAULT_PATH_DEPTH = 8      # Nodes per session counted as its "path" (full paths are nearly all unique)
+FILES_PER_TASK = 1024
+
+# Everything except reaching an ending counts as dropping off
+DROP_OFF_OUTCOMES = (traces.OUTCOME_DEAD_END, traces.OUTCOME_MISSING,
+                     traces.OUTCOME_MAX_STEPS, traces.OUTCOME_QUIT)
+
+
+class Coverage:
+    """Mergeable counters over traced sessions."""
+    def __init__(self, path_depth=DEFAULT_PATH_DEPTH):
+        self.path_depth = path_depth
+        self.files = 0
+        self.sessions = 0
+        self.node_visits = Counter()
+        self.choices_taken = Counter()  # (node_id, choice index) -> times taken
+        self.paths = Counter()          # first path_depth node IDs -> sessions
+        self.outcomes = Counter()
+        self.drop_offs = Counter()      # node_id -> sessions that stopped there without an ending
+        self.bad_files = []
+
+    def add_session(self, steps, outcome):
+        self.sessions += 1
+        self.outcomes[outcome] += 1
+        node_visits = self.node_visits
+        choices_taken = self.choices_taken
+        for node_id, index in steps:
+            node_visits[node_id] += 1
+            if index is not None:
+                choices_taken[(node_id, index)] += 1
+        self.paths[tuple(node_id for node_id, _ in steps[:self.path_depth])] += 1
+        if outcome in DROP_OFF_OUTCOMES and steps:
+            self.drop_offs[steps[-1][0]] += 1
+
+    def add_file(self, path):
+        try:
+            for steps, outcome in traces.read_sessions(path):
+                self.add_session(steps, outcome)
+        except (OSError, traces.TraceError) as e:
+            self.bad_files.append(f"{path}: {e}")
+            return
+        self.files += 1
+
+    def merge(self, other):
+        self.files += other.files
+        self.sessions += other.sessions
+        self.node_visits.update(other.node_visits)
+        self.choices_taken.update(other.choices_taken)
+        self.paths.update(other.paths)
+        self.outcomes.update(other.outcomes)
+        self.drop_offs.update(other.drop_offs)
+        self.bad_files.extend(other.bad_files)
+        return self
+
+    # --- AGAINST A STORY ---
+    def uncovered_nodes(self, tree):
+        return [node_id for node_id in tree.nodes if not self.node_visits[node_id]]
+
+    def uncovered_choices(self, tree):
+        """[(node_id, choice index), ...] never taken in any traced session."""
+        return [(node_id, index) for node_id, node in tree.nodes.items()
+                for index in range(len(node.choices)) if not self.choices_taken[(node_id, index)]]
+
+    def overlay(self, tree):
+        """
+        Visit counts in the shape visualizer.draw_story(coverage=...) takes:
+        {"nodes": {node_id: visits}, "edges": {(source_id, target_id): times followed}}.
+        Linear links count as followed once per visit to their source.
+        """
+        edges = Counter()
+        for node_id, node in tree.nodes.items():
+            if node.next_node_id and not node.choices:
+                edges[(node_id, node.next_node_id)] += self.node_visits[node_id]
+            for index, choice in enumerate(node.choices):
+                edges[(node_id, choice["next_id"])] += self.choices_taken[(node_id, index)]
+        return {"nodes": dict(self.node_visits), "edges": dict(edges)}
+
+    def report(self, tree, top=10):
+        uncovered_nodes = self.uncovered_nodes(tree)
+        uncovered_choices = self.uncovered_choices(tree)
+        total_choices = sum(len(node.choices) for node in tree.nodes.values())
+        unknown = sorted(node_id for node_id in self.node_visits if node_id not in tree.nodes)
+        return {
+            "files": self.files,
+            "sessions": self.sessions,
+            "outcomes": dict(self.outcomes),
+            "node_coverage": 1 - len(uncovered_nodes) / len(tree.nodes) if tree.nodes else 1.0,
+            "choice_coverage": 1 - len(uncovered_choices) / total_choices if total_choices else 1.0,
+            "uncovered_nodes": uncovered_nodes,
+            "uncovered_choices": [[node_id, index, tree.nodes[node_id].choices[index]["text"]]
+                                  for node_id, index in uncovered_choices],
+            "common_paths": [[list(path), count] for path, count in self.paths.most_common(top)],
+            "drop_offs": [[node_id, count, round(count / self.node_visits[node_id], 4)]
+                          for node_id, count in self.drop_offs.most_common(top)],
+            "unknown_nodes": unknown,   # Traced, but no longer in the story
+            "bad_files": self.bad_files,
+        }
+
+
+def summary(report, top=10):
+    lines = [f"Sessions: {report['sessions']} from {report['files']} trace file(s)",
+             "Outcomes: " + ", ".join(f"{k}={v}" for k, v in sorted(report["outcomes"].items())),
+             f"Node coverage:   {report['node_coverage']:.1%} ({len(report['uncovered_nodes'])} never visited)",
+             f"Choice coverage: {report['choice_coverage']:.1%} ({len(report['uncovered_choices'])} never taken)"]
+    for node_id in report["uncovered_nodes"][:top]:
+        lines.append(f"   never visited: {node_id}")
+    for node_id, index, text in report["uncovered_choices"][:top]:
+        lines.append(f"   never taken:   {node_id} choice {index + 1} '{text}'")
+    lines.append("Most common paths:")
+    for path, count in report["common_paths"]:
+        lines.append(f"   {count:8d}  {' -> '.join(path)}")
+    lines.append("Drop-off points (sessions that stopped there, share of visits):")
+    for node_id, count, rate in report["drop_offs"]:
+        lines.append(f"   {node_id}: {count} ({rate:.1%})")
+    if report["unknown_nodes"]:
+        lines.append(f"Traced nodes missing from the story: {', '.join(report['unknown_nodes'][:top])}")
+    for problem in report["bad_files"][:top]:
+        lines.append(f"Skipped {problem}")
+    return "\n".join(lines)
+
+
+# --- PARALLEL MERGE ---
+def find_traces(paths):
+    """Trace files in the given files/directories (directories are searched recursively)."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        stack = [path]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        stack.append(entry.path)
+                    elif entry.name.endswith(traces.TRACE_SUFFIX):
+                        yield entry.path
+
+
+def _merge_files(task):
+    files, path_depth = task
+    coverage = Coverage(path_depth)
+    for path in files:
+        coverage.add_file(path)
+    return coverage
+
+
+def _batches(files, size):
+    batch = []
+    for path in files:
+        batch.append(path)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def merge_traces(paths, workers=None, path_depth=DEFAULT_PATH_DEPTH, files_per_task=FILES_PER_TASK):
+    """
+    Coverage over every trace file under paths.
+    workers=1 merges in-process; otherwise a pool of `workers` (default: CPU count).
+    """
+    workers = workers or os.cpu_count() or 1
+    tasks = ((batch, path_depth) for batch in _batches(find_traces(paths), files_per_task))
+    coverage = Coverage(path_depth)
+    if workers == 1:
+        for task in tasks:
+            coverage.merge(_merge_files(task))
+        return coverage
+    with multiprocessing.Pool(workers) as pool:
+        for partial in pool.imap_unordered(_merge_files, tasks):
+            coverage.merge(partial)
+    return coverage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Node/choice coverage from playthrough traces.")
+    parser.add_argument("story")
+    parser.add_argument("traces", nargs="+", help="Trace files or directories")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument("--depth", type=int, default=DEFAULT_PATH_DEPTH, help="Nodes per common path")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    parser.add_argument("--render", metavar="IMAGE", help="Also render a coverage map (.svg/.png/.pdf)")
+    args = parser.parse_args(argv)
+    # With --json, stdout carries only the JSON document
+    events.enable_console(sys.stderr if args.json else None)
+
+    tree = engine.DialogueTree()
+    if not tree.load_from_json(args.story):
+        return 1
+    started = time.perf_counter()
+    coverage = merge_traces(args.traces, workers=args.workers, path_depth=args.depth)
+    elapsed = time.perf_counter() - started
+    report = coverage.report(tree, top=args.top)
+
+    if args.json:
+        print(json.dumps(report, indent=4))
+    else:
+        print(summary(report, top=args.top))
+        print(f"[System] Merged {coverage.files} trace file(s) in {elapsed:.2f}s")
+    if args.render:
+        import visualizer
+        visualizer.render_story(tree, args.render, coverage=coverage.overlay(tree))
+        print(f"[System] Rendered {args.render}", file=sys.stderr if args.json else sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,33 +1,78 @@
 import tkinter as tk
-from tkinter import messagebox, simpledialog, Toplevel
+from tkinter import messagebox, simpledialog, ttk, Toplevel
 import json
+import os
+import sys
+import conditions
+import events
+import history
+import jobs
 import narranode as engine
-import visualizer as visualizer
+import journal
+import nodelist
+import pathfinder
+import project
+import search
+import validation
 
 class NodeEditorApp:
-    def __init__(self, root):
+    def __init__(self, root, story_path=None, history_limit=history.DEFAULT_LIMIT):
         self.root = root
         self.root.title("NarraNode Editor")
-        self.root.geometry("800x500")
+        self.root.geometry("900x600")
 
         self.tree = engine.DialogueTree()
+        # A story file (saved through its journal) or a project directory of chapter files
+        filename = story_path or "scripts/story_data.json"
+        if os.path.isdir(filename):
+            self.journal = project.StoryProject(filename)
+        else:
+            self.journal = journal.StoryJournal(filename)
+        # Re-checks only the nodes each edit touches (see validation.py)
+        self.validator = validation.StoryValidator(self.tree)
         self.current_node_id = None # Track what we are editing
+        # Undo/redo: every edit below goes through self.history (see history.py)
+        self.history = history.History(self.tree, history_limit)
+        self.map_layout = None      # Story map layout, loaded from its cache file on first use
+        self.map_changes = None     # Link edits since map_layout was last updated (None until a map is asked for)
+        # Saving, loading, checking, map layout and search indexing run off the Tk thread (see jobs.py)
+        self.jobs = jobs.JobRunner(root, on_progress=self.show_progress)
+        self.editing = True
+
+        # --- STATUS BAR (background jobs) ---
+        self.status_frame = tk.Frame(root)
+        self.status_frame.pack(side="bottom", fill="x")
+        self.status_label = tk.Label(self.status_frame, text="", anchor="w")
+        self.status_label.pack(side="left", fill="x", expand=True, padx=5)
+        self.cancel_button = tk.Button(self.status_frame, text="Cancel", command=self.jobs.cancel, state="disabled")
+        self.cancel_button.pack(side="right", padx=5)
+        self.progress_bar = ttk.Progressbar(self.status_frame, length=150, maximum=1.0)
+        self.progress_bar.pack(side="right", padx=5)
 
         # --- LEFT PANEL (List) ---
         self.left_frame = tk.Frame(root, width=250, bg="#e0e0e0")
         self.left_frame.pack(side="left", fill="y")
         
         tk.Label(self.left_frame, text="Nodes List", bg="#e0e0e0").pack(pady=5)
-        
-        # Add Scrollbar to list
-        self.list_scroll = tk.Scrollbar(self.left_frame)
-        self.list_scroll.pack(side="right", fill="y")
-        
-        self.node_listbox = tk.Listbox(self.left_frame, yscrollcommand=self.list_scroll.set)
-        self.node_listbox.pack(fill="both", expand=True, padx=5)
-        self.list_scroll.config(command=self.node_listbox.yview)
-        
-        self.node_listbox.bind('<<ListboxSelect>>', self.load_selected_node)
+
+        # Filter box: substring match, or prefix match when it starts with "^"
+        tk.Label(self.left_frame, text="Filter (^ = prefix):", bg="#e0e0e0").pack(anchor="w", padx=5)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", lambda *args: self.refresh_list())
+        tk.Entry(self.left_frame, textvariable=self.filter_var).pack(fill="x", padx=5, pady=(0, 5))
+
+        # Sorted ID index, kept in sync with the tree one node at a time
+        self.node_index = nodelist.NodeIndex(self.tree.nodes)
+        self.tree.edge_listeners.append(self.on_tree_edges)
+
+        # Virtualized list: only the visible rows are real Listbox entries
+        self.node_list = nodelist.VirtualListbox(self.left_frame, on_select=self.show_node)
+        self.node_list.pack(fill="both", expand=True, padx=5)
+
+        # Full-text search (index is built on first use, then updated per edit)
+        self.search_index = None
+        tk.Button(self.left_frame, text="Search Text...", command=self.open_search_window).pack(fill="x", padx=5, pady=5)
+        tk.Button(self.left_frame, text="How to Reach?", command=self.open_path_window).pack(fill="x", padx=5, pady=(0, 5))
         
         # --- RIGHT PANEL (Editor) ---
         self.right_frame = tk.Frame(root, padx=20, pady=20)
@@ -60,13 +105,39 @@ class NodeEditorApp:
         tk.Button(self.btn_frame, text="Save Node", command=self.save_node, bg="#dddddd").pack(side="left", padx=5)
         tk.Button(self.btn_frame, text="Clear", command=self.clear_fields, bg="#f0f0f0").pack(side="left", padx=5)
         tk.Button(self.btn_frame, text="Delete", command=self.delete_node, bg="#ffb3ba").pack(side="left", padx=5)
+        tk.Button(self.btn_frame, text="Rename", command=self.rename_node, bg="#f0f0f0").pack(side="left", padx=5)
         tk.Button(self.btn_frame, text="Manage Choices", command=self.open_choice_window, bg="#add8e6").pack(side="left", padx=5)
 
         # --- NEW BUTTONS ---
         tk.Button(self.btn_frame, text="Show Map", command=self.show_graph, bg="#ffcccb").pack(side="left", padx=5)
+        tk.Button(self.btn_frame, text="Map Around Node", command=self.show_neighborhood, bg="#ffcccb").pack(side="left", padx=5)
         tk.Button(self.btn_frame, text="Global Variables", command=self.open_variables_window, bg="#c5e1a5").pack(side="left", padx=5)
 
         tk.Button(self.btn_frame, text="Export JSON", command=self.export_json).pack(side="right")
+        tk.Button(self.btn_frame, text="Redo", command=self.redo).pack(side="right", padx=5)
+        tk.Button(self.btn_frame, text="Undo", command=self.undo).pack(side="right")
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
+        self.root.bind("<Control-Z>", self.redo)    # Ctrl+Shift+Z
+
+        # Live validation (dangling links, unreachable nodes, dead ends); double-click to open
+        tk.Label(self.right_frame, text="Problems:").pack(anchor="w")
+        self.issue_listbox = tk.Listbox(self.right_frame, height=5)
+        self.issue_listbox.pack(fill="both", expand=True)
+        self.issue_listbox.bind('<Double-Button-1>', self.open_issue_node)
+        self.issue_nodes = []
+
+        # Let background saves and journal compaction finish before the process exits
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Opened with a path: start from what is on disk (read in the background)
+        if story_path:
+            self.load_story()
+
+    def on_close(self):
+        self.jobs.shutdown()
+        self.journal.wait()
+        self.root.destroy()
 
     def save_node(self):
         """Saves current fields to the node object."""
@@ -83,33 +154,76 @@ class NodeEditorApp:
         existing_node = self.tree.get_node(node_id)
 
         if existing_node:
-            # Update existing
-            existing_node.speaker = speaker
-            existing_node.text = text
-            existing_node.next_node_id = next_node  # Update linear flow
+            # Update existing (speaker, text and linear flow)
             # We DO NOT overwrite choices here, so they stay safe
+            self.history.edit_node(node_id, speaker, text, next_node)
         else:
             # Create new
             new_node = engine.DialogueNode(node_id, speaker, text, next_node_id=next_node)
-            self.tree.add_node(new_node)
+            self.history.add_node(new_node)
 
         self.current_node_id = node_id
         self.refresh_list()
+        self.select_in_list(node_id)
+        self.refresh_issues()
         messagebox.showinfo("Saved", f"Node '{node_id}' updated.")
 
     def refresh_list(self):
-        self.node_listbox.delete(0, tk.END)
-        for node_id in self.tree.nodes:
-            self.node_listbox.insert(tk.END, node_id)
-
-    def load_selected_node(self, event):
-        selection = self.node_listbox.curselection()
-        if not selection: return
-
-        node_id = self.node_listbox.get(selection[0])
+        """Re-applies the filter and redraws the visible rows (no full reinsert)."""
+        self.node_list.set_items(self.node_index.search(self.filter_var.get().strip()))
+
+    def on_tree_edges(self, node_id, old_targets, new_targets):
+        """Tree listener: keeps the ID index in step with added/removed nodes, and notes edits for the map."""
+        if self.map_changes is not None:
+            self.map_changes.append((node_id, old_targets, new_targets))
+        if node_id is None:
+            self.node_index = nodelist.NodeIndex(self.tree.nodes)
+        elif node_id in self.tree.nodes:
+            self.node_index.add(node_id)
+        else:
+            self.node_index.remove(node_id)
+
+    def select_in_list(self, node_id):
+        """Highlights node_id in the list and scrolls to it (if the filter shows it)."""
+        items = self.node_list.items
+        index = items.position(node_id) if items else None
+        self.node_list.select(node_id, index)
+
+    def refresh_issues(self, limit=200):
+        """Lists the validator's current findings, sorted out on the worker from a frozen copy."""
+        snapshot = self.tree.snapshot()
+        validator = self.validator.frozen(snapshot)
+        self.jobs.submit("Checking story", lambda job: validator.issues()[:limit], key="validate",
+                         on_done=lambda issues: self._issues_checked(validator, snapshot, issues))
+
+    def _issues_checked(self, validator, snapshot, issues):
+        # Reachability worked out on the worker is kept up to date from here on, edit by edit
+        self.validator.adopt_reachable(validator, snapshot)
+        self.show_issues(issues)
+
+    def show_issues(self, issues):
+        """Fills the problems list (dead ends are endings, listed last)."""
+        self.issue_listbox.delete(0, tk.END)
+        self.issue_nodes = []
+        for kind, node_id, detail in issues:
+            self.issue_listbox.insert(tk.END, f"[{kind}] {node_id}: {detail}")
+            self.issue_nodes.append(node_id)
+
+    def open_issue_node(self, event):
+        selection = self.issue_listbox.curselection()
+        if selection:
+            self.show_node(self.issue_nodes[selection[0]])
+
+    def show_node(self, node_id):
+        """Fills the editor fields from a node."""
         self.current_node_id = node_id
         node = self.tree.get_node(node_id)
 
+        # In a project, new nodes join the chapter being worked on
+        if isinstance(self.tree.nodes, project.ShardedNodes):
+            self.tree.nodes.default_chapter = self.tree.nodes.chapter_of(node_id)
+            self.root.title(f"NarraNode Editor - {self.tree.nodes.default_chapter}")
+
         # Clear & Fill
         self.entry_id.delete(0, tk.END)
         self.entry_id.insert(0, node.node_id)
@@ -133,7 +247,7 @@ class NodeEditorApp:
         self.entry_next_node.delete(0, tk.END)
         self.current_node_id = None
         # Deselect any selected item in the listbox
-        self.node_listbox.selection_clear(0, tk.END)
+        self.node_list.clear_selection()
 
     def delete_node(self):
         """Deletes the currently selected node after confirmation."""
@@ -141,24 +255,136 @@ class NodeEditorApp:
             messagebox.showwarning("Warning", "Please select a node to delete.")
             return
 
-        # Confirm deletion
+        # Confirm deletion (warn about links that will be left dangling)
+        referrers = self.tree.referrers_of(self.current_node_id)
+        warning = f"\n\n{len(referrers)} node(s) link here: {', '.join(map(str, referrers[:5]))}" if referrers else ""
         confirm = messagebox.askyesno("Confirm Delete",
-                                      f"Are you sure you want to delete node '{self.current_node_id}'?")
+                                      f"Are you sure you want to delete node '{self.current_node_id}'?{warning}")
         if not confirm:
             return
 
         # Remove from tree
-        if self.current_node_id in self.tree.nodes:
-            del self.tree.nodes[self.current_node_id]
+        if self.history.delete_node(self.current_node_id):
             messagebox.showinfo("Deleted", f"Node '{self.current_node_id}' deleted.")
 
             # Clear fields and refresh
             self.clear_fields()
             self.refresh_list()
+            self.refresh_issues()
+
+    def rename_node(self):
+        """Renames the selected node and rewrites every link that pointed at it."""
+        if not self.current_node_id:
+            messagebox.showwarning("Warning", "Please select a node to rename.")
+            return
+
+        new_id = simpledialog.askstring("Rename Node", f"New ID for '{self.current_node_id}':")
+        if not new_id or not new_id.strip():
+            return
+        try:
+            rewritten = self.history.rename_node(self.current_node_id, new_id.strip())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        self.refresh_list()
+        self.select_in_list(new_id.strip())
+        self.refresh_issues()
+        self.show_node(new_id.strip())
+        messagebox.showinfo("Renamed", f"Node renamed; {len(rewritten)} referring node(s) updated.")
+
+    def undo(self, event=None):
+        if self.editing:
+            self._show_step(self.history.undo(), "Undid")
+
+    def redo(self, event=None):
+        if self.editing:
+            self._show_step(self.history.redo(), "Redid")
+
+    def _show_step(self, step, verb):
+        """Refreshes the views after an undo/redo and shows the node it touched."""
+        if step is None:
+            self.root.bell()
+            return
+        self.refresh_list()
+        self.refresh_issues()
+        if step.node_id is not None and step.node_id in self.tree.nodes:
+            self.select_in_list(step.node_id)
+            self.show_node(step.node_id)
+        else:
+            self.clear_fields()
+        self.root.title(f"NarraNode Editor - {verb} {step.label}")
 
     def export_json(self):
-        self.tree.save_to_json()
-        messagebox.showinfo("Export", "Saved to scripts/story_data.json")
+        # Only changed nodes are written, from a snapshot, on the worker; edits made meanwhile
+        # stay pending for the next save. The journal is compacted in the background too.
+        snapshot = self.tree.snapshot(take_changes=True)
+        self.jobs.submit("Saving", lambda job: self.journal.save(snapshot), cancellable=False,
+                         on_done=lambda count: messagebox.showinfo("Export", f"Saved to {self.journal.filename}"),
+                         on_error=lambda e: self._save_failed(snapshot, e))
+
+    def _save_failed(self, snapshot, error):
+        self.tree.restore_changes(snapshot)
+        messagebox.showerror("Error", f"Saving {self.journal.filename} failed: {error}")
+
+    # --- BACKGROUND LOAD ---
+    def load_story(self):
+        """Reads the story and builds its indexes on the worker, then swaps it in; edits wait."""
+        self.set_editing(False)
+        self.jobs.submit("Loading story", self._load_job, self.journal, cancellable=False,
+                         on_done=self._install_story, on_error=self._load_failed)
+
+    @staticmethod
+    def _load_job(job, story_journal):
+        tree = engine.DialogueTree()
+        if not story_journal.load(tree):
+            return None
+        job.progress(0.7, "Checking story")
+        validator = validation.StoryValidator(tree)
+        validator.reachable     # Worked out here once; edits then only extend it
+        job.progress(0.85, "Sorting node list")
+        return tree, validator, nodelist.NodeIndex(tree.nodes)
+
+    def _install_story(self, loaded):
+        self.set_editing(True)
+        if loaded is None:
+            return      # Nothing on disk yet: this is a new story
+        tree, validator, node_index = loaded
+        # Results computed from the empty story are stale now
+        for key in ("validate", "search", "map"):
+            self.jobs.cancel(key)
+        self.validator.detach()
+        if self.search_index is not None:
+            self.search_index.detach()
+            self.search_index = None
+        tree.edge_listeners.append(self.on_tree_edges)
+        self.tree, self.validator, self.node_index = tree, validator, node_index
+        self.map_layout = self.map_changes = None   # Laid out for the story that was open before
+        self.history = history.History(tree, self.history.limit)
+        self.refresh_list()
+        self.refresh_issues()
+
+    def _load_failed(self, error):
+        self.set_editing(True)
+        messagebox.showerror("Error", f"Loading {self.journal.filename} failed: {error}")
+
+    def set_editing(self, enabled):
+        """Turns the edit buttons on or off (off while a load is replacing the story)."""
+        self.editing = enabled
+        for button in self.btn_frame.winfo_children():
+            button.config(state="normal" if enabled else "disabled")
+
+    def show_progress(self, job):
+        """JobRunner callback: the job in progress in the status bar (None when idle)."""
+        if job is None:
+            self.status_label.config(text="")
+            self.progress_bar["value"] = 0
+            self.cancel_button.config(state="disabled")
+            return
+        queued = len(self.jobs.pending) - 1
+        self.status_label.config(text=f"{job.message}..." + (f" ({queued} more queued)" if queued else ""))
+        self.progress_bar["value"] = job.fraction
+        self.cancel_button.config(state="normal" if job.cancellable else "disabled")
 
     def open_choice_window(self):
         if not self.current_node_id:
@@ -196,12 +422,12 @@ class NodeEditorApp:
         c_next.pack()
 
         # Effects Field
-        tk.Label(win, text="Effects (JSON) e.g. {'gold': -5}").pack()
+        tk.Label(win, text="Effects (JSON) e.g. {'gold': -5} or {'has_key': true}").pack()
         c_effects = tk.Entry(win)
         c_effects.pack()
 
         # NEW: Requirements Field
-        tk.Label(win, text="Requirements (JSON) e.g. {'gold': 10}").pack()
+        tk.Label(win, text="Requirements (JSON) e.g. {'gold': 10} or {'$if': 'gold >= 10 and not banished'}").pack()
         c_reqs = tk.Entry(win) # <--- The new input box
         c_reqs.pack()
 
@@ -230,13 +456,19 @@ class NodeEditorApp:
             if real_effects is None or real_reqs is None:
                 return
 
-            # Add to Backend
-            node.add_choice(
-                txt, 
-                nxt, 
-                effects=real_effects, 
-                requirements=real_reqs # <--- Pass it to logic
-            )
+            # Add to Backend (conditions are compiled here, so typos show up now, not in play)
+            try:
+                self.history.add_choice(
+                    node.node_id,
+                    txt, 
+                    nxt, 
+                    effects=real_effects, 
+                    requirements=real_reqs # <--- Pass it to logic
+                )
+            except conditions.ConditionError as e:
+                messagebox.showerror("Error", f"Invalid condition: {e}")
+                return
+            self.refresh_issues()
             
             # Refresh list
             req_display = " [LOCKED]" if real_reqs else ""
@@ -250,18 +482,149 @@ class NodeEditorApp:
 
         tk.Button(win, text="Add Choice", command=add_choice_action, bg="#90ee90").pack(pady=10)
 
-    def show_graph(self):
+    def show_graph(self, center=None, hops=2):
         """Passes the current tree to the visualizer module."""
         # Check if tree is empty
         if not self.tree.nodes:
             messagebox.showwarning("Empty", "No nodes to visualize!")
             return
 
+        # Layout and graph are worked out on the worker; only drawing happens here. The first
+        # map loads the cached layout and re-layers it all, later ones only catch up with the edits
+        changes = None
+        if self.map_layout is not None:
+            changes = list(self.map_changes)
+        else:
+            self.map_changes = []
+        self.jobs.submit("Laying out map", self._map_job, self.tree.snapshot(), self.map_layout,
+                         self.journal.filename, center, hops, changes, key="map",
+                         on_done=lambda story_map: self._draw_map(story_map, changes),
+                         on_error=lambda e: messagebox.showerror("Error", f"Graph failed: {e}"))
+
+    @staticmethod
+    def _map_job(job, snapshot, layout, story_path, center, hops, changes):
+        # networkx and matplotlib take longer to import than the rest of the editor
+        # together, so they are loaded the first time a map is asked for
+        job.progress(0.05, "Loading map tools")
+        import visualizer
+        cache_path = visualizer.layout_cache_path(story_path)
+        if layout is None:
+            layout = visualizer.StoryLayout.load(cache_path)
+        # Only the nodes below links edited since the last map are re-layered
+        story_map = visualizer.prepare_map(snapshot, layout, center, hops, changes)
+        job.progress(0.9, "Saving map layout")
+        layout.save(cache_path)
+        return story_map
+
+    def _draw_map(self, story_map, changes):
+        import visualizer   # Already loaded by _map_job
+        self.map_layout = story_map.layout
+        # Edits made while the job ran are kept for the next map
+        del self.map_changes[:len(changes or ())]
         try:
-            visualizer.visualize_story(self.tree)
+            visualizer.visualize_story(None, story_map=story_map)
         except Exception as e:
             messagebox.showerror("Error", f"Graph failed: {e}")
 
+    def show_neighborhood(self):
+        """Shows only the nodes within k links of the selected node."""
+        if not self.current_node_id:
+            messagebox.showwarning("Warning", "Please select a node first.")
+            return
+        hops = simpledialog.askinteger("Map Around Node", "Hops (links) to show:",
+                                       initialvalue=2, minvalue=1, maxvalue=20)
+        if hops:
+            self.show_graph(center=self.current_node_id, hops=hops)
+
+    def open_search_window(self):
+        """Searches dialogue text, choice text and speakers, e.g. speaker:Marcus amulet."""
+        if self.search_index is None and self.jobs.find("search") is None:
+            # Built over a snapshot on the worker, then caught up with edits made meanwhile
+            snapshot = self.tree.snapshot()
+            self.jobs.submit("Indexing text", lambda job: search.SearchIndex(snapshot), key="search",
+                             on_done=lambda index: self._install_search_index(index, snapshot))
+
+        win = Toplevel(self.root)
+        win.title("Search Dialogue")
+        win.geometry("600x400")
+
+        tk.Label(win, text='Query (words, "exact phrase", speaker:Name):').pack(anchor="w", padx=10, pady=5)
+        query_entry = tk.Entry(win)
+        query_entry.pack(fill="x", padx=10)
+
+        status = tk.Label(win, text="" if self.search_index else "Indexing...")
+        status.pack(anchor="w", padx=10)
+
+        result_list = tk.Listbox(win)
+        result_list.pack(fill="both", expand=True, padx=10, pady=5)
+        result_ids = []
+
+        def run_search(event=None):
+            result_list.delete(0, tk.END)
+            result_ids.clear()
+            if self.search_index is None:
+                status.config(text="Still indexing, try again in a moment")
+                return
+            results = self.search_index.search(query_entry.get(), limit=500)
+            for node_id in results:
+                result_list.insert(tk.END, self.search_index.snippet(node_id))
+                result_ids.append(node_id)
+            status.config(text=f"{len(results)} result(s)" + (" (first 500)" if len(results) == 500 else ""))
+
+        def open_result(event):
+            selection = result_list.curselection()
+            if selection:
+                self.show_node(result_ids[selection[0]])
+                self.select_in_list(result_ids[selection[0]])
+
+        query_entry.bind("<Return>", run_search)
+        result_list.bind("<Double-Button-1>", open_result)
+        tk.Button(win, text="Search", command=run_search, bg="#add8e6").pack(pady=5)
+        query_entry.focus_set()
+
+    def _install_search_index(self, index, snapshot):
+        index.attach(self.tree, snapshot)
+        self.search_index = index
+
+    def open_path_window(self):
+        """Finds playthroughs (respecting requirements and effects) that reach the selected node."""
+        if not self.current_node_id:
+            messagebox.showwarning("Warning", "Please select the node you want to reach.")
+            return
+
+        # Searched over a snapshot on the worker; the window opens with the result
+        target_id = self.current_node_id
+        snapshot = self.tree.snapshot()
+        self.jobs.submit(f"Finding paths to '{target_id}'",
+                         lambda job: pathfinder.find_paths(snapshot, target_id, all_paths=True, limit=5),
+                         key="paths", on_done=self.show_paths,
+                         on_error=lambda e: messagebox.showerror("Error", f"Path search failed: {e}"))
+
+    def show_paths(self, result):
+        target_id = result.target_id
+        win = Toplevel(self.root)
+        win.title(f"How to Reach '{target_id}'")
+        win.geometry("600x400")
+        tk.Label(win, text=f"{result.status} ({result.states_explored} states searched) - "
+                           "double-click a step to open it").pack(anchor="w", padx=10, pady=5)
+
+        step_list = tk.Listbox(win)
+        step_list.pack(fill="both", expand=True, padx=10, pady=5)
+        step_ids = []
+        for line in pathfinder.describe(result):
+            step_list.insert(tk.END, line)
+            # Step lines are indented "   <node_id> -> ..."
+            parts = line.split()
+            step_ids.append(parts[0] if line.startswith("   ") and parts[0] in self.tree.nodes else None)
+
+        def open_step(event):
+            selection = step_list.curselection()
+            if selection and step_ids[selection[0]]:
+                self.show_node(step_ids[selection[0]])
+                self.select_in_list(step_ids[selection[0]])
+
+        step_list.bind("<Double-Button-1>", open_step)
+
     def open_variables_window(self):
         """Opens a window to manage global state variables and their initial values."""
         # Create Pop-up Window
@@ -318,11 +681,8 @@ class NodeEditorApp:
                 messagebox.showerror("Error", "Value must be a number!")
                 return
 
-            # Add to initial state
-            self.tree.initial_state[name] = value
-            # Also update current state if it doesn't exist
-            if name not in self.tree.state:
-                self.tree.state[name] = value
+            # Add to initial state (and to the current state if it doesn't exist there yet)
+            self.history.set_variable(name, value)
 
             refresh_var_list()
 
@@ -347,12 +707,8 @@ class NodeEditorApp:
             if not confirm:
                 return
 
-            # Remove from initial state
-            if var_name in self.tree.initial_state:
-                del self.tree.initial_state[var_name]
-            # Also remove from current state
-            if var_name in self.tree.state:
-                del self.tree.state[var_name]
+            # Remove from initial state and the current state
+            self.history.delete_variable(var_name)
 
             refresh_var_list()
             messagebox.showinfo("Deleted", f"Variable '{var_name}' deleted.")
@@ -366,6 +722,8 @@ class NodeEditorApp:
 
 
 if __name__ == "__main__":
+    events.enable_console()
     root = tk.Tk()
-    app = NodeEditorApp(root)
+    # Optional story file or project directory to open
+    app = NodeEditorApp(root, sys.argv[1] if len(sys.argv) > 1 else None)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,426 @@
+"""
+Engine events: an observer interface on DialogueTree, plus built-in listeners.
+
+A listener is any object with one or more on_<event> methods:
+
+    on_node_entered(tree, node_id)
+    on_choice_shown(tree, node_id, index, choice)       play_story listed it as available
+    on_choice_locked(tree, node_id, index, choice)      play_story listed it as [LOCKED]
+    on_choice_taken(tree, node_id, index, choice)
+    on_effect_applied(tree, stat, change, value)        value: the stat after the change
+    on_loaded(tree, filename, node_count, seconds)
+    on_load_missing(tree, filename)
+    on_saved(tree, filename, node_count, seconds)
+    on_journaled(tree, path, node_count, seconds)
+    on_session_ended(tree, node_id, outcome)            outcome: one of traces.OUTCOMES
+    on_reloaded(tree, filename, node_count, seconds)    hot reload; node_count: nodes changed or removed
+
+tree.events.add(listener) subscribes every method the listener has. The hub
+keeps one handler list per event, and the engine only builds an event's
+arguments when that list is non-empty, so an event nobody listens to costs a
+single truthiness check.
+
+Nothing is printed unless a ConsoleListener is attached: CLIs call
+enable_console(), which attaches one to every DialogueTree created afterwards.
+"""
+import os
+import struct
+import sys
+import time
+from collections import Counter
+
+import varint
+
+NODE_ENTERED = "node_entered"
+CHOICE_SHOWN = "choice_shown"
+CHOICE_LOCKED = "choice_locked"
+CHOICE_TAKEN = "choice_taken"
+EFFECT_APPLIED = "effect_applied"
+LOADED = "loaded"
+LOAD_MISSING = "load_missing"
+SAVED = "saved"
+JOURNALED = "journaled"
+SESSION_ENDED = "session_ended"
+RELOADED = "reloaded"
+
+# Append new events at the end: BinaryTraceListener numbers them by position
+EVENTS = (NODE_ENTERED, CHOICE_SHOWN, CHOICE_LOCKED, CHOICE_TAKEN, EFFECT_APPLIED,
+          LOADED, LOAD_MISSING, SAVED, JOURNALED, SESSION_ENDED, RELOADED)
+
+# Listeners every new DialogueTree starts with (see enable_console)
+DEFAULT_LISTENERS = []
+
+
+class EventHub:
+    """Per-event handler lists, one attribute per event name."""
+    __slots__ = EVENTS + ("listeners",)
+
+    def __init__(self, listeners=()):
+        for event in EVENTS:
+            setattr(self, event, [])
+        self.listeners = []
+        for listener in listeners:
+            self.add(listener)
+
+    def add(self, listener):
+        if listener in self.listeners:
+            return listener
+        self.listeners.append(listener)
+        for event in EVENTS:
+            handler = getattr(listener, "on_" + event, None)
+            if handler is not None:
+                getattr(self, event).append(handler)
+        return listener
+
+    def remove(self, listener):
+        if listener not in self.listeners:
+            return
+        self.listeners.remove(listener)
+        for event in EVENTS:
+            handlers = getattr(self, event)
+            handlers[:] = [h for h in handlers if getattr(h, "__self__", None) is not listener]
+
+    def emit(self, event, *args):
+        """Calls every handler for event. Hot paths check the handler list themselves instead."""
+        for handler in getattr(self, event):
+            handler(*args)
+
+
+def enable_console(stream=None):
+    """
+    Makes DialogueTrees created from now on print engine messages (the CLI
+    behaviour). stream defaults to stdout; CLIs printing JSON pass sys.stderr.
+    """
+    if not any(isinstance(listener, ConsoleListener) for listener in DEFAULT_LISTENERS):
+        DEFAULT_LISTENERS.append(ConsoleListener(stream))
+
+
+# --- CONSOLE ---
+class ConsoleListener:
+    """The engine's classic stdout messages."""
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def _print(self, text):
+        print(text, file=self.stream or sys.stdout)
+
+    def on_effect_applied(self, tree, stat, change, value):
+        self._print(f"   >>> [Effect] {stat} changed by {change} (Now: {value})")
+
+    def on_loaded(self, tree, filename, node_count, seconds):
+        self._print(f"[System] Loaded {node_count} nodes from {filename}")
+
+    def on_load_missing(self, tree, filename):
+        self._print(f"[System] File '{filename}' not found.")
+
+    def on_saved(self, tree, filename, node_count, seconds):
+        self._print(f"\n[System] Saved {node_count} nodes to {filename}")
+
+    def on_journaled(self, tree, path, node_count, seconds):
+        self._print(f"[System] Journaled {node_count} changed nodes to {path}")
+
+    def on_reloaded(self, tree, filename, node_count, seconds):
+        self._print(f"[System] Reloaded {node_count} changed nodes from {filename} ({seconds * 1000:.1f} ms)")
+
+
+# --- COUNTERS ---
+class CounterListener:
+    """Counts events, node visits, locked choices and changes per stat."""
+    def __init__(self):
+        self.events = Counter()
+        self.node_visits = Counter()
+        self.locked = Counter()         # (node_id, choice index) -> times shown locked
+        self.stat_changes = Counter()
+        self.outcomes = Counter()
+
+    def on_node_entered(self, tree, node_id):
+        self.events[NODE_ENTERED] += 1
+        self.node_visits[node_id] += 1
+
+    def on_choice_shown(self, tree, node_id, index, choice):
+        self.events[CHOICE_SHOWN] += 1
+
+    def on_choice_locked(self, tree, node_id, index, choice):
+        self.events[CHOICE_LOCKED] += 1
+        self.locked[(node_id, index)] += 1
+
+    def on_choice_taken(self, tree, node_id, index, choice):
+        self.events[CHOICE_TAKEN] += 1
+
+    def on_effect_applied(self, tree, stat, change, value):
+        self.events[EFFECT_APPLIED] += 1
+        self.stat_changes[stat] += 1
+
+    def on_loaded(self, tree, filename, node_count, seconds):
+        self.events[LOADED] += 1
+
+    def on_saved(self, tree, filename, node_count, seconds):
+        self.events[SAVED] += 1
+
+    def on_journaled(self, tree, path, node_count, seconds):
+        self.events[JOURNALED] += 1
+
+    def on_reloaded(self, tree, filename, node_count, seconds):
+        self.events[RELOADED] += 1
+
+    def on_session_ended(self, tree, node_id, outcome):
+        self.events[SESSION_ENDED] += 1
+        self.outcomes[outcome] += 1
+
+    def to_dict(self, top=10):
+        return {
+            "events": dict(self.events),
+            "outcomes": dict(self.outcomes),
+            "top_nodes": self.node_visits.most_common(top),
+            "top_locked": [[node_id, index, n] for (node_id, index), n in self.locked.most_common(top)],
+            "stat_changes": dict(self.stat_changes),
+        }
+
+
+# --- LATENCY ---
+class Histogram:
+    """Log-scale latency histogram: bucket k counts durations in [2^(k-1), 2^k) microseconds."""
+    BUCKETS = 40
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds):
+        micros = int(seconds * 1e6)
+        self.counts[min(self.BUCKETS - 1, micros.bit_length())] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Upper bound (seconds) of the bucket holding the given fraction of samples."""
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bucket, n in enumerate(self.counts):
+            seen += n
+            if seen >= wanted:
+                return min(self.max, (1 << bucket) / 1e6)
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+
+class LatencyListener:
+    """
+    Histograms of load, save, journal and reload times, and of the time spent at each
+    node (from entering it to entering the next one: reading plus deciding).
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.histograms = {"load": Histogram(), "save": Histogram(), "journal": Histogram(),
+                           "reload": Histogram(), "node_dwell": Histogram()}
+        self._entered_at = None
+
+    def on_node_entered(self, tree, node_id):
+        now = self.clock()
+        if self._entered_at is not None:
+            self.histograms["node_dwell"].record(now - self._entered_at)
+        self._entered_at = now
+
+    def on_loaded(self, tree, filename, node_count, seconds):
+        self.histograms["load"].record(seconds)
+
+    def on_saved(self, tree, filename, node_count, seconds):
+        self.histograms["save"].record(seconds)
+
+    def on_journaled(self, tree, path, node_count, seconds):
+        self.histograms["journal"].record(seconds)
+
+    def on_reloaded(self, tree, filename, node_count, seconds):
+        self.histograms["reload"].record(seconds)
+
+    def to_dict(self):
+        return {name: histogram.to_dict() for name, histogram in self.histograms.items()}
+
+
+# --- BINARY TRACE ---
+# File: TRACE_MAGIC, then records of
+#     u8 event code, varint microseconds since the previous record, payload
+# Strings (node IDs, stats, filenames) are written once as a DEFINE record and
+# referred to by varint ID afterwards.
+TRACE_MAGIC = b"NNTRACE1"
+_DEFINE = 0
+_CODES = {event: code for code, event in enumerate(EVENTS, start=1)}
+_EVENT_FOR_CODE = {code: event for event, code in _CODES.items()}
+_DOUBLE = struct.Struct("<d")
+_FLUSH_BYTES = 64 * 1024
+
+
+class BinaryTraceListener:
+    """Appends every event to a compact binary log; read it back with read_trace()."""
+    def __init__(self, path, clock=time.perf_counter):
+        self.path = path
+        self.clock = clock
+        self.file = open(path, "wb")
+        self.file.write(TRACE_MAGIC)
+        self.buffer = bytearray()
+        self.strings = {}
+        self.last = clock()
+
+    def _string(self, text):
+        string_id = self.strings.get(text)
+        if string_id is None:
+            string_id = self.strings[text] = len(self.strings)
+            data = str(text).encode("utf-8")
+            self.buffer.append(_DEFINE)
+            varint.encode(string_id, self.buffer)
+            varint.encode(len(data), self.buffer)
+            self.buffer += data
+        return string_id
+
+    def _record(self, event):
+        now = self.clock()
+        self.buffer.append(_CODES[event])
+        varint.encode(max(0, int((now - self.last) * 1e6)), self.buffer)
+        self.last = now
+        if len(self.buffer) > _FLUSH_BYTES:
+            self.flush()
+
+    def _number(self, value):
+        if isinstance(value, float) and not value.is_integer():
+            self.buffer.append(1)
+            self.buffer += _DOUBLE.pack(value)
+        else:
+            self.buffer.append(0)
+            varint.encode_signed(int(value or 0), self.buffer)
+
+    def on_node_entered(self, tree, node_id):
+        string_id = self._string(node_id)
+        self._record(NODE_ENTERED)
+        varint.encode(string_id, self.buffer)
+
+    def _choice(self, event, node_id, index):
+        string_id = self._string(node_id)
+        self._record(event)
+        varint.encode(string_id, self.buffer)
+        varint.encode(index, self.buffer)
+
+    def on_choice_shown(self, tree, node_id, index, choice):
+        self._choice(CHOICE_SHOWN, node_id, index)
+
+    def on_choice_locked(self, tree, node_id, index, choice):
+        self._choice(CHOICE_LOCKED, node_id, index)
+
+    def on_choice_taken(self, tree, node_id, index, choice):
+        self._choice(CHOICE_TAKEN, node_id, index)
+
+    def on_effect_applied(self, tree, stat, change, value):
+        string_id = self._string(stat)
+        self._record(EFFECT_APPLIED)
+        varint.encode(string_id, self.buffer)
+        self._number(value if isinstance(value, (int, float)) else 0)
+
+    def _file_event(self, event, filename, node_count, seconds):
+        string_id = self._string(filename)
+        self._record(event)
+        varint.encode(string_id, self.buffer)
+        varint.encode(node_count, self.buffer)
+        varint.encode(int(seconds * 1e6), self.buffer)
+
+    def on_loaded(self, tree, filename, node_count, seconds):
+        self._file_event(LOADED, filename, node_count, seconds)
+
+    def on_load_missing(self, tree, filename):
+        self._file_event(LOAD_MISSING, filename, 0, 0)
+
+    def on_saved(self, tree, filename, node_count, seconds):
+        self._file_event(SAVED, filename, node_count, seconds)
+
+    def on_journaled(self, tree, path, node_count, seconds):
+        self._file_event(JOURNALED, path, node_count, seconds)
+
+    def on_reloaded(self, tree, filename, node_count, seconds):
+        self._file_event(RELOADED, filename, node_count, seconds)
+
+    def on_session_ended(self, tree, node_id, outcome):
+        node_ref, outcome_ref = self._string(node_id), self._string(outcome)
+        self._record(SESSION_ENDED)
+        varint.encode(node_ref, self.buffer)
+        varint.encode(outcome_ref, self.buffer)
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_trace(path):
+    """Yields (seconds since the trace started, event, args) for each record."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(TRACE_MAGIC):
+        raise ValueError(f"'{path}' is not a NarraNode trace")
+    strings = []
+    pos = len(TRACE_MAGIC)
+    clock = 0
+    decode = varint.decode
+    while pos < len(data):
+        code = data[pos]
+        pos += 1
+        if code == _DEFINE:
+            _, pos = decode(data, pos)
+            length, pos = decode(data, pos)
+            strings.append(data[pos:pos + length].decode("utf-8"))
+            pos += length
+            continue
+        event = _EVENT_FOR_CODE.get(code)
+        if event is None:
+            raise ValueError(f"Unknown trace record {code} at byte {pos - 1}")
+        delta, pos = decode(data, pos)
+        clock += delta
+        if event == NODE_ENTERED:
+            string_id, pos = decode(data, pos)
+            args = (strings[string_id],)
+        elif event in (CHOICE_SHOWN, CHOICE_LOCKED, CHOICE_TAKEN):
+            string_id, pos = decode(data, pos)
+            index, pos = decode(data, pos)
+            args = (strings[string_id], index)
+        elif event == EFFECT_APPLIED:
+            string_id, pos = decode(data, pos)
+            if data[pos]:
+                value = _DOUBLE.unpack_from(data, pos + 1)[0]
+                pos += 9
+            else:
+                value, pos = varint.decode_signed(data, pos + 1)
+            args = (strings[string_id], value)
+        elif event == SESSION_ENDED:
+            node_ref, pos = decode(data, pos)
+            outcome_ref, pos = decode(data, pos)
+            args = (strings[node_ref], strings[outcome_ref])
+        else:
+            string_id, pos = decode(data, pos)
+            node_count, pos = decode(data, pos)
+            micros, pos = decode(data, pos)
+            args = (strings[string_id], node_count, micros / 1e6)
+        yield clock / 1e6, event, args
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or not os.path.exists(sys.argv[1]):
+        print("Usage: python events.py <trace file>")
+        sys.exit(1)
+    for seconds, event, args in read_trace(sys.argv[1]):
+        print(f"{seconds:12.6f}  {event:15s} " + " ".join(map(str, args)))
@@ -0,0 +1,535 @@
+"""
+Streaming exporters for game engines (Unreal Engine 5 DataTables, Unity).
+
+Nodes flow one at a time through a generator pipeline, so memory stays flat
+however big the story is and export time grows linearly with it:
+
+    source   (chapter, node dict) pairs from a story JSON (parsed incrementally,
+             with its journal laid over it), a project directory (chapter by
+             chapter), a compiled .nnb, or a DialogueTree already in memory
+    rows     flat rows: a node table, plus a child table holding one row per
+             choice, named "<node ID>_<choice number>"
+    files    one set of files per group (the whole story, each chapter, or each
+             node ID prefix), split into numbered parts of at most max_rows nodes
+
+Formats:
+    ue5-csv    Nodes.csv, Choices.csv, Variables.csv (first column is the DataTable row name)
+    ue5-json   the same tables as DataTable JSON: [{"Name": row name, ...}, ...]
+    unity      one JsonUtility-friendly asset per group and part,
+               {"chapter", "nodes": [...], "choices": [...]}, plus index.json
+
+Effects and requirements are exported as JSON strings (DataTables and
+JsonUtility have no free-form maps). Loading a project or a journal keeps
+only the node IDs or changed nodes in memory, never the whole story.
+
+    python exporters.py story.json out/ --format ue5-csv [--max-rows 5000] [--split chapter|prefix]
+    python exporters.py my_story/ out/ --format unity          (a project: one asset per chapter)
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from collections import OrderedDict
+
+import events
+import narranode as engine
+import project
+
+FORMATS = ("ue5-csv", "ue5-json", "unity")
+SPLITS = ("none", "chapter", "prefix")
+CHUNK_SIZE = 1 << 20    # Bytes read at a time from story files
+MAX_OPEN_FILES = 64     # Output files kept open at once (others are reopened to append)
+
+NODE_COLUMNS = ("Name", "Speaker", "Text", "NextNode", "Chapter", "ChoiceCount")
+CHOICE_COLUMNS = ("Name", "Node", "Index", "Text", "NextNode", "Effects", "Requirements")
+VARIABLE_COLUMNS = ("Name", "Value")
+
+_UNSAFE = re.compile(r"[^\w.-]")
+
+
+class ExportError(ValueError):
+    """Raised for story files that can't be streamed (not JSON objects, unknown source)."""
+
+
+# --- INCREMENTAL JSON ---
+class _JsonStream:
+    """Reads a JSON document piece by piece: objects entry by entry, anything else whole."""
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ("" at the end of the file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ExportError(f"Expected '{char}' at character {self.pos} of the current chunk")
+        self.pos += 1
+
+    def value(self):
+        """Decodes one whole value, reading more of the file until it is complete."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if not self._fill():
+                    raise ExportError(f"Bad JSON: {e}")
+                continue
+            # A number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def keys(self):
+        """Yields each key of the object starting here; the caller reads its value before resuming."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == "}":
+                return
+            if separator != ",":
+                raise ExportError(f"Expected ',' or '}}' after the value of '{key}'")
+
+
+# --- SOURCES ---
+# Each source has nodes(), yielding (chapter, node dict), and initial_state,
+# which is complete once nodes() is exhausted.
+class _JsonSource:
+    """A story JSON plus its journal. Only changed nodes from the journal are held in memory."""
+    def __init__(self, filename):
+        self.filename = filename
+        self.initial_state = {}
+        self.group = os.path.splitext(os.path.basename(filename))[0]
+
+    def nodes(self):
+        overlay, journal_state = engine.read_journal_overlay(engine.journal_path(self.filename))
+        with open(self.filename, "r") as f:
+            stream = _JsonStream(f)
+            for key in stream.keys():
+                if key == "initial_state":
+                    self.initial_state = stream.value()
+                elif key == "nodes" and stream.peek() == "{":
+                    for node_id in stream.keys():
+                        yield from self._merged(node_id, stream.value(), overlay)
+                else:
+                    # Old format: the whole file is the node table (see load_from_json)
+                    yield from self._merged(key, stream.value(), overlay)
+        # Created since the last full save
+        for node_id, node_data in overlay.items():
+            if node_data is not None:
+                yield None, node_data
+        if journal_state is not None:
+            self.initial_state = journal_state
+
+    @staticmethod
+    def _merged(node_id, node_data, overlay):
+        if node_id in overlay:
+            node_data = overlay.pop(node_id)
+            if node_data is None:
+                return
+        yield None, node_data
+
+
+class _ProjectSource:
+    """
+    A project directory, chapter by chapter and node by node. A node ID defined
+    in two chapters stays with the first, as when loading (so the set of IDs
+    seen so far is the one thing kept per node).
+    """
+    def __init__(self, directory):
+        self.story_project = project.StoryProject(directory, workers=1)
+        self.initial_state = self.story_project.initial_state
+        self.group = os.path.basename(os.path.normpath(directory))
+
+    def nodes(self):
+        seen = set()
+        for chapter in self.story_project.chapters:
+            path = self.story_project.path(chapter)
+            if not os.path.exists(path):
+                continue
+            with open(path, "r") as f:
+                stream = _JsonStream(f)
+                for key in stream.keys():
+                    if key != "nodes":
+                        stream.value()
+                        continue
+                    for node_id in stream.keys():
+                        node_data = stream.value()
+                        if node_id not in seen:
+                            seen.add(node_id)
+                            yield os.path.splitext(chapter)[0], node_data
+
+
+class _CompiledSource:
+    """A compiled .nnb, read record by record from the memory map."""
+    def __init__(self, filename):
+        import storybin
+        self.story_file = storybin.StoryFile(filename)
+        self.initial_state = self.story_file.initial_state
+        self.group = os.path.splitext(os.path.basename(filename))[0]
+
+    def nodes(self):
+        with self.story_file:
+            for _, node_data in self.story_file.iter_node_dicts():
+                yield None, node_data
+
+
+class _TreeSource:
+    """A DialogueTree in memory (e.g. from the editor); project trees keep their chapters."""
+    def __init__(self, tree, group="story"):
+        self.tree = tree
+        self.initial_state = tree.initial_state
+        self.group = group
+
+    def nodes(self):
+        nodes = self.tree.nodes
+        chapter_of = nodes.chapter_of if isinstance(nodes, project.ShardedNodes) else None
+        for node_id, node in nodes.items():
+            chapter = chapter_of(node_id) if chapter_of else None
+            yield (os.path.splitext(chapter)[0] if chapter else None), node.to_dict()
+
+
+def open_source(story):
+    """A source for a story JSON, project directory, .nnb file or DialogueTree."""
+    if isinstance(story, engine.DialogueTree):
+        return _TreeSource(story)
+    if os.path.isdir(story):
+        return _ProjectSource(story)
+    if not os.path.exists(story):
+        raise ExportError(f"No story at '{story}'")
+    if story.endswith(".nnb"):
+        return _CompiledSource(story)
+    return _JsonSource(story)
+
+
+# --- ROWS ---
+def _json_text(value):
+    return json.dumps(value, separators=(",", ":")) if value else ""
+
+
+def node_row(node_data, chapter=None):
+    return {
+        "Name": node_data["ID"],
+        "Speaker": node_data.get("Speaker") or "",
+        "Text": node_data.get("Text") or "",
+        "NextNode": node_data.get("NextNode") or "",
+        "Chapter": chapter or "",
+        "ChoiceCount": len(node_data.get("Choices") or ()),
+    }
+
+
+def choice_rows(node_data):
+    """Child-table rows for a node's choices, in order."""
+    node_id = node_data["ID"]
+    for index, choice in enumerate(node_data.get("Choices") or ()):
+        yield {
+            "Name": f"{node_id}_{index + 1}",
+            "Node": node_id,
+            "Index": index + 1,
+            "Text": choice.get("text") or "",
+            "NextNode": choice.get("next_id") or "",
+            "Effects": _json_text(choice.get("effects")),
+            "Requirements": _json_text(choice.get("requirements")),
+        }
+
+
+# --- OUTPUT FILES ---
+class _Output:
+    """One output file: head before the first row, sep between rows, tail at the end."""
+    def __init__(self, path, head, sep, tail):
+        self.path = path
+        self.head = head
+        self.sep = sep
+        self.tail = tail
+        self.rows = 0
+        self.created = False
+
+
+class _Files:
+    """Appends rows to many output files while keeping at most max_open of them open."""
+    def __init__(self, max_open=MAX_OPEN_FILES):
+        self.max_open = max_open
+        self.outputs = {}
+        self.handles = OrderedDict()    # path -> open file, least recently used first
+        self.written = []               # Finished paths, in the order they were closed
+
+    def _handle(self, output):
+        f = self.handles.get(output.path)
+        if f is not None:
+            self.handles.move_to_end(output.path)
+            return f
+        if len(self.handles) >= self.max_open:
+            self.handles.popitem(last=False)[1].close()
+        f = self.handles[output.path] = open(output.path, "a" if output.created else "w",
+                                             encoding="utf-8", newline="")
+        output.created = True
+        return f
+
+    def write(self, path, text, head="", sep="", tail=""):
+        output = self.outputs.get(path)
+        if output is None:
+            output = self.outputs[path] = _Output(path, head, sep, tail)
+        f = self._handle(output)
+        f.write((output.sep if output.rows else output.head) + text)
+        output.rows += 1
+
+    def finish(self, path, tail=None):
+        """Writes the tail (or head + tail for a file with no rows) and closes the file."""
+        output = self.outputs.pop(path, None)
+        if output is None:
+            return
+        f = self._handle(output)
+        f.write(("" if output.rows else output.head) + (output.tail if tail is None else tail))
+        f.close()
+        del self.handles[path]
+        self.written.append(path)
+
+    def finish_all(self):
+        for path in list(self.outputs):
+            self.finish(path)
+
+
+class _CsvLines:
+    """Formats rows as CSV lines with one reused writer."""
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer, lineterminator="\n")
+
+    def line(self, values):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.writer.writerow(values)
+        return self.buffer.getvalue()
+
+
+# --- WRITERS ---
+class _TableWriter:
+    """UE5 DataTables: a node table and a choice table per group/part, as CSV or JSON."""
+    def __init__(self, directory, files, as_json):
+        self.directory = directory
+        self.files = files
+        self.as_json = as_json
+        self.extension = ".json" if as_json else ".csv"
+        self.csv = _CsvLines()
+        self._headers = {columns: self.csv.line(columns) for columns in (NODE_COLUMNS, CHOICE_COLUMNS, VARIABLE_COLUMNS)}
+        self._paths = {}
+
+    def _path(self, table, suffix):
+        path = self._paths.get((table, suffix))
+        if path is None:
+            path = self._paths[(table, suffix)] = os.path.join(self.directory, table + suffix + self.extension)
+        return path
+
+    def _write(self, table, suffix, row, columns):
+        path = self._path(table, suffix)
+        if self.as_json:
+            self.files.write(path, json.dumps(row, ensure_ascii=False), head="[\n", sep=",\n", tail="\n]\n")
+        else:
+            self.files.write(path, self.csv.line([row[column] for column in columns]),
+                             head=self._headers[columns])
+
+    def add_node(self, suffix, chapter, node_data):
+        self._write("Nodes", suffix, node_row(node_data, chapter), NODE_COLUMNS)
+        for row in choice_rows(node_data):
+            self._write("Choices", suffix, row, CHOICE_COLUMNS)
+
+    def finish_part(self, suffix):
+        for table in ("Nodes", "Choices"):
+            self.files.finish(self._path(table, suffix))
+
+    def finish(self, initial_state):
+        for name, value in initial_state.items():
+            self._write("Variables", "", {"Name": name, "Value": value}, VARIABLE_COLUMNS)
+        self.files.finish(self._path("Variables", ""))
+
+
+class _UnityWriter:
+    """
+    One asset per group/part. Choices are streamed to a side file and appended
+    after the node array when the part is finished, so neither is held in memory.
+    """
+    def __init__(self, directory, files):
+        self.directory = directory
+        self.files = files
+        self.assets = []        # (file name, chapter, nodes, choices) for index.json
+        self._counts = {}       # suffix -> [chapter, nodes, choices]
+
+    def _paths(self, suffix):
+        asset = os.path.join(self.directory, suffix.lstrip("_") + ".json")
+        return asset, asset + ".choices.tmp"
+
+    def add_node(self, suffix, chapter, node_data):
+        asset, side = self._paths(suffix)
+        counts = self._counts.get(suffix)
+        if counts is None:
+            counts = self._counts[suffix] = [chapter or "", 0, 0]
+        choices = list(choice_rows(node_data))
+        node = {"id": node_data["ID"], "speaker": node_data.get("Speaker") or "",
+                "text": node_data.get("Text") or "", "next": node_data.get("NextNode") or "",
+                "choiceStart": counts[2], "choiceCount": len(choices)}
+        head = '{"chapter": ' + json.dumps(counts[0]) + ', "nodes": [\n'
+        self.files.write(asset, json.dumps(node, ensure_ascii=False), head=head, sep=",\n")
+        for row in choices:
+            choice = {"node": row["Node"], "text": row["Text"], "next": row["NextNode"],
+                      "effects": row["Effects"], "requirements": row["Requirements"]}
+            self.files.write(side, json.dumps(choice, ensure_ascii=False), sep=",\n")
+        counts[1] += 1
+        counts[2] += len(choices)
+
+    def finish_part(self, suffix):
+        counts = self._counts.pop(suffix, None)
+        if counts is None:
+            return
+        asset, side = self._paths(suffix)
+        self.files.finish(side)
+        self.files.finish(asset, tail='\n], "choices": [\n')
+        with open(asset, "a", encoding="utf-8", newline="") as f:
+            if os.path.exists(side):
+                with open(side, "r", encoding="utf-8", newline="") as choices:
+                    shutil.copyfileobj(choices, f, CHUNK_SIZE)
+                os.remove(side)
+                self.files.written.remove(side)
+            f.write("\n]}\n")
+        self.assets.append((os.path.basename(asset), *counts))
+
+    def finish(self, initial_state):
+        index = {
+            "assets": [{"file": name, "chapter": chapter, "nodes": nodes, "choices": choices}
+                       for name, chapter, nodes, choices in self.assets],
+            # JsonUtility has no dictionaries: variables are a list of name/value pairs
+            "variables": [{"name": name, "value": value} for name, value in initial_state.items()],
+        }
+        path = os.path.join(self.directory, "index.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=4, ensure_ascii=False)
+        self.files.written.append(path)
+
+
+# --- PIPELINE ---
+class ExportResult:
+    def __init__(self):
+        self.nodes = 0
+        self.choices = 0
+        self.files = []
+        self.seconds = 0.0
+
+
+def _group_name(name):
+    return _UNSAFE.sub("_", name) or "story"
+
+
+def export(story, directory, fmt="ue5-csv", max_rows=None, split=None, separator="_",
+           max_open=MAX_OPEN_FILES):
+    """
+    Streams story (a path or DialogueTree, see open_source) into directory.
+    split: "none" (one group), "chapter" (project chapters) or "prefix" (node
+    IDs up to the first separator); defaults to "chapter" for unity and
+    "none" otherwise. max_rows starts a new numbered part every max_rows
+    nodes of a group. Returns an ExportResult.
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown format '{fmt}' (expected one of {', '.join(FORMATS)})")
+    split = split or ("chapter" if fmt == "unity" else "none")
+    if split not in SPLITS:
+        raise ExportError(f"Unknown split '{split}' (expected one of {', '.join(SPLITS)})")
+    started = time.perf_counter()
+    source = open_source(story)
+    os.makedirs(directory, exist_ok=True)
+    files = _Files(max_open)
+    writer = _UnityWriter(directory, files) if fmt == "unity" else _TableWriter(directory, files, fmt == "ue5-json")
+    result = ExportResult()
+    parts = {}      # group -> [part number, nodes in the current part]
+
+    for chapter, node_data in source.nodes():
+        if split == "chapter":
+            group = _group_name(chapter or source.group)
+        elif split == "prefix":
+            group = _group_name(str(node_data["ID"]).split(separator, 1)[0])
+        else:
+            group = _group_name(source.group) if fmt == "unity" else ""
+        part = parts.get(group)
+        if part is None:
+            part = parts[group] = [1, 0]
+        elif max_rows and part[1] >= max_rows:
+            writer.finish_part(_suffix(group, part[0], max_rows))
+            part[0] += 1
+            part[1] = 0
+        part[1] += 1
+        writer.add_node(_suffix(group, part[0], max_rows), chapter, node_data)
+        result.nodes += 1
+        result.choices += len(node_data.get("Choices") or ())
+
+    for group, (number, _) in parts.items():
+        writer.finish_part(_suffix(group, number, max_rows))
+    writer.finish(source.initial_state)
+    files.finish_all()
+    result.files = files.written
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def _suffix(group, number, max_rows):
+    suffix = f"_{group}" if group else ""
+    return suffix + (f"_{number:03d}" if max_rows else "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a story into UE5 DataTables or Unity assets.")
+    parser.add_argument("story", help="Story JSON, project directory or compiled .nnb")
+    parser.add_argument("output", help="Output directory")
+    parser.add_argument("--format", choices=FORMATS, default="ue5-csv")
+    parser.add_argument("--max-rows", type=int, default=None, help="Nodes per file before starting a new part")
+    parser.add_argument("--split", choices=SPLITS, default=None,
+                        help="Group files by chapter or node ID prefix (unity default: chapter)")
+    parser.add_argument("--prefix-separator", default="_", help="Ends the ID prefix for --split prefix")
+    args = parser.parse_args(argv)
+    try:
+        result = export(args.story, args.output, fmt=args.format, max_rows=args.max_rows,
+                        split=args.split, separator=args.prefix_separator)
+    except (OSError, ExportError) as e:
+        print(f"[System] Export failed: {e}")
+        return 1
+    print(f"[System] Exported {result.nodes} nodes and {result.choices} choices into "
+          f"{len(result.files)} file(s) in {args.output} ({result.seconds:.2f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    events.enable_console()
+    sys.exit(main())
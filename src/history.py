@@ -0,0 +1,222 @@
+"""
+Undo/redo for story edits, kept as a log of inverse operations.
+
+Each step records only what its edit changed: a node's old and new fields,
+the node object that was added or deleted, the appended choice, or a single
+variable. A step therefore costs memory in proportion to the edit, never to
+the story. Undo and redo run in time that does not depend on story size;
+a rename touches only the nodes that link to it. At most `limit` steps are
+kept, and the oldest are evicted first. A new edit clears the redo list.
+
+Edits go through History (edit_node, add_node, delete_node, rename_node,
+add_choice, set_variable, delete_variable), which applies each one to the
+tree and records its step.
+"""
+from collections import deque
+
+DEFAULT_LIMIT = 500
+
+_MISSING = object()     # "No such variable" in SetVariable
+
+
+# --- STEPS ---
+# Each step has undo(tree) / redo(tree), a label for menus, and node_id: the
+# node to show after it is undone or redone (None for variables).
+class EditNode:
+    def __init__(self, node_id, before, after):
+        self.node_id = node_id
+        self.before = before    # (speaker, text, next_node_id)
+        self.after = after
+        self.label = f"edit '{node_id}'"
+
+    def _apply(self, tree, fields):
+        node = tree.editable_node(self.node_id)
+        node.speaker, node.text, node.next_node_id = fields
+        tree.mark_dirty(self.node_id)
+
+    def undo(self, tree):
+        self._apply(tree, self.before)
+
+    def redo(self, tree):
+        self._apply(tree, self.after)
+
+
+class AddNode:
+    def __init__(self, node):
+        self.node = node
+        self.node_id = node.node_id
+        self.label = f"add '{node.node_id}'"
+
+    def undo(self, tree):
+        tree.remove_node(self.node_id)
+
+    def redo(self, tree):
+        tree.add_node(self.node)
+
+
+class DeleteNode(AddNode):
+    def __init__(self, node):
+        super().__init__(node)
+        self.label = f"delete '{node.node_id}'"
+
+    # Links into a deleted node are left in place, so putting it back restores them too
+    undo, redo = AddNode.redo, AddNode.undo
+
+
+class RenameNode:
+    def __init__(self, old_id, new_id):
+        self.old_id = old_id
+        self.new_id = new_id
+        self.node_id = new_id
+        self.label = f"rename '{old_id}' to '{new_id}'"
+
+    def undo(self, tree):
+        tree.rename_node(self.new_id, self.old_id)
+        self.node_id = self.old_id
+
+    def redo(self, tree):
+        tree.rename_node(self.old_id, self.new_id)
+        self.node_id = self.new_id
+
+
+class AddChoice:
+    def __init__(self, node_id, choice, compiled):
+        self.node_id = node_id
+        self.choice = choice        # The choice dict and its (check, apply) pair, shared with the node
+        self.compiled = compiled
+        self.label = f"add choice '{choice['text']}' to '{node_id}'"
+
+    def undo(self, tree):
+        node = tree.editable_node(self.node_id)
+        node.choices.pop()
+        node.compiled_choices.pop()
+        tree.mark_dirty(self.node_id)
+
+    def redo(self, tree):
+        node = tree.editable_node(self.node_id)
+        node.choices.append(self.choice)
+        node.compiled_choices.append(self.compiled)
+        tree.mark_dirty(self.node_id)
+
+
+class SetVariable:
+    """Sets (or with after=_MISSING, deletes) one initial_state variable."""
+    node_id = None
+
+    def __init__(self, name, before, after):
+        self.name = name
+        self.before = before
+        self.after = after
+        self.label = f"{'delete' if after is _MISSING else 'set'} variable '{name}'"
+
+    def _apply(self, tree, value):
+        if value is _MISSING:
+            tree.initial_state.pop(self.name, None)
+            tree.state.pop(self.name, None)
+        else:
+            tree.initial_state[self.name] = value
+            tree.state.setdefault(self.name, value)
+        tree.mark_dirty()
+
+    def undo(self, tree):
+        self._apply(tree, self.before)
+
+    def redo(self, tree):
+        self._apply(tree, self.after)
+
+
+# --- HISTORY ---
+class History:
+    """Bounded undo/redo stacks of steps over one DialogueTree."""
+    def __init__(self, tree, limit=DEFAULT_LIMIT):
+        self.tree = tree
+        self.undo_steps = deque(maxlen=limit)   # Appending past the limit drops the oldest step
+        self.redo_steps = []
+
+    @property
+    def limit(self):
+        return self.undo_steps.maxlen
+
+    @limit.setter
+    def limit(self, limit):
+        self.undo_steps = deque(self.undo_steps, maxlen=limit)
+
+    @property
+    def can_undo(self):
+        return bool(self.undo_steps)
+
+    @property
+    def can_redo(self):
+        return bool(self.redo_steps)
+
+    def record(self, step):
+        self.undo_steps.append(step)
+        self.redo_steps.clear()
+        return step
+
+    def undo(self):
+        """Reverts the latest step. Returns it, or None if there is nothing to undo."""
+        if not self.undo_steps:
+            return None
+        step = self.undo_steps.pop()
+        step.undo(self.tree)
+        self.redo_steps.append(step)
+        return step
+
+    def redo(self):
+        """Re-applies the latest undone step. Returns it, or None if there is nothing to redo."""
+        if not self.redo_steps:
+            return None
+        step = self.redo_steps.pop()
+        step.redo(self.tree)
+        self.undo_steps.append(step)
+        return step
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+
+    # --- RECORDED EDITS ---
+    def edit_node(self, node_id, speaker, text, next_node_id):
+        node = self.tree.get_node(node_id)
+        step = EditNode(node_id, (node.speaker, node.text, node.next_node_id), (speaker, text, next_node_id))
+        step.redo(self.tree)
+        return self.record(step)
+
+    def add_node(self, node):
+        step = AddNode(node)
+        step.redo(self.tree)
+        return self.record(step)
+
+    def delete_node(self, node_id):
+        """Returns the step, or None if the node did not exist."""
+        node = self.tree.get_node(node_id)
+        if node is None:
+            return None
+        step = DeleteNode(node)
+        step.redo(self.tree)
+        return self.record(step)
+
+    def rename_node(self, old_id, new_id):
+        """Renames through DialogueTree.rename_node (errors propagate). Returns the rewritten referrers."""
+        sources = self.tree.rename_node(old_id, new_id)
+        self.record(RenameNode(old_id, new_id))
+        return sources
+
+    def add_choice(self, node_id, choice_text, next_node_id, effects=None, requirements=None):
+        """Adds a choice (conditions.ConditionError propagates and nothing is recorded)."""
+        self.tree.add_choice(node_id, choice_text, next_node_id, effects=effects, requirements=requirements)
+        node = self.tree.get_node(node_id)
+        return self.record(AddChoice(node_id, node.choices[-1], node.compiled_choices[-1]))
+
+    def set_variable(self, name, value):
+        step = SetVariable(name, self.tree.initial_state.get(name, _MISSING), value)
+        step.redo(self.tree)
+        return self.record(step)
+
+    def delete_variable(self, name):
+        if name not in self.tree.initial_state:
+            return None
+        step = SetVariable(name, self.tree.initial_state[name], _MISSING)
+        step.redo(self.tree)
+        return self.record(step)
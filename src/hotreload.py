@@ -0,0 +1,313 @@
+"""
+Hot reload: picks up edits to a story while it is being played.
+
+StoryWatcher polls a story JSON (plus its change journal, see journal.py) or a
+project directory (see project.py) and reports what changed, node by node, as
+StoryChanges. Only those nodes are swapped into the running story. The player's
+stats and current node are kept; stats that are new in initial_state start at
+their initial value.
+
+Reload cost follows the change wherever the files allow it:
+    - editor saves append to the journal, which is read from where the last poll stopped
+    - in a project, only chapters whose mtime or size changed are read again
+    - a rewritten story JSON has to be parsed again, but only nodes whose data
+      differs are rebuilt
+
+A changed node that can't be built (a requirement that doesn't parse, a missing
+field) makes poll() raise ReloadError; it is left out until it is fixed, and
+the rest of that change arrives with the next poll.
+
+    python narranode.py story.json --watch        (type r at a prompt to reload and show the node again)
+    python server.py story.json --watch [--watch-interval 1.0]
+"""
+import json
+import os
+import time
+
+import events
+import narranode as engine
+import project
+
+
+class ReloadError(ValueError):
+    """Raised when a changed story file can't be read (e.g. half-typed JSON). The next poll retries."""
+
+
+class StoryChanges:
+    """Node-level difference between two versions of a story."""
+    def __init__(self):
+        self.nodes = {}             # node_id -> node dict (to_dict() form), added or edited
+        self.deleted = set()
+        self.initial_state = None   # The new initial_state, if it changed
+        self.chapters = {}          # Projects: chapter -> node IDs it owns, for chapters that changed
+
+    def __bool__(self):
+        return bool(self.nodes or self.deleted or self.initial_state is not None or self.chapters)
+
+    def __len__(self):
+        return len(self.nodes) + len(self.deleted)
+
+    def merge(self, later):
+        """Folds the changes of a later poll into these ones. Returns self."""
+        for node_id in later.deleted:
+            self.nodes.pop(node_id, None)
+        self.deleted = (set(self.deleted) - later.nodes.keys()) | set(later.deleted)
+        self.nodes.update(later.nodes)
+        if later.initial_state is not None:
+            self.initial_state = later.initial_state
+        self.chapters.update(later.chapters)
+        return self
+
+
+def _stamp(path):
+    """[mtime_ns, size], or None if the file is missing."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return [info.st_mtime_ns, info.st_size]
+
+
+# --- SOURCES ---
+class _FileSource:
+    """
+    A story JSON plus its journal. Keeps the last version's node dicts to diff
+    against (None for a node whose last version was rejected, see forget).
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.journal = engine.journal_path(filename)
+        self.nodes, self.initial_state, self.stamp, self.offset = self._read()
+
+    def _journal_batches(self, offset):
+        """(batches in the journal past offset, new offset). A torn last line waits for the next poll."""
+        try:
+            with open(self.journal, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return [], 0
+        end = data.rfind(b"\n") + 1
+        batches = []
+        for line in data[:end].splitlines():
+            try:
+                batches.append(json.loads(line))
+            except ValueError:
+                break
+        return batches, offset + end
+
+    def _read(self):
+        """Parses the file and its whole journal: (nodes, initial_state, file stamp, journal offset)."""
+        stamp = _stamp(self.filename)
+        with open(self.filename, "r") as f:
+            data = json.load(f)
+        if "nodes" in data and "initial_state" in data:
+            nodes, initial_state = data["nodes"], data["initial_state"]
+        else:
+            nodes, initial_state = data, {}     # Old format (see load_from_json)
+        batches, offset = self._journal_batches(0)
+        for batch in batches:
+            initial_state = batch.get("initial_state", initial_state)
+            for node_id in batch.get("deleted", []):
+                nodes.pop(node_id, None)
+            nodes.update(batch.get("nodes", {}))
+        return nodes, initial_state, stamp, offset
+
+    def poll(self):
+        changes = StoryChanges()
+        stamp = _stamp(self.filename)
+        if stamp is None:
+            return changes      # Mid-rename or deleted: keep playing what is loaded
+        journal_stamp = _stamp(self.journal)
+        journal_size = journal_stamp[1] if journal_stamp else 0
+
+        if stamp != self.stamp or journal_size < self.offset:
+            # Rewritten (saved in full, or the journal was compacted): diff every node
+            nodes, initial_state, stamp, offset = self._read()
+            old = self.nodes
+            for node_id, node_data in nodes.items():
+                if old.get(node_id) != node_data:
+                    changes.nodes[node_id] = node_data
+            changes.deleted = old.keys() - nodes.keys()
+            if initial_state != self.initial_state:
+                changes.initial_state = initial_state
+            self.nodes, self.initial_state, self.stamp, self.offset = nodes, initial_state, stamp, offset
+            return changes
+
+        if journal_size > self.offset:
+            # Appended saves: only the nodes they carry
+            batches, self.offset = self._journal_batches(self.offset)
+            for batch in batches:
+                if "initial_state" in batch and batch["initial_state"] != self.initial_state:
+                    self.initial_state = changes.initial_state = batch["initial_state"]
+                for node_id in batch.get("deleted", []):
+                    if node_id in self.nodes:
+                        del self.nodes[node_id]
+                        changes.deleted.add(node_id)
+                    changes.nodes.pop(node_id, None)
+                for node_id, node_data in batch.get("nodes", {}).items():
+                    if self.nodes.get(node_id) != node_data:
+                        self.nodes[node_id] = changes.nodes[node_id] = node_data
+                        changes.deleted.discard(node_id)
+        return changes
+
+    def forget(self, node_ids):
+        """Drops the last version of these nodes, so their next version counts as changed."""
+        for node_id in node_ids:
+            if node_id in self.nodes:
+                self.nodes[node_id] = None
+
+
+class _ProjectSource:
+    """
+    A project directory. Chapters are compared by stamp and only changed ones
+    are read; a chapter read for the first time has no old version to diff
+    against, so all of its nodes count as changed.
+    """
+    def __init__(self, directory):
+        self.project = project.StoryProject(directory, workers=1)   # Usually one chapter changed: no pool
+        self.owner, self.parsed = self.project.build_index()   # node_id -> chapter, chapter -> node dicts
+        self.stamps = {chapter: entry["stamp"] for chapter, entry in self.project.entries.items()}
+        self.ids = {chapter: entry["ids"] for chapter, entry in self.project.entries.items()}
+        self.manifest_stamp = _stamp(self.project.path(project.PROJECT_FILE))
+        self.initial_state = self.project.initial_state
+
+    def poll(self):
+        changes = StoryChanges()
+        story_project = self.project
+        manifest_stamp = _stamp(story_project.path(project.PROJECT_FILE))
+        if manifest_stamp != self.manifest_stamp:
+            story_project.read_manifest()
+            self.manifest_stamp = manifest_stamp
+            if story_project.initial_state != self.initial_state:
+                self.initial_state = changes.initial_state = story_project.initial_state
+
+        stamps = {chapter: _stamp(story_project.path(chapter)) for chapter in story_project.chapters}
+        stale = [chapter for chapter, stamp in stamps.items() if stamp != self.stamps.get(chapter)]
+        removed = [chapter for chapter in self.ids if chapter not in stamps]
+        if not stale and not removed:
+            return changes
+        parsed = story_project.read_chapters(stale)
+
+        # Release every ID the changed chapters owned, then let them claim their current ones
+        released = set()
+        previously_owned = {}
+        for chapter in stale + removed:
+            owned = previously_owned[chapter] = set()
+            for node_id in self.ids.pop(chapter, ()):
+                if self.owner.get(node_id) == chapter:
+                    del self.owner[node_id]
+                    owned.add(node_id)
+            released |= owned
+        for chapter in removed:
+            del self.stamps[chapter]
+            self.parsed.pop(chapter, None)
+            changes.chapters[chapter] = []
+
+        for chapter in stale:
+            nodes_data = parsed.get(chapter, {})
+            old = self.parsed.get(chapter)
+            owned = []
+            edited = False
+            for node_id, node_data in nodes_data.items():
+                if self.owner.setdefault(node_id, chapter) != chapter:
+                    continue    # Duplicate ID: the earlier chapter keeps it
+                owned.append(node_id)
+                if old is None or old.get(node_id) != node_data:
+                    changes.nodes[node_id] = node_data
+                    edited = True
+            # Touched on disk but identical to what is loaded: nothing to swap in
+            if edited or set(owned) != previously_owned[chapter]:
+                changes.chapters[chapter] = owned
+            self.stamps[chapter] = stamps[chapter]
+            self.ids[chapter] = list(nodes_data)
+            self.parsed[chapter] = nodes_data
+
+        changes.deleted = {node_id for node_id in released if node_id not in self.owner}
+        return changes
+
+    def forget(self, node_ids):
+        """Drops the last version of these nodes, so their next version counts as changed."""
+        for node_id in node_ids:
+            nodes_data = self.parsed.get(self.owner.get(node_id))
+            if nodes_data and node_id in nodes_data:
+                nodes_data[node_id] = None
+
+
+# --- WATCHER ---
+class StoryWatcher:
+    """
+    Watches one story JSON or project directory. poll() returns the changes
+    since the last poll; reload(tree) also applies them to a DialogueTree.
+    Compiled .nnb files can't be watched; watch the JSON they are built from.
+    """
+    def __init__(self, path):
+        self._pending = None    # Changes held back by a poll that rejected some nodes
+        if path.endswith(".nnb"):
+            raise ReloadError(f"'{path}' is compiled; watch its source JSON or project instead")
+        self.path = path
+        try:
+            self.source = _ProjectSource(path) if os.path.isdir(path) else _FileSource(path)
+        except (OSError, ValueError, KeyError) as e:
+            raise ReloadError(f"Can't watch '{path}': {e}")
+
+    def poll(self):
+        """
+        StoryChanges since the last poll (falsy when nothing changed). Every
+        changed node is built first: if one can't be (e.g. a requirement that
+        doesn't parse), ReloadError is raised, the other changes are held for
+        the next poll and the bad node is picked up again once it is fixed.
+        """
+        try:
+            changes = self.source.poll()
+        except (OSError, ValueError, KeyError) as e:
+            raise ReloadError(f"Can't reload '{self.path}': {e}")
+        if self._pending is not None:
+            changes, self._pending = self._pending.merge(changes), None
+        rejected = {}
+        for node_id, node_data in changes.nodes.items():
+            try:
+                engine.DialogueNode.from_dict(node_data)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                rejected[node_id] = e
+        if rejected:
+            for node_id in rejected:
+                del changes.nodes[node_id]
+            # A lazily opened project re-reads whole chapters: keep the bad one's chapter out too
+            for chapter, owned in list(changes.chapters.items()):
+                if not rejected.keys().isdisjoint(owned):
+                    del changes.chapters[chapter]
+            self.source.forget(rejected)
+            if changes:
+                self._pending = changes
+            node_id, error = next(iter(rejected.items()))
+            more = f" (and {len(rejected) - 1} more)" if len(rejected) > 1 else ""
+            raise ReloadError(f"Can't reload '{self.path}': node '{node_id}': {error!r}{more}")
+        return changes
+
+    def reload(self, tree):
+        """Polls and applies whatever changed to tree. Returns the StoryChanges."""
+        started = time.perf_counter()
+        changes = self.poll()
+        if changes:
+            apply_to_tree(tree, changes)
+            if tree.events.reloaded:
+                tree.events.emit(events.RELOADED, tree, self.path, len(changes), time.perf_counter() - started)
+        return changes
+
+
+def apply_to_tree(tree, changes):
+    """
+    Swaps changes into a live DialogueTree without touching tree.state.
+    A project opened lazily (project.open_tree) just drops the changed
+    chapters, which are read again when play reaches them.
+    """
+    if isinstance(tree.nodes, project.ShardedNodes):
+        tree.nodes.reload_chapters(changes.chapters, changes.deleted)
+    else:
+        tree.reload_nodes([engine.DialogueNode.from_dict(node_data) for node_data in changes.nodes.values()],
+                          changes.deleted)
+    if changes.initial_state is not None:
+        tree.initial_state = dict(changes.initial_state)
+        for stat, value in tree.initial_state.items():
+            tree.state.setdefault(stat, value)
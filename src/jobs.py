@@ -0,0 +1,172 @@
+"""
+Background jobs for the editor: heavy work runs on a worker thread, and its
+results come back to the Tk thread, so the window keeps redrawing and taking
+input while a big story saves, loads, validates, lays out or indexes.
+
+A job function runs on the worker with its Job as the first argument. It
+reports progress with job.progress(fraction, message) and calls job.check()
+between steps, which raises JobCancelled once the job was cancelled. A
+cancelled job's result is dropped, so it never reaches the editor.
+
+Callbacks (on_done, on_error, and the runner's on_progress) always run on the
+Tk thread. Tk may only be used from the thread running mainloop, so the runner
+polls for finished jobs with root.after() instead of calling back from the
+worker. Jobs run one at a time in the order they were submitted: a save never
+overlaps another save or the load it follows.
+
+Jobs must not read the live DialogueTree. Pass them tree.snapshot(), which
+stays as it was while the editor keeps editing (see DialogueTree.snapshot).
+"""
+import queue
+import sys
+import threading
+
+POLL_MS = 50
+
+
+class JobCancelled(Exception):
+    """Raised by Job.check() in a job that was cancelled."""
+
+
+class Job:
+    """One unit of background work and its progress (written by the worker, read by Tk)."""
+    def __init__(self, name, func, args, on_done=None, on_error=None, key=None, cancellable=True):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+        self.key = key
+        self.cancellable = cancellable
+        self.fraction = 0.0
+        self.message = name
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Asks the job to stop. Returns False for jobs that can't be cancelled (saves)."""
+        if not self.cancellable:
+            return False
+        self._cancelled.set()
+        return True
+
+    def progress(self, fraction, message=None):
+        """Called by the job: fraction done (0..1) and what it is doing."""
+        self.fraction = fraction
+        if message is not None:
+            self.message = message
+
+    def check(self):
+        """Called by the job between steps: raises JobCancelled if it was cancelled."""
+        if self._cancelled.is_set():
+            raise JobCancelled(self.name)
+
+
+class JobRunner:
+    """
+    Runs jobs on one worker thread and hands their results to callbacks on
+    the Tk thread. on_progress(job) is called every poll with the job running
+    (or next to run), and with None once the queue is empty.
+    """
+    def __init__(self, root, on_progress=None, poll_ms=POLL_MS):
+        self.root = root
+        self.on_progress = on_progress
+        self.poll_ms = poll_ms
+        self.pending = []               # Submitted jobs that haven't reported back, in order
+        self._tasks = queue.Queue()
+        self._finished = queue.Queue()  # (job, result, error) from the worker
+        self._worker = None
+        self._poll_id = None
+
+    @property
+    def busy(self):
+        return bool(self.pending)
+
+    def submit(self, name, func, *args, on_done=None, on_error=None, key=None, cancellable=True):
+        """
+        Queues func(job, *args). A key (e.g. "validate") cancels the queued or
+        running jobs with the same key: only the latest result is wanted.
+        """
+        if key is not None:
+            self.cancel(key)
+        job = Job(name, func, args, on_done=on_done, on_error=on_error, key=key, cancellable=cancellable)
+        self.pending.append(job)
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._work, daemon=True)
+            self._worker.start()
+        self._tasks.put(job)
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+        return job
+
+    def find(self, key):
+        """The pending, uncancelled job with this key, or None."""
+        return next((job for job in self.pending if job.key == key and not job.cancelled), None)
+
+    def cancel(self, key=None):
+        """Cancels the pending jobs with this key (every cancellable job when None)."""
+        for job in self.pending:
+            if key is None or job.key == key:
+                job.cancel()
+
+    def _work(self):
+        while True:
+            job = self._tasks.get()
+            if job is None:
+                return
+            result = error = None
+            try:
+                job.check()
+                result = job.func(job, *job.args)
+            except Exception as e:
+                error = e
+            job.func = job.args = None  # Let go of the job's snapshot now
+            self._finished.put((job, result, error))
+
+    def _poll(self):
+        self._poll_id = None
+        self._deliver()
+        if self.on_progress is not None:
+            self.on_progress(self.pending[0] if self.pending else None)
+        if self.pending:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def _deliver(self):
+        """Runs the callbacks of every job that finished since the last poll."""
+        while True:
+            try:
+                job, result, error = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            self.pending.remove(job)
+            if job.cancelled or isinstance(error, JobCancelled):
+                continue
+            try:
+                if error is None:
+                    if job.on_done is not None:
+                        job.on_done(result)
+                elif job.on_error is not None:
+                    job.on_error(error)
+                else:
+                    raise error
+            except Exception:
+                # Same as an exception in any other Tk callback
+                self.root.report_callback_exception(*sys.exc_info())
+
+    def shutdown(self):
+        """
+        Cancels what can be cancelled, waits for the rest (saves) to finish and
+        runs their callbacks, then stops the worker. For closing the window.
+        """
+        self.cancel()
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        if self._worker is not None:
+            self._tasks.put(None)
+            self._worker.join()
+            self._worker = None
+        self._deliver()
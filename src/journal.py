@@ -0,0 +1,157 @@
+"""
+Incremental saves: an append-only change journal next to the story JSON.
+
+Each save appends one line holding only the nodes created, edited or deleted
+since the last save, so its cost follows the size of the change rather than the
+story. DialogueTree.load_from_json replays the journal on top of the canonical
+file. Compaction folds the journal back into the canonical JSON (atomically)
+and runs on demand or on a background thread.
+"""
+import json
+import os
+import threading
+import time
+
+import events
+import narranode as engine
+
+# Journal size (bytes) past which save() starts a background compaction
+DEFAULT_COMPACT_THRESHOLD = 4 * 1024 * 1024
+
+
+class StoryJournal:
+    """
+    Saves one DialogueTree to filename incrementally.
+    The first save of a tree that was not loaded through this journal is a full
+    write, so an editor session that starts empty still replaces the file.
+    """
+    def __init__(self, filename="scripts/story_data.json", compact_threshold=DEFAULT_COMPACT_THRESHOLD):
+        self.filename = filename
+        self.path = engine.journal_path(filename)
+        self.compact_threshold = compact_threshold
+        self._synced = False
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    def load(self, tree):
+        """Loads the canonical file plus journal into tree."""
+        loaded = tree.load_from_json(self.filename)
+        self._synced = loaded
+        return loaded
+
+    def journal_size(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def save(self, tree):
+        """
+        Appends the tree's pending changes to the journal and clears its dirty set.
+        Returns the number of changed nodes written.
+        """
+        if not self._synced or not os.path.exists(self.filename):
+            count = len(tree.nodes)
+            self.compact(tree)
+            return count
+
+        count = self._append_changes(tree)
+        if self.journal_size() > self.compact_threshold:
+            self.compact_in_background(tree)
+        return count
+
+    def _append_changes(self, tree):
+        started = time.perf_counter()
+        batch = {}
+        if tree.dirty_nodes:
+            batch["nodes"] = {node_id: tree.nodes[node_id].to_dict()
+                              for node_id in tree.dirty_nodes if node_id in tree.nodes}
+        if tree.deleted_nodes:
+            batch["deleted"] = sorted(tree.deleted_nodes)
+        if tree.initial_state_dirty:
+            batch["initial_state"] = dict(tree.initial_state)
+        count = len(tree.dirty_nodes) + len(tree.deleted_nodes)
+
+        if batch:
+            line = json.dumps(batch, separators=(",", ":")) + "\n"
+            with self._lock:
+                self._append(line)
+            tree.clear_dirty()
+            if tree.events.journaled:
+                tree.events.emit(events.JOURNALED, tree, self.path, count, time.perf_counter() - started)
+        return count
+
+    def _append(self, line):
+        """Appends and fsyncs one batch, first dropping a torn tail left by a crash."""
+        with open(self.path, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.seek(0)
+                    data = f.read()
+                    f.truncate(data.rfind(b"\n") + 1)
+                    f.seek(0, os.SEEK_END)
+            f.write(line.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    # --- COMPACTION ---
+    def _snapshot(self, tree):
+        """Copies everything compaction needs, so edits made meanwhile can't race with it."""
+        nodes = {}
+        for node_id, node in tree.nodes.items():
+            data = node.to_dict()
+            data["Choices"] = [dict(c) for c in node.choices]
+            nodes[node_id] = data
+        return {"initial_state": dict(tree.initial_state), "nodes": nodes}
+
+    def _write_compacted(self, data, journal_offset):
+        """
+        Writes the canonical file, then keeps only journal lines appended after
+        the snapshot was taken (they are newer than the canonical data).
+        """
+        engine.write_json_atomic(data, self.filename)
+        with self._lock:
+            if not os.path.exists(self.path):
+                return
+            with open(self.path, "rb") as f:
+                f.seek(journal_offset)
+                tail = f.read()
+            if tail:
+                engine.write_bytes_atomic(self.path, [tail], suffix=engine.JOURNAL_SUFFIX)
+            else:
+                os.remove(self.path)
+
+    def compact(self, tree):
+        """Rewrites the canonical JSON from tree and empties the journal (blocking)."""
+        self.wait()
+        started = time.perf_counter()
+        with self._lock:
+            offset = self.journal_size()
+        data = self._snapshot(tree)
+        self._write_compacted(data, offset)
+        tree.clear_dirty()
+        self._synced = True
+        if tree.events.saved:
+            tree.events.emit(events.SAVED, tree, self.filename, len(data["nodes"]), time.perf_counter() - started)
+
+    def compact_in_background(self, tree):
+        """
+        Snapshots tree now (on the caller's thread) and writes it on a worker thread.
+        Returns the thread, or the one already running.
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            return self._compactor
+        if tree.is_dirty:
+            # Unsaved edits must reach the journal before it can be trimmed behind them
+            self._append_changes(tree)
+        with self._lock:
+            offset = self.journal_size()
+        data = self._snapshot(tree)
+        self._compactor = threading.Thread(target=self._write_compacted, args=(data, offset), daemon=True)
+        self._compactor.start()
+        return self._compactor
+
+    def wait(self):
+        """Blocks until a running background compaction finishes."""
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
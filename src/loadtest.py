@@ -0,0 +1,179 @@
+"""
+Load-test client for server.py.
+
+Opens --users concurrent connections (HTTP keep-alive or WebSocket), and each
+one plays sessions back to back: start, pick a random unlocked choice (or
+advance) until the story ends, end the session, start another. Reports
+throughput and latency percentiles when --duration is up.
+
+    python server.py scripts/story_data.json &
+    python loadtest.py --users 2000 --duration 10 [--ws]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import time
+
+import server as dialogue_server
+
+MAX_STEPS_PER_SESSION = 200
+
+
+class HttpClient:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def call(self, method, path, body=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n".encode() + payload)
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        length = 0
+        for line in head.split(b"\r\n"):
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":", 1)[1])
+        data = json.loads(await self.reader.readexactly(length)) if length else {}
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} -> {status}: {data.get('error')}")
+        return data
+
+    async def start(self):
+        return await self.call("POST", "/sessions", {})
+
+    async def choose(self, session_id, index):
+        return await self.call("POST", f"/sessions/{session_id}/choose", {"index": index})
+
+    async def advance(self, session_id):
+        return await self.call("POST", f"/sessions/{session_id}/advance", {})
+
+    async def end(self, session_id):
+        return await self.call("DELETE", f"/sessions/{session_id}")
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+class WebSocketClient(HttpClient):
+    async def connect(self):
+        await super().connect()
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.writer.write(f"GET /ws HTTP/1.1\r\nHost: {self.host}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        if b" 101 " not in head.split(b"\r\n", 1)[0]:
+            raise RuntimeError("WebSocket handshake failed")
+
+    async def send(self, message):
+        self.writer.write(dialogue_server.encode_frame(dialogue_server.WS_TEXT, json.dumps(message).encode(), masked=True))
+        opcode, payload = await dialogue_server.read_message(self.reader)
+        data = json.loads(payload)
+        if not data.get("ok"):
+            raise RuntimeError(f"{message['op']} -> {data.get('status')}: {data.get('error')}")
+        return data
+
+    async def start(self):
+        return await self.send({"op": "start"})
+
+    async def choose(self, session_id, index):
+        return await self.send({"op": "choose", "session_id": session_id, "index": index})
+
+    async def advance(self, session_id):
+        return await self.send({"op": "advance", "session_id": session_id})
+
+    async def end(self, session_id):
+        return await self.send({"op": "end", "session_id": session_id})
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.sessions = 0
+        self.errors = 0
+
+    async def timed(self, call):
+        started = time.perf_counter()
+        result = await call
+        self.latencies.append(time.perf_counter() - started)
+        return result
+
+    def percentile(self, fraction):
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+    def to_dict(self, elapsed, users):
+        return {
+            "users": users,
+            "seconds": round(elapsed, 3),
+            "requests": len(self.latencies),
+            "requests_per_second": round(len(self.latencies) / elapsed, 1) if elapsed else 0.0,
+            "sessions_completed": self.sessions,
+            "errors": self.errors,
+            "latency_ms": {name: round(self.percentile(q) * 1000, 3)
+                           for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+        }
+
+
+async def _user(client, stats, deadline, rng):
+    try:
+        await client.connect()
+    except (OSError, RuntimeError):
+        stats.errors += 1
+        return
+    try:
+        while time.perf_counter() < deadline:
+            view = await stats.timed(client.start())
+            session_id = view["session_id"]
+            for _ in range(MAX_STEPS_PER_SESSION):
+                if view["status"] == "choosing":
+                    unlocked = [c["index"] for c in view["choices"] if not c["locked"]]
+                    view = await stats.timed(client.choose(session_id, rng.choice(unlocked)))
+                elif view["status"] == "linear":
+                    view = await stats.timed(client.advance(session_id))
+                else:
+                    break
+            await stats.timed(client.end(session_id))
+            stats.sessions += 1
+    except (OSError, RuntimeError, asyncio.IncompleteReadError, ValueError):
+        stats.errors += 1
+    finally:
+        client.close()
+
+
+async def run(host, port, users, duration, websocket=False, seed=0):
+    """Runs the load test and returns the stats dict."""
+    stats = Stats()
+    client_class = WebSocketClient if websocket else HttpClient
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(_user(client_class(host, port), stats, deadline, random.Random(seed + i))
+                           for i in range(users)))
+    return stats.to_dict(time.perf_counter() - started, users)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test a running NarraNode server.")
+    parser.add_argument("--host", default=dialogue_server.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=dialogue_server.DEFAULT_PORT)
+    parser.add_argument("--users", type=int, default=1000, help="Concurrent connections, each playing sessions")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds")
+    parser.add_argument("--ws", action="store_true", help="Use the WebSocket API instead of HTTP")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.host, args.port, args.users, args.duration, args.ws, args.seed))
+    print(json.dumps(result, indent=4))
+    return 1 if result["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
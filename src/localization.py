@@ -0,0 +1,305 @@
+"""
+Localization packs: translated text kept apart from the story graph.
+
+The story file holds the graph plus the source-language text. Every distinct
+speaker, node text and choice text is one entry in a deduplicated string
+table, keyed by a 64-bit hash of the source text (16 hex digits), so a
+translation stays valid for as long as its source line is unchanged.
+
+A locale pack (.nnl) holds one language:
+
+    PACK_MAGIC (8 bytes), u32 string count, u32 reserved
+    count x u64         string keys, sorted (little-endian)
+    (count + 1) x u32   offsets into the text block
+    utf-8 text block
+
+Packs are memory-mapped. A lookup binary-searches the keys in place and
+decodes only that string, so a session turns just the lines it displays
+into Python strings. Every locale shares the same nodes: switching locale
+swaps the pack, not the graph. Lines missing from a pack fall back to the
+source text.
+
+    python localization.py extract story.json strings.json               (string table for translators)
+    python localization.py from-story story.json story_fr.json fr.json   (pair up an old translated copy)
+    python localization.py build fr.json scripts/locales/fr.nnl
+    python localization.py status story.json scripts/locales/fr.nnl
+    python narranode.py story.json --locale fr                           (type 'lang de' at a prompt to switch)
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import events
+import narranode as engine
+
+PACK_MAGIC = b"NNLOC1\n\x00"
+PACK_SUFFIX = ".nnl"
+DEFAULT_DIRECTORY = "scripts/locales"
+CACHE_SIZE = 512    # Decoded lines kept per locale (the cache is simply cleared when full)
+
+_HEADER = struct.Struct("<8sII")
+
+
+class LocaleError(ValueError):
+    """Raised for unknown locales and files that aren't locale packs."""
+
+
+def string_key(text):
+    """The string table key of a source line: a 64-bit hash of its text."""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def key_hex(key):
+    return f"{key:016x}"
+
+
+# --- STRING TABLE ---
+def _node_strings(node):
+    """Every displayed line of one node, in display order."""
+    yield node.speaker
+    yield node.text
+    for choice in node.choices:
+        yield choice["text"]
+
+
+def story_strings(tree):
+    """{key: source text} for every distinct line in the story, in file order."""
+    table = {}
+    for node in tree.nodes.values():
+        for text in _node_strings(node):
+            if text:
+                table.setdefault(string_key(text), text)
+    return table
+
+
+def translations_from_story(tree, translated_tree):
+    """
+    {key: translated text} from a translated copy of the story (same node IDs
+    and choice order), for moving per-language story files over to packs.
+    """
+    translations = {}
+    for node_id, node in tree.nodes.items():
+        other = translated_tree.nodes.get(node_id)
+        if other is None:
+            continue
+        for text, translated in zip(_node_strings(node), _node_strings(other)):
+            if text and translated and translated != text:
+                translations.setdefault(string_key(text), translated)
+    return translations
+
+
+# --- PACKS ---
+def write_pack(translations, path):
+    """Writes {key (int or hex string): text} as a locale pack. Returns the number of lines."""
+    entries = sorted((int(key, 16) if isinstance(key, str) else key, text)
+                     for key, text in translations.items() if text)
+    keys = array("Q", (key for key, _ in entries))
+    offsets = array("I", [0])
+    blob = bytearray()
+    for _, text in entries:
+        blob += text.encode("utf-8")
+        offsets.append(len(blob))
+    if sys.byteorder != "little":
+        keys.byteswap()
+        offsets.byteswap()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    engine.write_bytes_atomic(path, [_HEADER.pack(PACK_MAGIC, len(entries), 0), keys.tobytes(),
+                                     offsets.tobytes(), blob], suffix=PACK_SUFFIX)
+    return len(entries)
+
+
+class LocalePack:
+    """One memory-mapped locale pack. get(key) decodes a single line."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            self._map.close()
+            raise LocaleError(f"'{path}' is not a locale pack")
+        magic, count, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != PACK_MAGIC:
+            self._map.close()
+            raise LocaleError(f"'{path}' is not a locale pack")
+        self.count = count
+        keys_start = _HEADER.size
+        offsets_start = keys_start + 8 * count
+        self._text_start = offsets_start + 4 * (count + 1)
+        view = memoryview(self._map)
+        if sys.byteorder == "little":
+            # Views straight into the mapping: nothing is copied or decoded up front
+            self._keys = view[keys_start:offsets_start].cast("Q")
+            self._offsets = view[offsets_start:self._text_start].cast("I")
+        else:
+            self._keys = array("Q", view[keys_start:offsets_start])
+            self._offsets = array("I", view[offsets_start:self._text_start])
+            self._keys.byteswap()
+            self._offsets.byteswap()
+        view.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        i = bisect.bisect_left(self._keys, key)
+        return i < self.count and self._keys[i] == key
+
+    def keys(self):
+        return iter(self._keys)
+
+    def get(self, key, default=None):
+        keys = self._keys
+        i = bisect.bisect_left(keys, key)
+        if i == self.count or keys[i] != key:
+            return default
+        start = self._text_start + self._offsets[i]
+        end = self._text_start + self._offsets[i + 1]
+        return self._map[start:end].decode("utf-8")
+
+    def close(self):
+        if self._map.closed:
+            return
+        for view in (self._keys, self._offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        self._map.close()
+
+
+class Localizer:
+    """
+    The locale packs in one directory (<locale>.nnl), opened on first use.
+    text(source) translates into the current locale; a locale of None means
+    the story's own text. Servers pass a per-session locale to text() instead.
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY, locale=None):
+        self.directory = directory
+        self.packs = {}     # locale -> open LocalePack
+        self._caches = {}   # locale -> {source text: translated text}
+        self.locale = None
+        self.set_locale(locale)
+
+    def available(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(PACK_SUFFIX)] for name in os.listdir(self.directory)
+                      if name.endswith(PACK_SUFFIX))
+
+    def pack(self, locale):
+        pack = self.packs.get(locale)
+        if pack is None:
+            path = os.path.join(self.directory, locale + PACK_SUFFIX)
+            if not os.path.exists(path):
+                raise LocaleError(f"No '{locale}' pack in {self.directory} (have: {', '.join(self.available()) or 'none'})")
+            pack = self.packs[locale] = LocalePack(path)
+            self._caches[locale] = {}
+        return pack
+
+    def set_locale(self, locale):
+        """Switches the current locale; nodes are untouched. Raises LocaleError if there is no pack."""
+        if locale is not None:
+            self.pack(locale)
+        self.locale = locale
+
+    def text(self, source, locale=None):
+        locale = locale or self.locale
+        if locale is None or not source:
+            return source
+        cache = self._caches.get(locale)
+        if cache is None:
+            self.pack(locale)
+            cache = self._caches[locale]
+        translated = cache.get(source)
+        if translated is None:
+            if len(cache) >= CACHE_SIZE:
+                cache.clear()
+            translated = cache[source] = self.packs[locale].get(string_key(source), source)
+        return translated
+
+    def close(self):
+        for pack in self.packs.values():
+            pack.close()
+        self.packs.clear()
+        self._caches.clear()
+
+
+def status(tree, pack):
+    """(lines in the story the pack lacks, pack lines no story text uses any more)."""
+    table = story_strings(tree)
+    missing = [key for key in table if key not in pack]
+    stale = [key for key in pack.keys() if key not in table]
+    return missing, stale
+
+
+# --- CLI ---
+def _load(path):
+    tree = engine.DialogueTree()
+    if not tree.load_from_json(path):
+        sys.exit(1)
+    return tree
+
+
+def _write_table(table, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({key_hex(key): text for key, text in table.items()}, f, indent=4, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deduplicated string tables and memory-mapped locale packs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    extract = commands.add_parser("extract", help="Story -> {key: source text} table for translators")
+    extract.add_argument("story")
+    extract.add_argument("table")
+    pair = commands.add_parser("from-story", help="Source story + translated copy -> {key: translation}")
+    pair.add_argument("story")
+    pair.add_argument("translated_story")
+    pair.add_argument("table")
+    build = commands.add_parser("build", help="{key: translation} JSON -> locale pack")
+    build.add_argument("table")
+    build.add_argument("pack")
+    check = commands.add_parser("status", help="Missing and stale lines of a pack")
+    check.add_argument("story")
+    check.add_argument("pack")
+    args = parser.parse_args(argv)
+
+    if args.command == "extract":
+        tree = _load(args.story)
+        table = story_strings(tree)
+        _write_table(table, args.table)
+        total = sum(1 for node in tree.nodes.values() for text in _node_strings(node) if text)
+        print(f"[System] {len(table)} distinct lines ({total} in the story) written to {args.table}")
+    elif args.command == "from-story":
+        table = translations_from_story(_load(args.story), _load(args.translated_story))
+        _write_table(table, args.table)
+        print(f"[System] {len(table)} translated lines written to {args.table}")
+    elif args.command == "build":
+        with open(args.table, "r", encoding="utf-8") as f:
+            count = write_pack(json.load(f), args.pack)
+        print(f"[System] {count} lines packed into {args.pack} ({os.path.getsize(args.pack)} bytes)")
+    else:
+        tree = _load(args.story)
+        with LocalePack(args.pack) as pack:
+            missing, stale = status(tree, pack)
+            table = story_strings(tree)
+            for key in missing[:20]:
+                print(f"   missing {key_hex(key)}: {table[key][:60]}")
+            print(f"[System] {len(table) - len(missing)}/{len(table)} lines translated, "
+                  f"{len(missing)} missing, {len(stale)} stale")
+        return 1 if missing else 0
+    return 0
+
+
+if __name__ == "__main__":
+    events.enable_console()
+    sys.exit(main())
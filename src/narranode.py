@@ -1,27 +1,146 @@
+import itertools
 import json
 import os
+import tempfile
+import time
+import weakref
+
+import conditions
+import events
+import traces
+
+# Incremental saves are appended to "<story file>.journal" (see journal.py)
+JOURNAL_SUFFIX = ".journal"
+
+def journal_path(filename):
+    return filename + JOURNAL_SUFFIX
+
+def read_journal_overlay(path):
+    """
+    {node_id: node dict, or None if deleted} and the last initial_state (None
+    if no batch set one) from a change journal, for readers that lay it over
+    the story's JSON without building a DialogueTree.
+    """
+    overlay, initial_state = {}, None
+    if not os.path.exists(path):
+        return overlay, initial_state
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                batch = json.loads(line)
+            except ValueError:
+                break   # Torn last line, ignored like load_from_json does
+            initial_state = batch.get("initial_state", initial_state)
+            for node_id in batch.get("deleted", []):
+                overlay[node_id] = None
+            overlay.update(batch.get("nodes", {}))
+    return overlay, initial_state
+
+# Read once: os.umask() can only be read by setting it, which would race with other threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def match_file_mode(tmp_path, filename):
+    """
+    Gives a temp file about to replace filename the permissions filename has
+    (or a new file would get). mkstemp makes files only their owner can read,
+    and os.replace would keep that.
+    """
+    try:
+        mode = os.stat(filename).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK
+    os.chmod(tmp_path, mode)
+
+def write_bytes_atomic(filename, chunks, suffix=".tmp"):
+    """
+    Writes byte chunks to a temp file in the same folder, flushes it to disk,
+    then renames it over filename, so a crash mid-write never leaves a
+    truncated (or renamed but empty) file behind. Every file the engine
+    rewrites in place goes through here.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        match_file_mode(tmp_path, filename)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _encoded_json(data, indent, batch=8192):
+    """data as JSON in byte chunks of batch encoder pieces (json.dump's pieces are a few bytes each)."""
+    pieces = json.JSONEncoder(indent=indent).iterencode(data)
+    while True:
+        text = "".join(itertools.islice(pieces, batch))
+        if not text:
+            return
+        yield text.encode("utf-8")
+
+def write_json_atomic(data, filename, indent=4):
+    """Writes data as JSON through write_bytes_atomic, without building the whole document in memory."""
+    write_bytes_atomic(filename, _encoded_json(data, indent), suffix=".json")
+
+def check_state_requirements(state, requirements):
+    """
+    Returns True if the given state meets ALL requirements.
+    Missing stats count as 0; {"gold": 5} means gold >= 5 (see conditions.py for the full language).
+    """
+    return conditions.compile_requirements(requirements)(state)
+
+def apply_state_effects(state, effects):
+    """Applies effects to the given state dict (missing stats start at 0)."""
+    return conditions.compile_effects(effects)(state)
 
 class DialogueNode:
     """
     Represents a single screen of dialogue (a Node).
     """
+    __slots__ = ("node_id", "speaker", "text", "next_node_id", "choices", "compiled_choices")
+
     def __init__(self, node_id, speaker, text, next_node_id=None):
         self.node_id = node_id
         self.speaker = speaker
         self.text = text
         self.next_node_id = next_node_id  # For linear flow (no choices)
         self.choices = []
+        # (check, apply) functions per choice, compiled once by add_choice
+        self.compiled_choices = []
 
     def add_choice(self, choice_text, next_node_id, effects=None, requirements=None):
         """
         Adds a branching path with optional logic.
+        Raises conditions.ConditionError if effects/requirements can't be parsed.
         """
+        effects = effects or {}
+        requirements = requirements or {}
+        compiled = (conditions.compile_requirements(requirements), conditions.compile_effects(effects))
         self.choices.append({
             "text": choice_text,
             "next_id": next_node_id,
-            "effects": effects or {},
-            "requirements": requirements or {} 
+            "effects": effects,
+            "requirements": requirements 
         })
+        self.compiled_choices.append(compiled)
+
+    def targets(self):
+        """Every node ID this node links to (linear flow first, then each choice)."""
+        targets = [self.next_node_id] if self.next_node_id else []
+        targets.extend(choice["next_id"] for choice in self.choices)
+        return tuple(targets)
+
+    def copy(self):
+        """A copy that can be edited without touching this node (choice dicts are copied too)."""
+        node = DialogueNode(self.node_id, self.speaker, self.text, next_node_id=self.next_node_id)
+        node.choices = [dict(choice) for choice in self.choices]
+        node.compiled_choices = list(self.compiled_choices)
+        return node
 
     def to_dict(self):
         """Converts object to dictionary for JSON export."""
@@ -33,6 +152,26 @@ class DialogueNode:
             "Choices": self.choices
         }
 
+    @classmethod
+    def from_dict(cls, node_data):
+        """Rebuilds a node from the dictionary produced by to_dict()."""
+        node = cls(
+            node_data["ID"],
+            node_data["Speaker"],
+            node_data["Text"],
+            next_node_id=node_data.get("NextNode")  # Load linear flow target
+        )
+
+        # Reconstruct Choices
+        for choice in node_data["Choices"]:
+            node.add_choice(
+                choice["text"],
+                choice["next_id"],
+                effects=choice.get("effects"),
+                requirements=choice.get("requirements")
+            )
+        return node
+
 class DialogueTree:
     """
     The Engine: Manages nodes and the Global State (Variables).
@@ -43,9 +182,185 @@ class DialogueTree:
         self.initial_state = initial_state if initial_state is not None else {}
         # Global State (Variables like Health, Gold, Flags)
         self.state = self.initial_state.copy()
+        # Changes since the last save (used by incremental saves)
+        self.dirty_nodes = set()
+        self.deleted_nodes = set()
+        self.initial_state_dirty = False
+        # Reverse adjacency: target_id -> {source_id: number of links}
+        self.referrers = {}
+        self._targets = {}  # source_id -> targets currently indexed
+        # Called as listener(node_id, old_targets, new_targets) when a node's links
+        # (or existence) change; listener(None, None, None) after a full reload
+        self.edge_listeners = []
+        # Play/load/save observers (see events.py); nothing is printed without a ConsoleListener
+        self.events = events.EventHub(events.DEFAULT_LISTENERS)
+        # Live snapshots (see snapshot()) and the nodes already copied since the latest one
+        self._snapshots = weakref.WeakSet()
+        self._copied = set()
 
     def add_node(self, node):
         self.nodes[node.node_id] = node
+        self._copied.discard(node.node_id)  # The node may come from a snapshot (e.g. undoing a delete)
+        self.mark_dirty(node.node_id)
+
+    def add_choice(self, node_id, choice_text, next_node_id, effects=None, requirements=None):
+        """Adds a choice to an existing node and keeps the link index up to date."""
+        self.editable_node(node_id).add_choice(choice_text, next_node_id, effects=effects, requirements=requirements)
+        self.mark_dirty(node_id)
+
+    def remove_node(self, node_id):
+        """Deletes a node. Returns False if it did not exist. Links to it are left for the caller."""
+        if node_id not in self.nodes:
+            return False
+        del self.nodes[node_id]
+        self.dirty_nodes.discard(node_id)
+        self.deleted_nodes.add(node_id)
+        self._reindex(node_id)
+        return True
+
+    def rename_node(self, old_id, new_id):
+        """
+        Renames a node and rewrites every link that pointed at it.
+        Only the referring nodes are touched (found through the reverse index).
+        """
+        if old_id not in self.nodes:
+            raise KeyError(old_id)
+        if new_id in self.nodes:
+            raise ValueError(f"Node '{new_id}' already exists.")
+
+        sources = list(self.referrers.get(old_id, ()))
+        node = self.editable_node(old_id)
+        self.remove_node(old_id)
+        node.node_id = new_id
+        self.add_node(node)
+
+        for source_id in sources:
+            source = self.editable_node(new_id if source_id == old_id else source_id)
+            if source.next_node_id == old_id:
+                source.next_node_id = new_id
+            for choice in source.choices:
+                if choice["next_id"] == old_id:
+                    choice["next_id"] = new_id
+            self.mark_dirty(source.node_id)
+        return sources
+
+    def reload_nodes(self, nodes, deleted=()):
+        """
+        Swaps in new versions of nodes and drops deleted IDs (hot reload, see
+        hotreload.py). Not an edit: nothing is marked dirty and state is kept.
+        """
+        for node_id in deleted:
+            if node_id in self.nodes:
+                del self.nodes[node_id]
+                self._reindex(node_id)
+        for node in nodes:
+            self.nodes[node.node_id] = node
+            self._reindex(node.node_id)
+
+    def editable_node(self, node_id):
+        """
+        The node to change in place. While a snapshot shares it, it is first
+        swapped for a private copy, so the snapshot keeps the old version.
+        """
+        node = self.nodes[node_id]
+        if self._snapshots and node_id not in self._copied:
+            node = self.nodes[node_id] = node.copy()
+            self._copied.add(node_id)
+        return node
+
+    def referrers_of(self, node_id):
+        """IDs of the nodes that link to node_id."""
+        return list(self.referrers.get(node_id, ()))
+
+    def mark_dirty(self, node_id=None):
+        """
+        Records that a node was created or edited in place (speaker, text,
+        choices...). With no node_id, marks initial_state as changed.
+        """
+        if node_id is None:
+            self.initial_state_dirty = True
+        else:
+            self.dirty_nodes.add(node_id)
+            self.deleted_nodes.discard(node_id)
+            self._reindex(node_id)
+
+    def _reindex(self, node_id):
+        """Updates the reverse index for one node's outgoing links. O(its links)."""
+        old = self._targets.pop(node_id, ())
+        node = self.nodes.get(node_id)
+        new = node.targets() if node is not None else ()
+        if node is not None:
+            self._targets[node_id] = new
+        for target in old:
+            sources = self.referrers[target]
+            sources[node_id] -= 1
+            if not sources[node_id]:
+                del sources[node_id]
+                if not sources:
+                    del self.referrers[target]
+        for target in new:
+            sources = self.referrers.setdefault(target, {})
+            sources[node_id] = sources.get(node_id, 0) + 1
+        if self._snapshots:
+            for snapshot in self._snapshots:
+                if snapshot.touched is not None:
+                    snapshot.touched.add(node_id)
+        for listener in self.edge_listeners:
+            listener(node_id, old, new)
+
+    def rebuild_index(self):
+        """Recomputes the reverse index from scratch (after bulk changes to self.nodes)."""
+        self.referrers = {}
+        self._targets = {}
+        for node_id, node in self.nodes.items():
+            new = node.targets()
+            self._targets[node_id] = new
+            for target in new:
+                sources = self.referrers.setdefault(target, {})
+                sources[node_id] = sources.get(node_id, 0) + 1
+        for snapshot in self._snapshots:
+            snapshot.touched = None
+        for listener in self.edge_listeners:
+            listener(None, None, None)
+
+    def clear_dirty(self):
+        self.dirty_nodes = set()
+        self.deleted_nodes = set()
+        self.initial_state_dirty = False
+
+    @property
+    def is_dirty(self):
+        return bool(self.dirty_nodes or self.deleted_nodes or self.initial_state_dirty)
+
+    # --- SNAPSHOTS ---
+    def snapshot(self, take_changes=False):
+        """
+        A StorySnapshot of the story as it is now, for background jobs. Costs a
+        copy of the node table, not of the nodes: edits copy a shared node
+        first (see editable_node). take_changes moves the pending changes into
+        the snapshot for saving it; restore_changes puts them back if that fails.
+        """
+        snapshot = StorySnapshot(self.nodes.copy(), dict(self.initial_state), self.events)
+        if take_changes:
+            snapshot.dirty_nodes, snapshot.deleted_nodes = self.dirty_nodes, self.deleted_nodes
+            snapshot.initial_state_dirty = self.initial_state_dirty
+            self.clear_dirty()
+            if getattr(self.nodes, "dirty_chapters", None):
+                self.nodes.dirty_chapters = set()   # The copy keeps them (project saves)
+        self._snapshots.add(snapshot)
+        self._copied = set()
+        return snapshot
+
+    def restore_changes(self, snapshot):
+        """Marks the changes a failed save of snapshot took as pending again."""
+        for node_id in snapshot.dirty_nodes | snapshot.deleted_nodes:
+            if node_id in self.nodes:
+                self.dirty_nodes.add(node_id)
+            else:
+                self.deleted_nodes.add(node_id)
+        self.initial_state_dirty = self.initial_state_dirty or snapshot.initial_state_dirty
+        if getattr(snapshot.nodes, "dirty_chapters", None):
+            self.nodes.dirty_chapters |= snapshot.nodes.dirty_chapters
 
     def get_node(self, node_id):
         return self.nodes.get(node_id)
@@ -55,38 +370,67 @@ class DialogueTree:
         Returns True if player meets ALL requirements.
         Example: reqs={'gold': 5} -> Checks if state['gold'] >= 5
         """
-        for stat, value in requirements.items():
-            current_val = self.state.get(stat, 0)
-            if current_val < value:
-                return False
-        return True
+        return check_state_requirements(self.state, requirements)
 
     def apply_effects(self, effects):
         """Updates the global state based on the choice taken."""
-        for stat, value in effects.items():
-            if stat not in self.state:
-                self.state[stat] = 0
-            
-            self.state[stat] += value
-            print(f"   >>> [Effect] {stat} changed by {value} (Now: {self.state[stat]})")
+        apply_state_effects(self.state, effects)
+        handlers = self.events.effect_applied
+        if handlers:
+            for stat, change in effects.items():
+                for handler in handlers:
+                    handler(self, stat, change, self.state.get(stat, 0))
 
     def save_to_json(self, filename="scripts/story_data.json"):
+        """
+        Writes the full story (atomically). Any pending journal is folded in and removed.
+        A directory is saved as a chapter-sharded project (see project.py).
+        """
+        if os.path.isdir(filename):
+            import project  # project.py builds on this module
+            project.StoryProject(filename).save(self, full=True)
+            return
+        started = time.perf_counter()
         data = {
             "initial_state": self.initial_state,
             "nodes": {id: node.to_dict() for id, node in self.nodes.items()}
         }
-        with open(filename, "w") as f:
-            json.dump(data, f, indent=4)
-        print(f"\n[System] Saved {len(self.nodes)} nodes to {filename}")
+        write_json_atomic(data, filename)
+        if os.path.exists(journal_path(filename)):
+            os.remove(journal_path(filename))
+        self.clear_dirty()
+        if self.events.saved:
+            self.events.emit(events.SAVED, self, filename, len(self.nodes), time.perf_counter() - started)
 
-    def load_from_json(self, filename="scripts/story_data.json"):
-        """Loads nodes from a JSON file into memory."""
+    def load_from_json(self, filename="scripts/story_data.json", cache=False, lazy=False):
+        """
+        Loads nodes from a JSON file (or a chapter-sharded project directory) into memory.
+        cache=True reads a large story from its precompiled cache when that is
+        current, and writes the cache next to the file when it isn't (see
+        storycache.py); lazy=True then builds nodes as they are read and leaves
+        the reverse-link index empty. The CLI engine uses both, to start fast.
+        """
+        if os.path.isdir(filename):
+            import project  # project.py builds on this module
+            return project.StoryProject(filename).load(self)
         if not os.path.exists(filename):
-            print(f"[System] File '{filename}' not found.")
+            self.events.emit(events.LOAD_MISSING, self, filename)
             return False
 
-        with open(filename, "r") as f:
-            data = json.load(f)
+        started = time.perf_counter()
+        story_cache = None
+        if cache:
+            import storycache  # storycache.py builds on this module
+            story_cache = storycache.StoryCache(filename)
+            if story_cache.load(self, lazy=lazy):
+                self.clear_dirty()
+                if self.events.loaded:
+                    self.events.emit(events.LOADED, self, filename, len(self.nodes), time.perf_counter() - started)
+                return True
+            data = story_cache.parse()
+        else:
+            with open(filename, "r") as f:
+                data = json.load(f)
 
         # Check if new format (with initial_state) or old format
         if "nodes" in data and "initial_state" in data:
@@ -102,106 +446,292 @@ class DialogueTree:
 
         self.nodes = {}
         for node_id, node_data in nodes_data.items():
-            # Reconstruct the Node object
-            new_node = DialogueNode(
-                node_data["ID"],
-                node_data["Speaker"],
-                node_data["Text"],
-                next_node_id=node_data.get("NextNode")  # Load linear flow target
-            )
+            node = DialogueNode.from_dict(node_data)
+            self.nodes[node.node_id] = node
+        self.rebuild_index()
+
+        # Apply incremental saves made since the file was last written in full
+        if os.path.exists(journal_path(filename)):
+            self.replay_journal(journal_path(filename))
+        if story_cache is not None:
+            story_cache.store(self)
+
+        self.clear_dirty()
+        if self.events.loaded:
+            self.events.emit(events.LOADED, self, filename, len(self.nodes), time.perf_counter() - started)
+        return True
+
+    def replay_journal(self, path):
+        """
+        Applies each batch in a change journal, in order. A torn last line
+        (crash during append) is ignored.
+        """
+        applied = 0
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    break
+                if "initial_state" in batch:
+                    self.initial_state = batch["initial_state"]
+                    self.state = self.initial_state.copy()
+                for node_id in batch.get("deleted", []):
+                    self.remove_node(node_id)
+                for node_data in batch.get("nodes", {}).values():
+                    self.add_node(DialogueNode.from_dict(node_data))
+                applied += 1
+        return applied
+
+class StorySnapshot:
+    """
+    A DialogueTree frozen at one moment (see DialogueTree.snapshot), safe to
+    read on another thread while the tree keeps changing. It has the read side
+    of a tree (nodes, initial_state, referrers, get_node) and the pending
+    changes it took, so savers, layouts, validators and indexes take it as is.
+    """
+    def __init__(self, nodes, initial_state, events_hub):
+        self.nodes = nodes
+        self.initial_state = initial_state
+        self.state = dict(initial_state)
+        self.events = events_hub
+        self.dirty_nodes = set()
+        self.deleted_nodes = set()
+        self.initial_state_dirty = False
+        self.edge_listeners = []    # Never called: a snapshot doesn't change
+        # Node IDs the tree changed since the snapshot (None after a full reload)
+        self.touched = set()
+        self._referrers = None
+
+    @property
+    def referrers(self):
+        """The reverse link index, built on first use by the thread that asks."""
+        if self._referrers is None:
+            referrers = {}
+            for node_id, node in self.nodes.items():
+                for target in node.targets():
+                    sources = referrers.setdefault(target, {})
+                    sources[node_id] = sources.get(node_id, 0) + 1
+            self._referrers = referrers
+        return self._referrers
+
+    def referrers_of(self, node_id):
+        return list(self.referrers.get(node_id, ()))
+
+    def get_node(self, node_id):
+        return self.nodes.get(node_id)
+
+    def clear_dirty(self):
+        self.dirty_nodes = set()
+        self.deleted_nodes = set()
+        self.initial_state_dirty = False
 
-            # Reconstruct Choices
-            for choice in node_data["Choices"]:
-                new_node.add_choice(
-                    choice["text"],
-                    choice["next_id"],
-                    effects=choice.get("effects"),
-                    requirements=choice.get("requirements")
-                )
+    @property
+    def is_dirty(self):
+        return bool(self.dirty_nodes or self.deleted_nodes or self.initial_state_dirty)
 
-            self.add_node(new_node)
+    def changes_since(self, tree):
+        """
+        What tree changed since this snapshot, as edge-listener calls
+        (node_id, old_targets, new_targets), so an index built over the
+        snapshot can catch up with the live tree.
+        """
+        if self.touched is None:
+            return [(None, None, None)]
+        changes = []
+        for node_id in self.touched:
+            old, new = self.nodes.get(node_id), tree.nodes.get(node_id)
+            changes.append((node_id, old.targets() if old is not None else (),
+                            new.targets() if new is not None else ()))
+        return changes
 
-        print(f"[System] Loaded {len(self.nodes)} nodes from {filename}")
+def _hot_reload(tree, watcher):
+    try:
+        watcher.reload(tree)
+    except ValueError as e:     # hotreload.ReloadError: keep playing the last good version
+        print(f"[System] {e}")
+
+def _untranslated(text):
+    return text
+
+def _prompt_command(typed, watcher, localizer):
+    """Handles r (reload) and 'lang <locale>' typed at a prompt. True if the node should be shown again."""
+    command = typed.strip()
+    if watcher is not None and command.lower() == "r":
+        return True     # The reload itself happens before the node is shown
+    if localizer is not None and command.lower().startswith("lang"):
+        try:
+            localizer.set_locale(command[4:].strip() or None)   # Bare 'lang': back to the story's own text
+        except ValueError as e:     # localization.LocaleError
+            print(f"[System] {e}")
         return True
+    return False
 
-def play_story(tree, start_node_id):
+def play_story(tree, start_node_id, watcher=None, localizer=None):
     """
     The Game Loop: Renders nodes and handles input.
+    With a hotreload.StoryWatcher, edits to the story are picked up before each
+    node is shown, and typing r at a prompt reloads and shows the node again.
+    With a localization.Localizer, text is shown in its current locale and
+    typing 'lang <locale>' switches it.
     """
     current_id = start_node_id
+    hub = tree.events
+    tr = localizer.text if localizer is not None else _untranslated
+    outcome = traces.OUTCOME_QUIT   # Unless the story ends on its own (Ctrl+C / end of input)
+    redisplay = False
     
-    while True:
-        node = tree.get_node(current_id)
-        if not node:
-            print(f"Error: Node '{current_id}' not found.")
-            break
-
-        # --- DISPLAY UI ---
-        print("\n" + "=" * 50)
-        print(f"STATS: {tree.state}")
-        print("-" * 50)
-        print(f"[{node.speaker}]: \"{node.text}\"")
-        print("-" * 50)
-
-        # --- LINEAR FLOW (No choices, auto-advance) ---
-        if not node.choices:
-            if node.next_node_id:
-                input("\n[Press Enter to continue...]")
-                current_id = node.next_node_id
-                continue
-            else:
-                print("(End of Story)")
+    try:
+        while True:
+            if watcher is not None:
+                _hot_reload(tree, watcher)
+            node = tree.get_node(current_id)
+            if not node:
+                print(f"Error: Node '{current_id}' not found.")
+                outcome = traces.OUTCOME_MISSING
                 break
+            if hub.node_entered and not redisplay:
+                hub.emit(events.NODE_ENTERED, tree, current_id)
+            redisplay = False
+
+            # --- DISPLAY UI ---
+            print("\n" + "=" * 50)
+            print(f"STATS: {tree.state}")
+            print("-" * 50)
+            print(f"[{tr(node.speaker)}]: \"{tr(node.text)}\"")
+            print("-" * 50)
+
+            # --- LINEAR FLOW (No choices, auto-advance) ---
+            if not node.choices:
+                if node.next_node_id:
+                    typed = input("\n[Press Enter to continue...]")
+                    if _prompt_command(typed, watcher, localizer):
+                        redisplay = True
+                        continue
+                    current_id = node.next_node_id
+                    continue
+                else:
+                    print("(End of Story)")
+                    outcome = traces.OUTCOME_ENDED
+                    break
 
-        # --- FILTER & SHOW CHOICES ---
-        print("Decisions:")
-        available_choices = []
+            # --- FILTER & SHOW CHOICES ---
+            print("Decisions:")
+            available_choices = []
+            available_indexes = []
         
-        for choice in node.choices:
-            is_unlocked = tree.check_requirements(choice.get('requirements', {}))
+            for index, (choice, (check, _)) in enumerate(zip(node.choices, node.compiled_choices)):
+                is_unlocked = check(tree.state)  # Precompiled by add_choice
             
-            if is_unlocked:
-                available_choices.append(choice)
-                idx = len(available_choices)
-                print(f" {idx}. {choice['text']}")
-            else:
-                # Show locked choices
-                reqs = choice.get('requirements', {})
-                print(f" [LOCKED] {choice['text']} (Requires: {reqs})")
+                if is_unlocked:
+                    available_choices.append(choice)
+                    available_indexes.append(index)
+                    idx = len(available_choices)
+                    print(f" {idx}. {tr(choice['text'])}")
+                    if hub.choice_shown:
+                        hub.emit(events.CHOICE_SHOWN, tree, current_id, index, choice)
+                else:
+                    # Show locked choices
+                    reqs = choice.get('requirements', {})
+                    print(f" [LOCKED] {tr(choice['text'])} (Requires: {reqs})")
+                    if hub.choice_locked:
+                        hub.emit(events.CHOICE_LOCKED, tree, current_id, index, choice)
 
-        if not available_choices:
-            print("No valid choices available! (Game Over)")
-            break
+            if not available_choices:
+                print("No valid choices available! (Game Over)")
+                outcome = traces.OUTCOME_DEAD_END
+                break
 
-        # --- GET INPUT ---
-        while True:
-            try:
-                sel = int(input("\nSelection #: "))
-                if 1 <= sel <= len(available_choices):
-                    selected = available_choices[sel - 1]
-                    tree.apply_effects(selected.get('effects', {}))
-                    current_id = selected['next_id']
-                    break
-                else:
-                    print("Invalid number.")
-            except ValueError:
-                print("Please enter a number.")
+            # --- GET INPUT ---
+            while True:
+                try:
+                    typed = input("\nSelection #: ")
+                    if _prompt_command(typed, watcher, localizer):
+                        redisplay = True
+                        break
+                    sel = int(typed)
+                    if 1 <= sel <= len(available_choices):
+                        selected = available_choices[sel - 1]
+                        if hub.choice_taken:
+                            hub.emit(events.CHOICE_TAKEN, tree, current_id, available_indexes[sel - 1], selected)
+                        tree.apply_effects(selected.get('effects', {}))
+                        current_id = selected['next_id']
+                        break
+                    else:
+                        print("Invalid number.")
+                except ValueError:
+                    print("Please enter a number.")
+    finally:
+        if hub.session_ended:
+            hub.emit(events.SESSION_ENDED, tree, current_id, outcome)
 
 # --- MAIN EXECUTION ---
 if __name__ == "__main__":
+    import sys
+
+    # Optional story path: a JSON script, a compiled .nnb file (see storybin.py)
+    # or a project directory of chapter files (see project.py)
+    # --trace DIR records each playthrough to DIR for coverage reports (see coverage.py)
+    # --watch picks up edits to the story while playing (see hotreload.py)
+    # --locale CODE [--locales DIR] shows a translation from DIR/CODE.nnl (see localization.py)
+    args = sys.argv[1:]
+    watch = "--watch" in args
+    if watch:
+        args.remove("--watch")
+    options = {}
+    for flag in ("--trace", "--locale", "--locales"):
+        if flag in args and args.index(flag) + 1 < len(args):
+            position = args.index(flag)
+            options[flag] = args[position + 1]
+            del args[position:position + 2]
+    trace_dir = options.get("--trace")
+    story_path = args[0] if args else "scripts/story_data.json"
+    events.enable_console()
     game = DialogueTree()
     
     print("--- NarraNode CLI Engine ---")
     
     # Try to load existing data
-    if game.load_from_json("scripts/story_data.json"):
+    if story_path.endswith(".nnb") and os.path.exists(story_path):
+        import storybin
+        game = storybin.open_tree(story_path)
+        loaded = True
+    elif os.path.isdir(story_path):
+        # Chapters are read as play reaches them
+        import project
+        game = project.open_tree(story_path)
+        loaded = len(game.nodes) > 0
+    else:
+        # Nodes are built from the story cache as play reaches them
+        loaded = game.load_from_json(story_path, cache=True, lazy=True)
+
+    if loaded:
         # Auto-detect the first node ID to start with
-        first_node_id = list(game.nodes.keys())[0]
+        first_node_id = next(iter(game.nodes))
         
         # Optional: Ask user for starting node
         # first_node_id = input(f"Enter starting Node ID (Default: {first_node_id}): ") or first_node_id
         
-        play_story(game, first_node_id)
+        if trace_dir:
+            game.events.add(traces.TraceListener(trace_dir))
+        watcher = None
+        if watch:
+            import hotreload
+            try:
+                watcher = hotreload.StoryWatcher(story_path)
+                print(f"[System] Watching {story_path} for changes (type r at a prompt to reload now)")
+            except hotreload.ReloadError as e:
+                print(f"[System] {e}")
+        localizer = None
+        if "--locale" in options or "--locales" in options:
+            import localization
+            localizer = localization.Localizer(options.get("--locales", localization.DEFAULT_DIRECTORY))
+            print(f"[System] Locales: {', '.join(localizer.available()) or 'none'} (type 'lang <locale>' to switch)")
+            try:
+                localizer.set_locale(options.get("--locale"))
+            except localization.LocaleError as e:
+                print(f"[System] {e}")
+        play_story(game, first_node_id, watcher, localizer)
     else:
         print("\nNo story file found!")
-        print("Run 'editor.py' first to create your story, then run this script to play it.")
\ No newline at end of file
+        print("Run 'editor.py' first to create your story, then run this script to play it.")
@@ -0,0 +1,280 @@
+"""
+Node list for large stories: a sorted, trigram-indexed set of node IDs and a
+virtualized Tk list that only ever holds the rows currently on screen.
+"""
+import bisect
+import tkinter as tk
+
+PREFIX_MARKER = "^"     # Filter text starting with this matches ID prefixes only
+
+
+def _sort_key(node_id):
+    return (str(node_id).lower(), node_id)
+
+
+class NodeIndex:
+    """
+    Node IDs kept sorted (case-insensitive) for prefix search by bisection,
+    plus a trigram index for substring search. Updating one ID is O(log n)
+    to find its slot plus the cost of the list insert.
+    """
+    def __init__(self, node_ids=()):
+        self.entries = sorted(_sort_key(node_id) for node_id in node_ids)
+        self.trigrams = {}
+        self.short = set()  # IDs under three characters: they have no trigrams
+        for key, node_id in self.entries:
+            self._index_key(key, node_id)
+
+    def _index_key(self, key, node_id):
+        if len(key) < 3:
+            self.short.add(node_id)
+        for gram in self._grams(key):
+            self.trigrams.setdefault(gram, set()).add(node_id)
+
+    @staticmethod
+    def _grams(key):
+        return {key[i:i + 3] for i in range(len(key) - 2)}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [node_id for _, node_id in self.entries[index]]
+        return self.entries[index][1]
+
+    def __contains__(self, node_id):
+        return self.position(node_id) is not None
+
+    def position(self, node_id):
+        entry = _sort_key(node_id)
+        i = bisect.bisect_left(self.entries, entry)
+        if i < len(self.entries) and self.entries[i] == entry:
+            return i
+        return None
+
+    def add(self, node_id):
+        entry = _sort_key(node_id)
+        i = bisect.bisect_left(self.entries, entry)
+        if i < len(self.entries) and self.entries[i] == entry:
+            return
+        self.entries.insert(i, entry)
+        self._index_key(entry[0], node_id)
+
+    def remove(self, node_id):
+        i = self.position(node_id)
+        if i is None:
+            return
+        key, _ = self.entries.pop(i)
+        self.short.discard(node_id)
+        for gram in self._grams(key):
+            ids = self.trigrams.get(gram)
+            if ids is not None:
+                ids.discard(node_id)
+                if not ids:
+                    del self.trigrams[gram]
+
+    def _prefix_range(self, text):
+        text = text.lower()
+        return (bisect.bisect_left(self.entries, (text,)),
+                bisect.bisect_left(self.entries, (text + "\uffff",)))
+
+    def prefix(self, text):
+        """IDs starting with text (case-insensitive), in sorted order."""
+        start, end = self._prefix_range(text)
+        return self[start:end]
+
+    def search(self, text):
+        """
+        IDs matching a filter string, sorted, as a sequence VirtualListbox can
+        show. "^abc" is a prefix search; anything else is a case-insensitive
+        substring search over the trigram index, so no keystroke scans every
+        ID: shorter filters use the trigrams that contain them, longer ones
+        intersect their own trigrams and verify the candidates.
+        """
+        if not text:
+            return self
+        if text.startswith(PREFIX_MARKER):
+            return _Range(self, *self._prefix_range(text[len(PREFIX_MARKER):]))
+
+        text = text.lower()
+        if len(text) < 3:
+            sets = [ids for gram, ids in self.trigrams.items() if text in gram]
+            matches = set().union(*sets)
+            matches.update(node_id for node_id in self.short if text in str(node_id).lower())
+            return Matches(self, matches)
+        grams = sorted((self.trigrams.get(g, set()) for g in self._grams(text)), key=len)
+        if len(grams) == 1:
+            return Matches(self, grams[0].copy())   # A three-character filter is its own trigram
+        candidates = grams[0].intersection(*grams[1:])
+        return Matches(self, {node_id for node_id in candidates if text in str(node_id).lower()})
+
+
+class Matches:
+    """
+    The IDs a NodeIndex filter matched, in index order, sliced lazily for
+    VirtualListbox: len() is known at once, but rows are only put in order
+    as far as the list is scrolled. Matches among many IDs are found by
+    walking the sorted entries; a few are placed by bisection instead.
+    """
+    SPARSE = 32     # Fewer than one match per this many IDs counts as a few
+    CHUNK = 4096
+
+    def __init__(self, index, ids):
+        self.index = index
+        self.ids = ids
+        self._rows = []
+        self._scanned = 0   # Entries walked so far
+        if len(ids) * self.SPARSE < len(index.entries):
+            self._rows = [index.entries[i][1] for i in sorted(index.position(node_id) for node_id in ids)]
+            self._scanned = len(index.entries)
+
+    def _fill(self, count):
+        entries, ids, rows = self.index.entries, self.ids, self._rows
+        while len(rows) < count and self._scanned < len(entries):
+            chunk = entries[self._scanned:self._scanned + self.CHUNK]
+            self._scanned += len(chunk)
+            rows.extend(node_id for _, node_id in chunk if node_id in ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, node_id):
+        return node_id in self.ids
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self.ids))
+            self._fill(stop)
+            return self._rows[start:stop:step]
+        if index < 0:
+            index += len(self.ids)
+        self._fill(index + 1)
+        return self._rows[index]
+
+    def position(self, node_id):
+        """Row of node_id in these matches, or None."""
+        entry_position = self.index.position(node_id) if node_id in self.ids else None
+        if entry_position is None:
+            return None
+        while self._scanned <= entry_position:
+            self._fill(len(self._rows) + 1)
+        return bisect.bisect_left(self._rows, _sort_key(node_id), key=_sort_key)
+
+
+class _Range:
+    """Rows start..end of a NodeIndex (a prefix search), without copying them."""
+    def __init__(self, index, start, end):
+        self.index = index
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self.index[self.start + start:self.start + stop:step]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.index[self.start + index]
+
+    def __contains__(self, node_id):
+        return self.position(node_id) is not None
+
+    def position(self, node_id):
+        """Row of node_id in this range, or None."""
+        i = self.index.position(node_id)
+        if i is None or not self.start <= i < self.end:
+            return None
+        return i - self.start
+
+
+class VirtualListbox(tk.Frame):
+    """
+    A Listbox that shows a window onto a (possibly huge) sequence of items.
+    Only the visible rows exist as Listbox entries; scrolling just re-renders them.
+    """
+    def __init__(self, master, on_select=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.items = []
+        self.offset = 0
+        self.selected = None
+        self.on_select = on_select
+
+        self.scrollbar = tk.Scrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.listbox = tk.Listbox(self, activestyle="none", exportselection=False)
+        self.listbox.pack(side="left", fill="both", expand=True)
+
+        self.listbox.bind("<<ListboxSelect>>", self._on_listbox_select)
+        self.listbox.bind("<Configure>", lambda e: self.render())
+        self.listbox.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, "units"))
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-1, "units"))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(1, "units"))
+
+    def _rows(self):
+        line_height = max(1, self.listbox.winfo_reqheight() // max(1, int(self.listbox.cget("height"))))
+        return max(1, self.listbox.winfo_height() // line_height)
+
+    def set_items(self, items):
+        """Shows a new sequence (anything with len() and slicing, e.g. a NodeIndex)."""
+        self.items = items
+        self.render()
+
+    def render(self):
+        """Re-creates only the visible rows."""
+        rows = self._rows()
+        self.offset = max(0, min(self.offset, len(self.items) - rows))
+        visible = self.items[self.offset:self.offset + rows]
+        self.listbox.delete(0, tk.END)
+        if visible:
+            self.listbox.insert(tk.END, *visible)
+        if self.selected is not None and self.selected in visible:
+            self.listbox.selection_set(visible.index(self.selected))
+
+        total = max(1, len(self.items))
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + rows) / total))
+
+    def scroll(self, amount, what="units"):
+        step = self._rows() if what == "pages" else 1
+        self.offset += int(amount) * step
+        self.render()
+        return "break"  # Keep the Listbox from scrolling its own (tiny) contents
+
+    def _on_scrollbar(self, action, amount, what=None):
+        if action == "moveto":
+            self.offset = int(float(amount) * len(self.items))
+            self.render()
+        else:
+            self.scroll(amount, what)
+
+    def _on_listbox_select(self, event):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        self.selected = self.listbox.get(selection[0])
+        if self.on_select:
+            self.on_select(self.selected)
+
+    def see(self, index):
+        """Scrolls so that items[index] is visible."""
+        rows = self._rows()
+        if index < self.offset or index >= self.offset + rows:
+            self.offset = max(0, index - rows // 2)
+        self.render()
+
+    def select(self, item, index=None):
+        """Marks item as selected (without firing on_select); index scrolls it into view."""
+        self.selected = item
+        if index is not None:
+            self.see(index)
+        else:
+            self.render()
+
+    def clear_selection(self):
+        self.selected = None
+        self.listbox.selection_clear(0, tk.END)
@@ -0,0 +1,349 @@
+"""
+Constraint-aware path finding: "how can a player actually reach this node?"
+
+Searches the (node, stats) space from the tree's initial_state, following
+next_node_id and unlocked choices and applying their effects, the way
+play_story would. The search is best-first towards the target: the state
+with the fewest links still to go is expanded first (ties go to the state
+furthest along), so a witness is usually found after exploring little more
+than the route itself, however many stat combinations the rest of the story
+allows. That witness isn't always the shortest one; shortest=True (--shortest)
+orders states by steps taken plus links to go instead, which finds a shortest
+witness but can run into max_states on large stories. Three reductions keep
+the search small:
+
+  * Only nodes that have some link path to the target are visited, and only
+    stats that some requirement reads are tracked; the rest can never change
+    which choices unlock.
+  * A stat that only ever grows (or only shrinks) is clamped just past the
+    largest (smallest) constant it is compared with, since every requirement
+    answers the same beyond that point.
+  * Dominance: for a stat only ever tested with >= / > (or <= / <), a state
+    with more (less) of it can do everything a worse one can, so a state that
+    is dominated by one already seen at the same node is dropped.
+
+If the search runs out of states without reaching the target, that is a
+proof that no playthrough can reach it; if it hits max_states, the answer
+is "unknown".
+"""
+import argparse
+import heapq
+import sys
+import time
+from collections import deque, namedtuple
+from operator import ge
+
+import conditions
+import events
+
+# Result status
+REACHABLE = "reachable"
+UNREACHABLE = "unreachable"    # Search exhausted: no playthrough reaches the target
+UNKNOWN = "unknown"            # Gave up after max_states
+
+DEFAULT_MAX_STATES = 500000
+
+# Stat orderings used for dominance
+_HIGHER_IS_BETTER = 1
+_LOWER_IS_BETTER = -1
+_EXACT = 0
+
+# nodes[i] is left through choices[i] (choice text, or None for auto-advance)
+Witness = namedtuple("Witness", ["nodes", "choices", "state"])
+PathResult = namedtuple("PathResult", ["target_id", "status", "paths", "states_explored", "blocked"])
+
+
+class _StatModel:
+    """Which stats matter to requirements, how they're ordered and where they can be clamped."""
+    def __init__(self, tree, initial_state):
+        tests = {}
+        updates = {}
+        for node in tree.nodes.values():
+            for choice in node.choices:
+                for stat, op, value in conditions.requirement_tests(choice.get("requirements")):
+                    tests.setdefault(stat, []).append((op, value))
+                for stat, kind, amount in conditions.effect_updates(choice.get("effects")):
+                    updates.setdefault(stat, []).append((kind, amount))
+
+        self.stats = sorted(tests)
+        self.order = []
+        self.bounds = []    # (floor, cap) per stat, None where it can't be clamped
+        for stat in self.stats:
+            if initial_state.get(stat, 0) >= 0 and all(amount >= 0 for _, amount in updates.get(stat, ())):
+                # Never negative, so flag tests are ordered too: != 0 is > 0 and == 0 is <= 0
+                flag_ops = {("!=", 0): ">", ("==", 0): "<="}
+                tests[stat] = [(flag_ops.get((op, value), op), value) for op, value in tests[stat]]
+            ops = {op for op, _ in tests[stat]}
+            if ops <= {">=", ">"}:
+                self.order.append(_HIGHER_IS_BETTER)
+            elif ops <= {"<=", "<"}:
+                self.order.append(_LOWER_IS_BETTER)
+            else:
+                self.order.append(_EXACT)
+
+            constants = [value for op, value in tests[stat] if op is not None]
+            adds = [amount for kind, amount in updates.get(stat, ()) if kind == "add"]
+            cap = floor = None
+            if constants and None not in ops:
+                if all(amount >= 0 for amount in adds):
+                    cap = max(constants) + 1
+                if all(amount <= 0 for amount in adds):
+                    floor = min(constants) - 1
+            self.bounds.append((floor, cap))
+
+        self.exact_slots = [i for i, order in enumerate(self.order) if order == _EXACT]
+        self.ordered_slots = [i for i, order in enumerate(self.order) if order != _EXACT]
+
+    def key(self, state):
+        """The tracked, clamped part of a state, as a tuple in self.stats order."""
+        values = []
+        for stat, (floor, cap) in zip(self.stats, self.bounds):
+            value = state.get(stat, 0)
+            if cap is not None and value > cap:
+                value = cap
+            elif floor is not None and value < floor:
+                value = floor
+            values.append(value)
+        return tuple(values)
+
+    def state(self, key):
+        return dict(zip(self.stats, key))
+
+    def split(self, key):
+        """(exact part, ordered part): only keys with equal exact parts can dominate each other."""
+        return (tuple(key[i] for i in self.exact_slots),
+                tuple(key[i] * self.order[i] for i in self.ordered_slots))
+
+
+def _dominated(frontier, ordered):
+    """True if some state in frontier is at least as good as `ordered` in every ordered stat."""
+    for other in frontier:
+        if all(map(ge, other, ordered)):
+            return True
+    return False
+
+
+def _leads_to(tree, target_id):
+    """
+    {node_id: fewest links to target_id} for every node with some link path
+    to it, ignoring requirements (backward BFS).
+    """
+    found = {target_id: 0}
+    queue = deque([target_id])
+    while queue:
+        node_id = queue.popleft()
+        for source_id in tree.referrers.get(node_id, ()):
+            if source_id not in found and source_id in tree.nodes:
+                found[source_id] = found[node_id] + 1
+                queue.append(source_id)
+    return found
+
+
+def _transitions(node):
+    """[(choice index or None, next_id, check, apply), ...] the way play_story moves on."""
+    if not node.choices:
+        return [(None, node.next_node_id, None, None)] if node.next_node_id else []
+    return [(i, choice["next_id"], check, apply)
+            for i, (choice, (check, apply)) in enumerate(zip(node.choices, node.compiled_choices))]
+
+
+def find_paths(tree, target_id, start_node_id=None, initial_state=None, all_paths=False,
+               limit=10, max_states=DEFAULT_MAX_STATES, shortest=False):
+    """
+    Searches for playthroughs from start_node_id (default: first node) that reach target_id.
+    Returns a PathResult: with all_paths=False, paths holds one witness (a
+    shortest one with shortest=True); otherwise up to `limit` witnesses,
+    shortest first, one per distinct route.
+    For UNREACHABLE results, `blocked` lists the links into the target that were
+    seen but never unlocked: [(source_id, choice text, requirements), ...].
+    """
+    if start_node_id is None:
+        start_node_id = next(iter(tree.nodes), None)
+    initial_state = dict(tree.initial_state if initial_state is None else initial_state)
+    model = _StatModel(tree, initial_state)
+    # States at nodes with no link path to the target can't matter; the distance guides the search
+    relevant = _leads_to(tree, target_id)
+
+    start = (start_node_id, model.key(initial_state))
+    parents = {start: []}           # (node, key) -> [(parent (node, key), choice index), ...]
+    depth = {start: 0}
+    frontiers = {}                  # node -> {exact part: [ordered parts]}
+    arrivals = []
+    # (links still to go [+ steps so far], -steps, tie-breaker, state): best-first, deepest among equals
+    queue = [(relevant.get(start_node_id, 0), 0, 0, start)]
+    pushed = 0
+    explored = 0
+    truncated = False
+
+    def admit(node_id, key):
+        exact, ordered = model.split(key)
+        by_exact = frontiers.setdefault(node_id, {})
+        frontier = by_exact.get(exact)
+        if frontier is None:
+            by_exact[exact] = [ordered]
+            return True
+        if _dominated(frontier, ordered):
+            return False
+        # Drop states the new one dominates so later checks stay short
+        frontier[:] = [other for other in frontier if not all(map(ge, ordered, other))]
+        frontier.append(ordered)
+        return True
+
+    if start_node_id in relevant:
+        admit(*start)
+    else:
+        queue.clear()
+    while queue:
+        current = heapq.heappop(queue)[3]
+        node_id, key = current
+        if node_id == target_id:
+            arrivals.append(current)
+            if not all_paths or len(arrivals) >= limit:
+                break
+            continue
+        explored += 1
+        if explored > max_states:
+            truncated = True
+            break
+
+        node = tree.nodes.get(node_id)
+        if node is None:
+            continue
+        state = model.state(key)
+        for index, next_id, check, apply in _transitions(node):
+            if next_id not in relevant:
+                continue
+            if check is not None and not check(state):
+                continue
+            next_key = model.key(apply(dict(state))) if apply is not None else key
+            following = (next_id, next_key)
+            if following in depth:
+                # Another shortest route into a state we already have
+                if all_paths and depth[following] == depth[current] + 1:
+                    parents[following].append((current, index))
+                continue
+            if not admit(next_id, next_key):
+                continue
+            steps = depth[following] = depth[current] + 1
+            parents[following] = [(current, index)]
+            pushed += 1
+            priority = relevant[next_id] + steps if shortest else relevant[next_id]
+            heapq.heappush(queue, (priority, -steps, pushed, following))
+
+    paths = _witnesses(tree, parents, arrivals, initial_state, limit if all_paths else 1)
+    if paths:
+        status = REACHABLE
+    else:
+        status = UNKNOWN if truncated else UNREACHABLE
+    blocked = _blocked_links(tree, target_id, frontiers) if status == UNREACHABLE else []
+    return PathResult(target_id, status, paths, explored, blocked)
+
+
+def _witnesses(tree, parents, arrivals, initial_state, limit):
+    """Walks parent links back from each arrival; replays effects for the real final state."""
+    found = []
+    seen_routes = set()
+    # Each stack entry is a partial route, built backwards: [(state, choice index), ...]
+    stack = [[(arrival, None)] for arrival in reversed(arrivals)]
+    while stack and len(found) < limit:
+        route = stack.pop()
+        head = route[-1][0]
+        if parents[head]:
+            for parent, index in reversed(parents[head]):
+                stack.append(route + [(parent, index)])
+            continue
+
+        route.reverse()
+        # Each entry holds the choice index used to leave that state
+        nodes = [state[0] for state, _ in route]
+        indices = [index for _, index in route]
+        if (tuple(nodes), tuple(indices)) in seen_routes:
+            continue
+        seen_routes.add((tuple(nodes), tuple(indices)))
+
+        state = dict(initial_state)
+        choices = []
+        for node_id, index in zip(nodes, indices):
+            if index is None:
+                choices.append(None)
+                continue
+            choice = tree.nodes[node_id].choices[index]
+            tree.nodes[node_id].compiled_choices[index][1](state)
+            choices.append(choice["text"])
+        found.append(Witness(nodes, choices, state))
+    found.sort(key=lambda witness: len(witness.nodes))
+    return found
+
+
+def _blocked_links(tree, target_id, visited):
+    """Choices into the target from nodes the search reached, none of which ever unlocked."""
+    blocked = []
+    for source_id in tree.referrers_of(target_id):
+        if source_id not in visited:
+            continue
+        for choice in tree.nodes[source_id].choices:
+            if choice["next_id"] == target_id:
+                blocked.append((source_id, choice["text"], choice.get("requirements", {})))
+    return blocked
+
+
+def describe(result):
+    """Human-readable lines for a PathResult (used by the CLI and the editor)."""
+    lines = []
+    if result.status == REACHABLE:
+        for number, witness in enumerate(result.paths, start=1):
+            lines.append(f"Path {number} ({len(witness.nodes) - 1} steps):")
+            for node_id, choice_text in zip(witness.nodes, witness.choices):
+                if node_id == result.target_id:
+                    lines.append(f"   {node_id}")
+                elif choice_text is None:
+                    lines.append(f"   {node_id} -> [auto]")
+                else:
+                    lines.append(f"   {node_id} -> \"{choice_text}\"")
+            lines.append(f"   Final stats: {witness.state}")
+    elif result.status == UNREACHABLE and not result.states_explored:
+        lines.append(f"'{result.target_id}' is unreachable: no chain of links leads there from the start.")
+    elif result.status == UNREACHABLE:
+        lines.append(f"'{result.target_id}' is unreachable: all {result.states_explored} "
+                     f"reachable (node, stats) states were explored.")
+        for source_id, text, requirements in result.blocked:
+            lines.append(f"   {source_id} -> \"{text}\" never unlocks (requires {requirements})")
+        if not result.blocked:
+            lines.append("   No node that links to it can be reached.")
+    else:
+        lines.append(f"Gave up after {result.states_explored} states; raise --max-states to keep searching.")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find playthroughs that reach a node, or prove none exist.")
+    parser.add_argument("story")
+    parser.add_argument("target", help="Node ID to reach")
+    parser.add_argument("--start", help="Start node ID (default: first node)")
+    parser.add_argument("--all", type=int, metavar="N", help="List up to N witness paths instead of one")
+    parser.add_argument("--shortest", action="store_true",
+                        help="Guarantee the shortest witness (may need many more states)")
+    parser.add_argument("--max-states", type=int, default=DEFAULT_MAX_STATES)
+    args = parser.parse_args(argv)
+
+    import narranode as engine
+    tree = engine.DialogueTree()
+    if not tree.load_from_json(args.story):
+        return 2
+    if args.target not in tree.nodes:
+        print(f"[System] Node '{args.target}' does not exist.")
+        return 2
+
+    started = time.perf_counter()
+    result = find_paths(tree, args.target, start_node_id=args.start, all_paths=bool(args.all),
+                        limit=args.all or 1, max_states=args.max_states, shortest=args.shortest)
+    elapsed = time.perf_counter() - started
+    print("\n".join(describe(result)))
+    print(f"[System] {result.status} ({result.states_explored} states in {elapsed:.2f}s)")
+    # 0 = reachable, 1 = proven unreachable, 2 = unknown
+    return {REACHABLE: 0, UNREACHABLE: 1}.get(result.status, 2)
+
+
+if __name__ == "__main__":
+    events.enable_console()
+    sys.exit(main())
@@ -0,0 +1,437 @@
+"""
+Chapter-sharded story projects: a directory instead of one story_data.json.
+
+    my_story/
+        project.json            {"initial_state": {...}, "chapters": ["intro.json", "act1.json", ...]}
+        intro.json              {"nodes": {...}}   (same node layout as story_data.json)
+        act1.json
+        .narranode_index.json   node ID -> chapter cache (generated; keep it out of version control)
+
+Each team edits its own chapter files, and links may point into any chapter.
+The index maps every node ID to its chapter. It is cached per chapter under
+that file's mtime and size, so opening a project only re-reads chapters that
+changed. ShardedNodes stands in for tree.nodes and reads a chapter the first
+time get_node() touches one of its nodes. A full load instead parses all
+chapters up front, in parallel.
+
+DialogueTree.load_from_json / save_to_json accept a project directory, so
+every tool that opens a story file opens a project too.
+
+    python project.py split story.json my_story/ [--nodes-per-chapter 500]
+    python project.py join my_story/ story.json
+    python project.py validate my_story/
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections.abc import MutableMapping
+
+import events
+import narranode as engine
+
+PROJECT_FILE = "project.json"
+INDEX_FILE = ".narranode_index.json"
+INDEX_VERSION = 1
+DEFAULT_CHAPTER = "chapter_01.json"
+
+# Issue kinds (same (kind, node_id, detail) shape as validation.StoryValidator.issues())
+DUPLICATE_ID = "duplicate_id"   # The same node ID is defined in two chapters
+DANGLING = "dangling"           # A link points at a node ID no chapter defines
+
+
+def _read_chapter(path):
+    """{node_id: node_dict} from one chapter file (module-level so pool workers can run it)."""
+    with open(path, "r") as f:
+        return json.load(f)["nodes"]
+
+
+def _stamp(path):
+    info = os.stat(path)
+    return [info.st_mtime_ns, info.st_size]
+
+
+class StoryProject:
+    """
+    One project directory. Has the same load(tree) / save(tree) / wait() /
+    filename interface as journal.StoryJournal, so the editor can use either.
+    """
+    def __init__(self, directory, workers=None):
+        self.directory = directory
+        self.filename = directory
+        self.workers = workers
+        self.initial_state = {}
+        self.chapters = []
+        self.duplicates = []    # (node_id, chapter that keeps it, chapter that also defines it)
+        self.entries = {}       # chapter -> {"stamp": [mtime_ns, size], "ids": [...]}, as of build_index
+        self.read_manifest()
+
+    def path(self, chapter):
+        return os.path.join(self.directory, chapter)
+
+    def read_manifest(self):
+        manifest_path = self.path(PROJECT_FILE)
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+        self.initial_state = manifest.get("initial_state", {})
+        chapters = manifest.get("chapters")
+        if chapters is None and os.path.isdir(self.directory):
+            # No explicit order: every .json file in the folder, alphabetically (dotfiles are caches)
+            chapters = sorted(name for name in os.listdir(self.directory)
+                              if name.endswith(".json") and name != PROJECT_FILE and not name.startswith("."))
+        self.chapters = list(chapters or [])
+
+    def write_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        engine.write_json_atomic({"initial_state": self.initial_state, "chapters": self.chapters},
+                                 self.path(PROJECT_FILE))
+
+    # --- INDEX ---
+    def build_index(self, parsed=None):
+        """
+        node_id -> chapter, in chapter order. Chapters whose cached entry is stale
+        are re-read; parsed ({chapter: nodes_data}) supplies chapters already in memory.
+        Returns (index, {chapter: nodes_data} for every chapter read along the way).
+        """
+        parsed = dict(parsed or {})
+        cached = self._cached_index()
+
+        stale = []
+        entries = {}
+        for chapter in self.chapters:
+            if not os.path.exists(self.path(chapter)):
+                entries[chapter] = {"stamp": None, "ids": []}
+                continue
+            stamp = _stamp(self.path(chapter))
+            entry = cached.get(chapter)
+            if chapter in parsed or entry is None or entry.get("stamp") != stamp:
+                stale.append(chapter)
+            else:
+                entries[chapter] = entry
+        parsed.update(self.read_chapters([c for c in stale if c not in parsed]))
+        for chapter in stale:
+            entries[chapter] = {"stamp": _stamp(self.path(chapter)), "ids": list(parsed[chapter])}
+
+        self.entries = entries
+        index = {}
+        self.duplicates = []
+        for chapter in self.chapters:
+            for node_id in entries[chapter]["ids"]:
+                if node_id in index:
+                    self.duplicates.append((node_id, index[node_id], chapter))
+                else:
+                    index[node_id] = chapter
+
+        if stale or set(cached) != set(entries):
+            self._store_index(entries)
+        return index, parsed
+
+    def _cached_index(self):
+        try:
+            with open(self.path(INDEX_FILE), "r") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                return data["chapters"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def _store_index(self, entries):
+        try:
+            engine.write_json_atomic({"version": INDEX_VERSION, "chapters": entries},
+                                     self.path(INDEX_FILE), indent=None)
+        except OSError:
+            pass    # Read-only checkout: the index is only a cache
+
+    def read_chapters(self, chapters):
+        """{chapter: nodes_data}, parsed across a process pool when there are several."""
+        chapters = [c for c in chapters if os.path.exists(self.path(c))]
+        workers = min(self.workers or os.cpu_count() or 1, len(chapters))
+        paths = [self.path(c) for c in chapters]
+        if workers <= 1:
+            return {chapter: _read_chapter(path) for chapter, path in zip(chapters, paths)}
+        with multiprocessing.Pool(workers) as pool:
+            return dict(zip(chapters, pool.map(_read_chapter, paths)))
+
+    # --- LOAD / SAVE ---
+    def open_nodes(self):
+        """ShardedNodes that read chapters on first use."""
+        index, parsed = self.build_index()
+        nodes = ShardedNodes(self, index)
+        for chapter, nodes_data in parsed.items():
+            nodes.add_parsed(chapter, nodes_data)
+        return nodes
+
+    def load(self, tree):
+        """Loads every chapter (in parallel) into tree. Returns False if the directory is missing."""
+        if not os.path.isdir(self.directory):
+            tree.events.emit(events.LOAD_MISSING, tree, self.directory)
+            return False
+        started = time.perf_counter()
+        self.read_manifest()
+        index, parsed = self.build_index(self.read_chapters(self.chapters))
+        nodes = ShardedNodes(self, index)
+        for chapter, nodes_data in parsed.items():
+            nodes.add_parsed(chapter, nodes_data)
+
+        tree.initial_state = self.initial_state
+        tree.state = tree.initial_state.copy()
+        tree.nodes = nodes
+        tree.rebuild_index()
+        tree.clear_dirty()
+        if tree.events.loaded:
+            tree.events.emit(events.LOADED, tree, self.directory, len(nodes), time.perf_counter() - started)
+        return True
+
+    def save(self, tree, full=False):
+        """
+        Rewrites the chapters holding nodes created, edited or deleted since the
+        last save (every chapter when full). Returns the number of nodes written.
+        """
+        started = time.perf_counter()
+        nodes = tree.nodes
+        if isinstance(nodes, ShardedNodes) and nodes.project is not self and \
+                os.path.abspath(nodes.project.directory) == os.path.abspath(self.directory):
+            self.chapters = nodes.project.chapters
+        elif not isinstance(nodes, ShardedNodes) or nodes.project is not self:
+            # A tree from elsewhere (e.g. a single story file): one chapter holds everything
+            sharded = ShardedNodes(self, {})
+            sharded.default_chapter = self.chapters[0] if self.chapters else DEFAULT_CHAPTER
+            sharded.loaded = {sharded.default_chapter: {}}
+            for node_id, node in nodes.items():
+                sharded[node_id] = node
+            nodes, full = sharded, True
+
+        if full:
+            chapters = set(nodes.loaded) | set(nodes.dirty_chapters)
+        else:
+            chapters = set(nodes.dirty_chapters)
+            chapters.update(nodes.chapter_of(node_id) for node_id in tree.dirty_nodes if node_id in nodes)
+        os.makedirs(self.directory, exist_ok=True)
+        entries = self._cached_index()
+        written = 0
+        for chapter in sorted(chapters):
+            chapter_nodes = nodes.chapter_nodes(chapter)
+            engine.write_json_atomic({"nodes": {node_id: node.to_dict() for node_id, node in chapter_nodes.items()}},
+                                     self.path(chapter))
+            entries[chapter] = {"stamp": _stamp(self.path(chapter)), "ids": list(chapter_nodes)}
+            written += len(chapter_nodes)
+        new_chapters = [c for c in sorted(chapters) if c not in self.chapters]
+        if new_chapters or full or tree.initial_state_dirty or not os.path.exists(self.path(PROJECT_FILE)):
+            self.chapters.extend(new_chapters)
+            self.initial_state = tree.initial_state
+            self.write_manifest()
+        self._store_index({chapter: entries[chapter] for chapter in self.chapters if chapter in entries})
+
+        nodes.dirty_chapters.clear()
+        tree.clear_dirty()
+        if tree.events.saved:
+            tree.events.emit(events.SAVED, tree, self.directory, written, time.perf_counter() - started)
+        return written
+
+    def wait(self):
+        """Saves are synchronous; here for StoryJournal compatibility."""
+
+    # --- VALIDATION ---
+    def validate(self):
+        """
+        Cross-chapter checks without building any nodes: duplicate IDs, and links
+        whose target no chapter defines (looked up in the index). Returns issues.
+        """
+        self.read_manifest()
+        index, parsed = self.build_index(self.read_chapters(self.chapters))
+        issues = [(DUPLICATE_ID, node_id, f"defined in both {first} and {second}")
+                  for node_id, first, second in self.duplicates]
+        for chapter in self.chapters:
+            for node_id, node_data in (parsed.get(chapter) or {}).items():
+                targets = [node_data.get("NextNode")] + [c["next_id"] for c in node_data.get("Choices", [])]
+                for target in targets:
+                    if target and target not in index:
+                        issues.append((DANGLING, node_id, f"{chapter}: links to missing node '{target}'"))
+        return issues
+
+    def cross_links(self):
+        """Number of links that point into another chapter (reads every chapter)."""
+        index, parsed = self.build_index(self.read_chapters(self.chapters))
+        count = 0
+        for chapter, nodes_data in parsed.items():
+            for node_data in nodes_data.values():
+                targets = [node_data.get("NextNode")] + [c["next_id"] for c in node_data.get("Choices", [])]
+                count += sum(1 for t in targets if t in index and index[t] != chapter)
+        return count
+
+
+class ShardedNodes(MutableMapping):
+    """
+    {node_id: DialogueNode} over a project's chapters. Membership, len() and
+    iteration only use the index; a chapter is parsed the first time one of its
+    nodes is read. New nodes go into default_chapter (the editor sets it to the
+    chapter of the node on screen).
+    """
+    def __init__(self, project, index):
+        self.project = project
+        self.index = index              # node_id -> chapter
+        self.loaded = {}                # chapter -> {node_id: DialogueNode}, read chapters only
+        self.dirty_chapters = set()     # Chapters that lost or moved nodes since the last save
+        self.default_chapter = project.chapters[-1] if project.chapters else DEFAULT_CHAPTER
+
+    def add_parsed(self, chapter, nodes_data):
+        """Builds nodes for a chapter read elsewhere (IDs another chapter owns are skipped)."""
+        nodes = {}
+        for node_id, node_data in nodes_data.items():
+            if self.index.get(node_id) == chapter:
+                nodes[node_id] = engine.DialogueNode.from_dict(node_data)
+        self.loaded[chapter] = nodes
+        return nodes
+
+    def chapter_nodes(self, chapter):
+        nodes = self.loaded.get(chapter)
+        if nodes is None:
+            path = self.project.path(chapter)
+            nodes = self.add_parsed(chapter, _read_chapter(path)) if os.path.exists(path) else {}
+            self.loaded[chapter] = nodes
+        return nodes
+
+    def chapter_of(self, node_id):
+        return self.index.get(node_id)
+
+    def get(self, node_id, default=None):
+        chapter = self.index.get(node_id)
+        if chapter is None:
+            return default
+        return self.chapter_nodes(chapter).get(node_id, default)
+
+    def __getitem__(self, node_id):
+        node = self.get(node_id)
+        if node is None:
+            raise KeyError(node_id)
+        return node
+
+    def __setitem__(self, node_id, node):
+        chapter = self.index.get(node_id)
+        if chapter is None:
+            chapter = self.index[node_id] = self.default_chapter
+            self.dirty_chapters.add(chapter)
+        self.chapter_nodes(chapter)[node_id] = node
+
+    def __delitem__(self, node_id):
+        chapter = self.index.pop(node_id)
+        self.chapter_nodes(chapter).pop(node_id, None)
+        self.dirty_chapters.add(chapter)
+
+    def __contains__(self, node_id):
+        return node_id in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def copy(self):
+        """A copy of the index and chapter tables; node objects are shared (see DialogueTree.snapshot)."""
+        nodes = ShardedNodes(self.project, dict(self.index))
+        nodes.loaded = {chapter: dict(chapter_nodes) for chapter, chapter_nodes in self.loaded.items()}
+        nodes.dirty_chapters = set(self.dirty_chapters)
+        nodes.default_chapter = self.default_chapter
+        return nodes
+
+    def reload_chapters(self, chapters, deleted=()):
+        """
+        Takes {chapter: node IDs it owns now} for chapters that changed on disk
+        (hot reload, see hotreload.py). Their parsed nodes are dropped and read
+        again on next use; deleted IDs leave the index.
+        """
+        for node_id in deleted:
+            self.index.pop(node_id, None)
+        for chapter, node_ids in chapters.items():
+            self.loaded.pop(chapter, None)
+            for node_id in node_ids:
+                self.index[node_id] = chapter
+
+    def move(self, node_id, chapter):
+        """Moves a node into another chapter (both files are rewritten on the next save)."""
+        node = self[node_id]
+        del self[node_id]
+        self.index[node_id] = chapter
+        self.chapter_nodes(chapter)[node_id] = node
+        self.dirty_chapters.add(chapter)
+
+
+def open_tree(directory):
+    """
+    A DialogueTree over a project that reads chapters only as play reaches them
+    (for the CLI engine). Its reverse-link index is left empty.
+    """
+    started = time.perf_counter()
+    story_project = StoryProject(directory)
+    tree = engine.DialogueTree(initial_state=dict(story_project.initial_state))
+    tree.nodes = story_project.open_nodes()
+    if tree.events.loaded:
+        tree.events.emit(events.LOADED, tree, directory, len(tree.nodes), time.perf_counter() - started)
+    return tree
+
+
+# --- CONVERSION ---
+def split(json_filename, directory, nodes_per_chapter=500):
+    """Turns one story file into a project, nodes_per_chapter nodes per chapter in file order."""
+    tree = engine.DialogueTree()
+    if not tree.load_from_json(json_filename):
+        return None
+    story_project = StoryProject(directory)
+    nodes = ShardedNodes(story_project, {})
+    for position, (node_id, node) in enumerate(tree.nodes.items()):
+        nodes.default_chapter = f"chapter_{position // nodes_per_chapter + 1:02d}.json"
+        nodes.loaded.setdefault(nodes.default_chapter, {})
+        nodes[node_id] = node
+    tree.nodes = nodes
+    story_project.chapters = []
+    story_project.save(tree, full=True)
+    return story_project
+
+
+def join(directory, json_filename):
+    """Writes a whole project back out as a single story file."""
+    tree = engine.DialogueTree()
+    if not StoryProject(directory).load(tree):
+        return False
+    tree.nodes = dict(tree.nodes.items())
+    tree.save_to_json(json_filename)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chapter-sharded NarraNode projects.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    split_parser = commands.add_parser("split", help="Story file -> project directory")
+    split_parser.add_argument("story")
+    split_parser.add_argument("directory")
+    split_parser.add_argument("--nodes-per-chapter", type=int, default=500)
+    join_parser = commands.add_parser("join", help="Project directory -> story file")
+    join_parser.add_argument("directory")
+    join_parser.add_argument("story")
+    validate_parser = commands.add_parser("validate", help="Duplicate IDs and cross-chapter dangling links")
+    validate_parser.add_argument("directory")
+    args = parser.parse_args()
+
+    events.enable_console()
+    if args.command == "split":
+        story_project = split(args.story, args.directory, args.nodes_per_chapter)
+        if story_project is None:
+            sys.exit(1)
+        print(f"[System] {len(story_project.chapters)} chapters in {args.directory}")
+    elif args.command == "join":
+        sys.exit(0 if join(args.directory, args.story) else 1)
+    else:
+        story_project = StoryProject(args.directory)
+        started = time.perf_counter()
+        issues = story_project.validate()
+        for kind, node_id, detail in issues:
+            print(f"[{kind}] {node_id}: {detail}")
+        print(f"[System] {len(story_project.chapters)} chapters, {len(issues)} issue(s) "
+              f"in {time.perf_counter() - started:.2f}s")
+        sys.exit(1 if issues else 0)
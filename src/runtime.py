@@ -0,0 +1,156 @@
+from types import MappingProxyType
+
+import narranode as engine
+import compact
+
+# Session statuses
+STATUS_CHOOSING = "choosing"    # Node has at least one unlocked choice
+STATUS_LINEAR = "linear"        # No choices, auto-advance to next_node_id
+STATUS_ENDED = "ended"          # No choices and no next node (End of Story)
+STATUS_DEAD_END = "dead_end"    # Choices exist but all are locked (Game Over)
+STATUS_MISSING = "missing"      # Current node ID is not in the story
+
+
+class Story:
+    """
+    A frozen story graph that any number of sessions (and threads) can share.
+    Holds no player state; build one from a DialogueTree with Story.from_tree().
+    """
+    __slots__ = ("nodes", "initial_state")
+
+    def __init__(self, nodes, initial_state=None):
+        object.__setattr__(self, "nodes", MappingProxyType(dict(nodes)))
+        object.__setattr__(self, "initial_state", MappingProxyType(dict(initial_state or {})))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Story is read-only")
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node_id):
+        return node_id in self.nodes
+
+    def __reduce__(self):
+        # Read-only mappings can't be pickled; ship plain node dicts and rebuild (e.g. for worker processes)
+        nodes_data = {node_id: compact.node_to_dict(node) for node_id, node in self.nodes.items()}
+        return (_restore_story, (nodes_data, dict(self.initial_state)))
+
+    @classmethod
+    def from_tree(cls, tree):
+        """Snapshots the nodes and initial_state of a DialogueTree into compact, shared form."""
+        return cls(compact.compact_nodes(tree.nodes), tree.initial_state)
+
+    @classmethod
+    def load(cls, filename="scripts/story_data.json"):
+        """Loads a story file through DialogueTree and freezes it. Returns None if missing."""
+        tree = engine.DialogueTree()
+        if not tree.load_from_json(filename):
+            return None
+        return cls.from_tree(tree)
+
+    def with_changes(self, changes):
+        """
+        A new Story with a hot reload's hotreload.StoryChanges swapped in. Only
+        changed nodes are compacted; the rest are shared with this Story.
+        """
+        nodes = self.nodes.copy()   # Straight dict copy; dict(proxy) goes key by key
+        for node_id in changes.deleted:
+            nodes.pop(node_id, None)
+        compactor = compact.Compactor()
+        for node_id, node_data in changes.nodes.items():
+            nodes[compactor.intern(node_id)] = compactor.node_from_dict(node_data)
+        initial_state = self.initial_state if changes.initial_state is None else changes.initial_state
+        return Story(nodes, initial_state)
+
+    def get_node(self, node_id):
+        return self.nodes.get(node_id)
+
+    def first_node_id(self):
+        """The node the CLI engine starts from (first node in file order)."""
+        return next(iter(self.nodes), None)
+
+    def new_session(self, start_node_id=None, state=None, locale=None):
+        """Starts a player at start_node_id (default: first node) with a copy of initial_state."""
+        if start_node_id is None:
+            start_node_id = self.first_node_id()
+        return Session(self, start_node_id, state, locale)
+
+
+def _restore_story(nodes_data, initial_state):
+    compactor = compact.Compactor()
+    nodes = {compactor.intern(node_id): compactor.node_from_dict(data) for node_id, data in nodes_data.items()}
+    return Story(nodes, initial_state)
+
+
+class Session:
+    """
+    One player's cursor into a shared Story: the current node ID, their stats
+    and the locale they read in (None: the story's own text, see localization.py).
+    Mirrors play_story's rules without doing any input() or print().
+    """
+    __slots__ = ("story", "node_id", "state", "locale")
+
+    def __init__(self, story, node_id, state=None, locale=None):
+        self.story = story
+        self.node_id = node_id
+        self.state = dict(story.initial_state) if state is None else dict(state)
+        self.locale = locale
+
+    @property
+    def node(self):
+        return self.story.get_node(self.node_id)
+
+    def check_requirements(self, requirements):
+        return engine.check_state_requirements(self.state, requirements)
+
+    def apply_effects(self, effects):
+        engine.apply_state_effects(self.state, effects)
+
+    def evaluate_choices(self):
+        """Returns [(choice, is_unlocked), ...] for the current node, in display order."""
+        node = self.node
+        if node is None:
+            return []
+        state = self.state
+        return [(choice, choice.check(state)) for choice in node.choices]
+
+    def available_choices(self):
+        """The unlocked choices, numbered the same way play_story numbers them."""
+        return [choice for choice, unlocked in self.evaluate_choices() if unlocked]
+
+    @property
+    def status(self):
+        node = self.node
+        if node is None:
+            return STATUS_MISSING
+        if not node.choices:
+            return STATUS_LINEAR if node.next_node_id else STATUS_ENDED
+        if not self.available_choices():
+            return STATUS_DEAD_END
+        return STATUS_CHOOSING
+
+    @property
+    def is_finished(self):
+        return self.status not in (STATUS_CHOOSING, STATUS_LINEAR)
+
+    def advance(self):
+        """Follows linear flow (next_node_id) from a choice-less node."""
+        node = self.node
+        if node is None or node.choices or not node.next_node_id:
+            raise ValueError(f"Node '{self.node_id}' has no linear flow to follow.")
+        self.node_id = node.next_node_id
+        return self.node_id
+
+    def choose(self, index):
+        """
+        Takes the index-th available choice (0-based), applies its effects
+        and moves to its target. Returns the chosen compact.Choice.
+        """
+        available = self.available_choices()
+        if not 0 <= index < len(available):
+            raise IndexError(f"Choice {index} is not available at node '{self.node_id}'.")
+        selected = available[index]
+        selected.apply(self.state)
+        self.node_id = selected.next_id
+        return selected
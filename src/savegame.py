@@ -0,0 +1,274 @@
+"""
+Compact, delta-encoded save games.
+
+A save holds the player's node ID and only the stats that differ from the
+story's initial_state. Stats are written as small integer IDs from a per-story
+SaveSchema rather than as names.
+
+Layout (one save):
+    u8      FORMAT_VERSION
+    varint  len(node_id), node_id (utf-8)
+    varint  number of changed stats
+    per stat:
+        varint  (stat_id << 1) | is_float
+        value   zigzag varint for ints, 8-byte little-endian double for floats
+
+The schema only ever grows (IDs are never reused), and it is stored next to
+the story (story.stats.json). A save written before a stat was added simply
+has no delta for it, so the player gets the stat's current initial value.
+A stat the schema doesn't have yet (e.g. added by a hot reload) is written to
+the schema file before any save uses its ID.
+"""
+import json
+import os
+import struct
+import sys
+import time
+
+import conditions
+import events
+import narranode as engine
+import runtime
+import varint
+
+FORMAT_VERSION = 1
+
+_DOUBLE = struct.Struct("<d")
+
+
+class SaveError(ValueError):
+    """Raised for saves that can't be decoded with this story's schema."""
+
+
+def schema_path(story_filename):
+    if os.path.isdir(story_filename):
+        return os.path.join(story_filename, ".stats.json")
+    return os.path.splitext(story_filename)[0] + ".stats.json"
+
+
+class SaveSchema:
+    """Append-only stat name <-> integer ID table for one story."""
+    def __init__(self, names=()):
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.id_for(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def id_for(self, stat):
+        """The stat's ID, assigning the next free one to a new stat."""
+        stat_id = self.ids.get(stat)
+        if stat_id is None:
+            stat_id = self.ids[stat] = len(self.names)
+            self.names.append(stat)
+        return stat_id
+
+    def add_saved(self, stat, filename):
+        """Gives a new stat the next ID and saves the schema; if saving fails, the ID isn't kept."""
+        stat_id = self.id_for(stat)
+        try:
+            self.save(filename)
+        except OSError:
+            del self.ids[stat]
+            self.names.pop()
+            raise
+        return stat_id
+
+    def extend(self, story):
+        """Adds every stat a story (Story or DialogueTree) mentions. Returns True if any were new."""
+        before = len(self.names)
+        for stat in story.initial_state:
+            self.id_for(stat)
+        for node in story.nodes.values():
+            for choice in node.choices:
+                # DialogueTree choices are dicts; runtime.Story ones are compact.Choice tuples
+                if isinstance(choice, dict):
+                    requirements, effects = choice.get("requirements"), choice.get("effects")
+                else:
+                    requirements, effects = choice.requirements, choice.effects
+                for stat, _, _ in conditions.requirement_tests(requirements):
+                    self.id_for(stat)
+                for stat in effects or ():
+                    self.id_for(stat)
+        return len(self.names) != before
+
+    @classmethod
+    def load(cls, filename):
+        if not os.path.exists(filename):
+            return cls()
+        with open(filename, "r") as f:
+            return cls(json.load(f)["stats"])
+
+    def save(self, filename):
+        engine.write_json_atomic({"version": FORMAT_VERSION, "stats": self.names}, filename)
+
+    @classmethod
+    def for_story(cls, story, story_filename):
+        """The story's stored schema, extended (and re-saved) with any stats added since."""
+        path = schema_path(story_filename)
+        schema = cls.load(path)
+        if schema.extend(story) or not os.path.exists(path):
+            schema.save(path)
+        return schema
+
+
+class SaveCodec:
+    """
+    Encodes/decodes (node_id, state) saves against one story's schema and
+    initial_state. With schema_file, stats the schema lacks are added to it and
+    saved before they are used; without one, encoding them raises SaveError.
+    """
+    def __init__(self, schema, initial_state, schema_file=None):
+        self.schema = schema
+        self.initial_state = dict(initial_state)
+        self.schema_file = schema_file
+        self._prefixes = {}     # node_id -> version byte + length-prefixed ID (IDs repeat across players)
+
+    def _prefix(self, node_id):
+        out = bytearray((FORMAT_VERSION,))
+        key = str(node_id).encode("utf-8")
+        varint.encode(len(key), out)
+        out += key
+        prefix = self._prefixes[node_id] = bytes(out)
+        return prefix
+
+    def encode(self, node_id, state):
+        out = bytearray(self._prefixes.get(node_id) or self._prefix(node_id))
+
+        initial = self.initial_state
+        changed = [(stat, value) for stat, value in state.items() if value != initial.get(stat, 0)]
+        # A stat missing from state reads as 0, which differs from a non-zero initial value
+        changed.extend((stat, 0) for stat in initial if stat not in state and initial[stat] != 0)
+        varint.encode(len(changed), out)
+        ids = self.schema.ids
+        for stat, value in changed:
+            if not isinstance(value, (int, float)):
+                raise SaveError(f"Stat '{stat}' has a non-numeric value {value!r}")
+            stat_id = ids.get(stat)
+            if stat_id is None:
+                stat_id = self._new_stat(stat)
+            if isinstance(value, float) and not value.is_integer():
+                varint.encode(stat_id << 1 | 1, out)
+                out += _DOUBLE.pack(value)
+            else:
+                varint.encode(stat_id << 1, out)
+                varint.encode_signed(int(value), out)
+        return bytes(out)
+
+    def _new_stat(self, stat):
+        """An ID for a stat the schema lacks; it must be on disk before a save uses it."""
+        if self.schema_file is None:
+            raise SaveError(f"Stat '{stat}' isn't in the save schema")
+        try:
+            return self.schema.add_saved(stat, self.schema_file)
+        except OSError as e:
+            raise SaveError(f"Can't add stat '{stat}' to {self.schema_file}: {e}")
+
+    def decode(self, data):
+        """Returns (node_id, state). Stats the save doesn't mention get their initial value."""
+        if not data or data[0] != FORMAT_VERSION:
+            raise SaveError("Not a save game (or an unsupported version)")
+        try:
+            length, pos = varint.decode(data, 1)
+            if pos + length > len(data):
+                raise IndexError(pos + length)
+            node_id = data[pos:pos + length].decode("utf-8")
+            pos += length
+            count, pos = varint.decode(data, pos)
+            state = self.initial_state.copy()
+            names = self.schema.names
+            for _ in range(count):
+                key, pos = varint.decode(data, pos)
+                stat_id = key >> 1
+                if stat_id >= len(names):
+                    raise SaveError(f"Save uses stat #{stat_id}, which this story's schema doesn't have")
+                if key & 1:
+                    state[names[stat_id]] = _DOUBLE.unpack_from(data, pos)[0]
+                    pos += 8
+                else:
+                    value, pos = varint.decode_signed(data, pos)
+                    state[names[stat_id]] = value
+        except (IndexError, struct.error, UnicodeDecodeError) as e:
+            raise SaveError(f"Truncated or corrupt save ({e.__class__.__name__})")
+        return node_id, state
+
+    # --- SESSIONS ---
+    def save_session(self, session):
+        return self.encode(session.node_id, session.state)
+
+    def restore_session(self, story, data):
+        node_id, state = self.decode(data)
+        return runtime.Session(story, node_id, state)
+
+    # --- BULK ---
+    def encode_many(self, saves):
+        """[(node_id, state), ...] -> [bytes, ...]"""
+        encode = self.encode
+        return [encode(node_id, state) for node_id, state in saves]
+
+    def decode_many(self, blobs):
+        decode = self.decode
+        return [decode(data) for data in blobs]
+
+
+def codec_for(story, story_filename):
+    """SaveCodec for a story, using (and updating) its stored schema."""
+    return SaveCodec(SaveSchema.for_story(story, story_filename), story.initial_state,
+                     schema_file=schema_path(story_filename))
+
+
+# --- BENCHMARK ---
+def _benchmark(story, count, seed=0):
+    """Random playthroughs' end states, saved as JSON and as binary deltas."""
+    import random
+    import simulator
+
+    schema = SaveSchema()
+    schema.extend(story)
+    codec = SaveCodec(schema, story.initial_state)
+
+    rng = random.Random(seed)
+    policy = simulator.RandomPolicy()
+    start = story.first_node_id()
+    distinct = []
+    for _ in range(min(count, 1000)):
+        playthrough = simulator.play_session(story, start, policy, rng, max_steps=rng.randint(1, 50))
+        distinct.append((playthrough.final_node_id, dict(playthrough.state)))
+    saves = [distinct[i % len(distinct)] for i in range(count)]
+
+    results = {"saves": count}
+    started = time.perf_counter()
+    as_json = [json.dumps({"node_id": node_id, "state": state}).encode() for node_id, state in saves]
+    results["json_encode_per_s"] = count / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for data in as_json:
+        json.loads(data)
+    results["json_decode_per_s"] = count / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    blobs = codec.encode_many(saves)
+    results["binary_encode_per_s"] = count / (time.perf_counter() - started)
+    started = time.perf_counter()
+    decoded = codec.decode_many(blobs)
+    elapsed = time.perf_counter() - started
+    results["binary_decode_per_s"] = count / elapsed
+    results["binary_decode_us"] = elapsed / count * 1e6
+
+    results["json_bytes_per_save"] = sum(map(len, as_json)) / count
+    results["binary_bytes_per_save"] = sum(map(len, blobs)) / count
+    for (node_id, state), (decoded_id, decoded_state) in zip(saves[:1000], decoded):
+        expected = dict(story.initial_state, **state)
+        assert decoded_id == node_id and all(decoded_state.get(k, 0) == v for k, v in expected.items())
+    return results
+
+
+if __name__ == "__main__":
+    story_path = sys.argv[1] if len(sys.argv) > 1 else "scripts/story_data.json"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    events.enable_console()
+    story = runtime.Story.load(story_path)
+    if story is None:
+        sys.exit(1)
+    print(json.dumps(_benchmark(story, count), indent=4))
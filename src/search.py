@@ -0,0 +1,222 @@
+"""
+Full-text search over dialogue text, speakers and choice text.
+
+SearchIndex keeps an inverted index (token -> node -> positions) that is built
+once and then updated one node at a time through the tree's edge listeners,
+so it stays current as the editor saves nodes and adds choices.
+
+Query syntax (all parts must match):
+    amulet                  token anywhere in the node's text or choice text
+    "the old amulet"        phrase: consecutive tokens within the same line
+    speaker:Marcus          speaker filter (case-insensitive; quote multi-word names)
+e.g.  speaker:Marcus amulet   -> every line Marcus says that mentions the amulet
+"""
+import gc
+import heapq
+import re
+import sys
+import time
+
+_WORD = re.compile(r"\w+")
+_QUERY = re.compile(r'(\w+):"([^"]*)"|(\w+):(\S+)|"([^"]*)"|(\S+)')
+
+# Positions are packed as (line << 16) | word offset: line 0 is the node's own
+# text and line i + 1 is choice i, so a phrase must stay within one line
+_LINE_SHIFT = 16
+
+
+def tokenize(text):
+    return _WORD.findall(str(text).lower())
+
+
+def parse_query(query):
+    """Splits a query into (speakers, tokens, phrases)."""
+    speakers, tokens, phrases = [], [], []
+    for quoted_key, quoted_val, key, val, phrase, word in _QUERY.findall(query):
+        field, value = (quoted_key, quoted_val) if quoted_key else (key, val)
+        if field.lower() == "speaker":
+            speakers.append(value.strip().lower())
+        elif field:
+            # Unknown "field:value" is searched as plain text
+            tokens.extend(tokenize(f"{field} {value}"))
+        elif phrase:
+            words = tokenize(phrase)
+            if len(words) > 1:
+                phrases.append(words)
+            else:
+                tokens.extend(words)
+        elif word:
+            tokens.extend(tokenize(word))
+    return speakers, tokens, phrases
+
+
+class SearchIndex:
+    """Inverted index over one DialogueTree, kept in sync through tree.edge_listeners."""
+    def __init__(self, tree):
+        self.tree = tree
+        self.postings = {}      # token -> {node_id: [packed position, ...]}
+        self.speakers = {}      # lowercase speaker -> set of node IDs
+        self._node_tokens = {}  # node_id -> tokens indexed for it (for removal)
+        self._node_speaker = {}
+        tree.edge_listeners.append(self._on_edges)
+        self.rebuild()
+
+    def detach(self):
+        if self._on_edges in self.tree.edge_listeners:
+            self.tree.edge_listeners.remove(self._on_edges)
+
+    def attach(self, tree, snapshot=None):
+        """
+        Moves the index onto tree. An index built over snapshot (e.g. on a
+        worker thread) is then brought up to date with what tree changed since.
+        """
+        self.detach()
+        self.tree = tree
+        tree.edge_listeners.append(self._on_edges)
+        if snapshot is not None:
+            for change in snapshot.changes_since(tree):
+                self._on_edges(*change)
+
+    # --- INDEXING ---
+    def rebuild(self):
+        self.postings = {}
+        self.speakers = {}
+        self._node_tokens = {}
+        self._node_speaker = {}
+        # Millions of small lists would otherwise trigger the cyclic GC over and over
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for node_id, node in self.tree.nodes.items():
+                self._add(node_id, node)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _add(self, node_id, node):
+        postings = self.postings
+        lines = [node.text]
+        lines.extend(choice["text"] for choice in node.choices)
+        seen = []
+        for line_number, line in enumerate(lines):
+            base = line_number << _LINE_SHIFT
+            for position, token in enumerate(tokenize(line)):
+                nodes = postings.get(token)
+                if nodes is None:
+                    nodes = postings[token] = {}
+                hits = nodes.get(node_id)
+                if hits is None:
+                    nodes[node_id] = [base | position]
+                    seen.append(token)
+                else:
+                    hits.append(base | position)
+        self._node_tokens[node_id] = seen
+
+        speaker = str(node.speaker or "").strip().lower()
+        self._node_speaker[node_id] = speaker
+        self.speakers.setdefault(speaker, set()).add(node_id)
+
+    def _remove(self, node_id):
+        for token in self._node_tokens.pop(node_id, ()):
+            nodes = self.postings[token]
+            del nodes[node_id]
+            if not nodes:
+                del self.postings[token]
+        speaker = self._node_speaker.pop(node_id, None)
+        if speaker is not None:
+            nodes = self.speakers[speaker]
+            nodes.discard(node_id)
+            if not nodes:
+                del self.speakers[speaker]
+
+    def update_node(self, node_id):
+        """Re-indexes one node (or drops it if it no longer exists)."""
+        self._remove(node_id)
+        node = self.tree.nodes.get(node_id)
+        if node is not None:
+            self._add(node_id, node)
+
+    def _on_edges(self, node_id, old_targets, new_targets):
+        if node_id is None:
+            self.rebuild()
+        else:
+            self.update_node(node_id)
+
+    # --- QUERIES ---
+    def search(self, query, limit=None):
+        """
+        Returns matching node IDs, best first (most matching token occurrences).
+        An empty query returns [].
+        """
+        speakers, tokens, phrases = parse_query(query)
+        all_tokens = set(tokens)
+        for phrase in phrases:
+            all_tokens.update(phrase)
+        if not all_tokens and not speakers:
+            return []
+
+        # A word no line contains matches nothing (the phrase and ranking lookups below rely on this)
+        if any(t not in self.postings for t in all_tokens):
+            return []
+
+        # Intersect rarest first; dict key views intersect without copying the postings
+        candidate_sets = [self.postings[t].keys() for t in all_tokens]
+        candidate_sets.extend(self.speakers.get(speaker, set()) for speaker in speakers)
+        candidate_sets.sort(key=len)
+        candidates = set(candidate_sets[0])
+        for other in candidate_sets[1:]:
+            if not candidates:
+                break
+            candidates &= other
+
+        if phrases:
+            candidates = {n for n in candidates if all(self._has_phrase(n, p) for p in phrases)}
+
+        postings = [self.postings[t] for t in all_tokens]
+
+        def rank(node_id):
+            return (-sum(len(p[node_id]) for p in postings), str(node_id))
+
+        if limit:
+            return heapq.nsmallest(limit, candidates, key=rank)
+        return sorted(candidates, key=rank)
+
+    def _has_phrase(self, node_id, words):
+        """True if words appear consecutively in one line (text or a single choice)."""
+        starts = self.postings[words[0]][node_id]
+        for offset, word in enumerate(words[1:], start=1):
+            hits = set(self.postings[word][node_id])
+            starts = [pos for pos in starts if pos + offset in hits]
+            if not starts:
+                return False
+        return True
+
+    def snippet(self, node_id, width=60):
+        """Short display line for a result: speaker and the start of the text."""
+        node = self.tree.nodes.get(node_id)
+        if node is None:
+            return str(node_id)
+        text = node.text if len(node.text) <= width else node.text[:width - 3] + "..."
+        return f"{node_id} [{node.speaker}]: {text}"
+
+
+if __name__ == "__main__":
+    import events
+    import narranode as engine
+
+    if len(sys.argv) < 3:
+        print('Usage: python search.py <story.json> <query>   e.g. speaker:Marcus amulet')
+        sys.exit(1)
+    events.enable_console()
+    tree = engine.DialogueTree()
+    if not tree.load_from_json(sys.argv[1]):
+        sys.exit(1)
+    started = time.perf_counter()
+    index = SearchIndex(tree)
+    built = time.perf_counter() - started
+    started = time.perf_counter()
+    results = index.search(" ".join(sys.argv[2:]))
+    elapsed = time.perf_counter() - started
+    for node_id in results[:50]:
+        print(index.snippet(node_id))
+    print(f"[Search] {len(results)} matches in {elapsed * 1000:.2f} ms (index built in {built:.2f}s)")
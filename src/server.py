@@ -0,0 +1,467 @@
+"""
+asyncio dialogue server: one shared Story, many in-memory player sessions.
+
+Standard library only. Every endpoint returns the current node as JSON, with
+choices numbered and locked exactly the way play_story shows them.
+
+HTTP (JSON bodies, keep-alive):
+    POST   /sessions                  {"start": "<node_id>", "locale": "fr"} (both optional)  -> new session
+    GET    /sessions/<id>             current node
+    POST   /sessions/<id>/choose      {"index": i}  i = 0-based index into the unlocked choices
+    POST   /sessions/<id>/advance     follow linear flow ("Press Enter to continue")
+    POST   /sessions/<id>/locale      {"locale": "de"}  (null: the story's own text)
+    DELETE /sessions/<id>
+    GET    /health                    session count
+
+WebSocket (GET /ws): send {"op": "start" | "get" | "choose" | "advance" | "locale" | "end",
+"session_id": ..., "index": ..., "start": ..., "locale": ...}; every message gets
+one JSON reply (the same body the HTTP endpoint returns, plus "ok").
+
+With --locales DIR, text is served from the memory-mapped locale packs in DIR
+(see localization.py), in each session's own locale.
+
+With --watch, edits to the story file or project are polled for and swapped
+into the shared story (see hotreload.py); sessions keep their node and stats.
+
+Run:  python server.py [story.json | story.nnb] [--port 8765] [--snapshot sessions.json] [--watch]
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import signal
+import struct
+import sys
+import uuid
+
+import events
+import hotreload
+import localization
+import narranode as engine
+import runtime
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY = 1 << 20
+
+_WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large"}
+
+# WebSocket opcodes
+WS_TEXT = 0x1
+WS_CLOSE = 0x8
+WS_PING = 0x9
+WS_PONG = 0xA
+
+
+class RequestError(Exception):
+    """A client error; status is the HTTP status to answer with."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- WEBSOCKET FRAMES ---
+def _mask(payload, key):
+    """XORs payload with the 4-byte key (RFC 6455 masking; its own inverse)."""
+    if not payload:
+        return payload
+    repeated = (key * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(len(payload), "big")
+
+
+def encode_frame(opcode, payload, masked=False):
+    """One final frame. Clients must send masked frames, servers unmasked ones."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, (0x80 if masked else 0) | length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, (0x80 if masked else 0) | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, (0x80 if masked else 0) | 127, length)
+    if masked:
+        key = os.urandom(4)
+        return header + key + _mask(payload, key)
+    return header + payload
+
+
+async def read_message(reader):
+    """(opcode, payload) of the next message, joining continuation frames."""
+    opcode, chunks = None, []
+    while True:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", await reader.readexactly(8))[0]
+        if length > MAX_BODY:
+            raise RequestError(413, "WebSocket message too large")
+        key = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if key:
+            payload = _mask(payload, key)
+        frame_opcode = first & 0x0F
+        if frame_opcode >= 0x8:
+            # Control frames may arrive between the fragments of a message
+            return frame_opcode, payload
+        if frame_opcode:
+            opcode = frame_opcode
+        chunks.append(payload)
+        if first & 0x80:
+            return opcode, b"".join(chunks)
+
+
+def websocket_accept(key):
+    return base64.b64encode(hashlib.sha1((key + _WS_GUID).encode()).digest()).decode()
+
+
+# --- SESSIONS ---
+def _untranslated(text, locale):
+    return text
+
+
+class DialogueServer:
+    """Sessions over one shared runtime.Story; protocol-independent (see handle())."""
+    def __init__(self, story, snapshot_path=None, snapshot_interval=30.0, watcher=None, watch_interval=1.0,
+                 localizer=None):
+        self.story = story
+        self.sessions = {}      # session_id -> runtime.Session
+        self.localizer = localizer  # localization.Localizer, or None (no locales)
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.watcher = watcher  # hotreload.StoryWatcher, or None
+        self.watch_interval = watch_interval
+        self._changed = False
+
+    # --- SNAPSHOTS ---
+    def snapshot_data(self):
+        return {session_id: {"node_id": session.node_id, "state": session.state, "locale": session.locale}
+                for session_id, session in self.sessions.items()}
+
+    def restore(self, filename=None):
+        """Loads sessions from a snapshot file. Returns how many were restored."""
+        filename = filename or self.snapshot_path
+        if not filename or not os.path.exists(filename):
+            return 0
+        with open(filename, "r") as f:
+            data = json.load(f)
+        for session_id, saved in data.items():
+            self.sessions[session_id] = runtime.Session(self.story, saved["node_id"], saved["state"],
+                                                        saved.get("locale"))
+        return len(data)
+
+    async def snapshot(self):
+        """Writes every session to snapshot_path (atomically, off the event loop)."""
+        if not self.snapshot_path:
+            return
+        data = json.loads(json.dumps(self.snapshot_data()))  # Deep copy taken on the loop thread
+        self._changed = False
+        await asyncio.get_running_loop().run_in_executor(
+            None, engine.write_json_atomic, data, self.snapshot_path, None)
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            if self._changed:
+                await self.snapshot()
+
+    # --- HOT RELOAD ---
+    def reload(self, changes):
+        """Swaps hotreload.StoryChanges into the shared story. Sessions keep their node and stats."""
+        self.story = self.story.with_changes(changes)
+        initial_state = changes.initial_state or {}
+        for session in self.sessions.values():
+            session.story = self.story
+            for stat, value in initial_state.items():
+                session.state.setdefault(stat, value)   # New stats start at their initial value
+
+    async def _watch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            started = loop.time()
+            try:
+                # Reading and diffing files happens off the loop; the swap itself is quick
+                changes = await loop.run_in_executor(None, self.watcher.poll)
+            except hotreload.ReloadError as e:
+                print(f"[Server] {e}")
+                continue
+            if not changes:
+                continue
+            try:
+                self.reload(changes)
+            except (ValueError, KeyError) as e:    # poll() checks nodes first; this is the last line of defence
+                print(f"[Server] Reload failed: {e!r}")
+                continue
+            print(f"[Server] Reloaded {len(changes)} changed nodes ({(loop.time() - started) * 1000:.1f} ms)")
+
+    # --- OPERATIONS ---
+    def node_view(self, session_id, session):
+        """The current node as play_story would render it."""
+        node = session.node
+        view = {"session_id": session_id, "node_id": session.node_id, "status": session.status,
+                "state": dict(session.state), "locale": session.locale, "speaker": None, "text": None,
+                "choices": []}
+        if node is None:
+            return view
+        locale = session.locale
+        tr = self.localizer.text if locale is not None else _untranslated
+        view["speaker"] = tr(node.speaker, locale)
+        view["text"] = tr(node.text, locale)
+        number = 0
+        for choice, unlocked in session.evaluate_choices():
+            if unlocked:
+                view["choices"].append({"index": number, "number": number + 1, "text": tr(choice.text, locale),
+                                        "locked": False, "next_id": choice.next_id})
+                number += 1
+            else:
+                view["choices"].append({"index": None, "number": None, "text": tr(choice.text, locale),
+                                        "locked": True, "requirements": dict(choice.requirements)})
+        return view
+
+    def _check_locale(self, locale):
+        if locale is None:
+            return None
+        if self.localizer is None:
+            raise RequestError(400, "This server has no locale packs (start it with --locales)")
+        try:
+            self.localizer.pack(locale)
+        except localization.LocaleError as e:
+            raise RequestError(404, str(e))
+        return locale
+
+    def _session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise RequestError(404, f"No session '{session_id}'")
+        return session
+
+    def handle(self, op, params):
+        """Runs one operation; returns (status, body). Shared by HTTP and WebSocket."""
+        if op == "start":
+            start = params.get("start")
+            if start is not None and start not in self.story:
+                raise RequestError(404, f"No node '{start}'")
+            locale = self._check_locale(params.get("locale"))
+            session_id = uuid.uuid4().hex
+            session = self.sessions[session_id] = self.story.new_session(start, locale=locale)
+            self._changed = True
+            return 201, self.node_view(session_id, session)
+
+        session_id = params.get("session_id")
+        session = self._session(session_id)
+        if op == "get":
+            return 200, self.node_view(session_id, session)
+        if op == "choose":
+            try:
+                session.choose(int(params.get("index")))
+            except (TypeError, ValueError, IndexError) as e:
+                raise RequestError(400, str(e))
+            self._changed = True
+            return 200, self.node_view(session_id, session)
+        if op == "advance":
+            try:
+                session.advance()
+            except ValueError as e:
+                raise RequestError(400, str(e))
+            self._changed = True
+            return 200, self.node_view(session_id, session)
+        if op == "locale":
+            session.locale = self._check_locale(params.get("locale"))
+            self._changed = True
+            return 200, self.node_view(session_id, session)
+        if op == "end":
+            del self.sessions[session_id]
+            self._changed = True
+            return 200, {"session_id": session_id, "ended": True}
+        raise RequestError(400, f"Unknown op '{op}'")
+
+    # --- HTTP ---
+    def route(self, method, path, body):
+        parts = [part for part in path.split("?", 1)[0].split("/") if part]
+        if parts == ["health"] and method == "GET":
+            return 200, {"sessions": len(self.sessions), "nodes": len(self.story)}
+        if not parts or parts[0] != "sessions" or len(parts) > 3:
+            raise RequestError(404, f"No route for {path}")
+        if len(parts) == 1:
+            if method != "POST":
+                raise RequestError(405, "Use POST /sessions")
+            return self.handle("start", body)
+        params = dict(body, session_id=parts[1])
+        if len(parts) == 2:
+            op = {"GET": "get", "DELETE": "end"}.get(method)
+        else:
+            op = parts[2] if method == "POST" and parts[2] in ("choose", "advance", "locale") else None
+        if op is None:
+            raise RequestError(405, f"{method} not allowed on {path}")
+        return self.handle(op, params)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method, path, version = (lines[0].split(" ") + ["", ""])[:3]
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+
+                if headers.get("upgrade", "").lower() == "websocket" and path.startswith("/ws"):
+                    await self._websocket(reader, writer, headers)
+                    return
+
+                status, body = 200, None
+                framed = True   # False once the body's end is unknown: the connection can't be reused
+                try:
+                    try:
+                        length = int(headers.get("content-length") or 0)
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        framed = False
+                        raise RequestError(400, "Invalid Content-Length")
+                    if length > MAX_BODY:
+                        framed = False
+                        raise RequestError(413, "Request body too large")
+                    raw = await reader.readexactly(length) if length else b""
+                    try:
+                        params = json.loads(raw) if raw.strip() else {}
+                    except ValueError:
+                        raise RequestError(400, "Body is not valid JSON")
+                    if not isinstance(params, dict):
+                        raise RequestError(400, "Body must be a JSON object")
+                    status, body = self.route(method, path, params)
+                except RequestError as e:
+                    status, body = e.status, {"error": str(e)}
+
+                keep_alive = framed and headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                payload = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass    # Client went away, possibly in the middle of a body
+        finally:
+            writer.close()
+
+    # --- WEBSOCKET ---
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n").encode())
+        await writer.drain()
+        while True:
+            try:
+                opcode, payload = await read_message(reader)
+            except (asyncio.IncompleteReadError, ConnectionError, RequestError):
+                return
+            if opcode == WS_CLOSE:
+                writer.write(encode_frame(WS_CLOSE, payload[:2]))
+                await writer.drain()
+                return
+            if opcode == WS_PING:
+                writer.write(encode_frame(WS_PONG, payload))
+                continue
+            if opcode != WS_TEXT:
+                continue
+            try:
+                message = json.loads(payload)
+                if not isinstance(message, dict):
+                    raise RequestError(400, "Message must be a JSON object")
+                status, body = self.handle(message.get("op"), message)
+                body = dict(body, ok=True)
+            except ValueError:
+                body = {"ok": False, "status": 400, "error": "Message is not valid JSON"}
+            except RequestError as e:
+                body = {"ok": False, "status": e.status, "error": str(e)}
+            writer.write(encode_frame(WS_TEXT, json.dumps(body).encode()))
+            await writer.drain()
+
+    # --- SERVING ---
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        """Serves until cancelled; a final snapshot is written on the way out."""
+        server = await asyncio.start_server(self._handle_connection, host, port, backlog=4096)
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, asyncio.current_task().cancel)
+            except (NotImplementedError, RuntimeError):
+                pass    # Not supported on this platform; Ctrl+C still raises KeyboardInterrupt
+        snapshots = asyncio.ensure_future(self._snapshot_loop()) if self.snapshot_path else None
+        watching = asyncio.ensure_future(self._watch_loop()) if self.watcher else None
+        print(f"[Server] {len(self.story)} nodes, {len(self.sessions)} sessions, listening on http://{host}:{port}")
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if watching is not None:
+                watching.cancel()
+            if snapshots is not None:
+                snapshots.cancel()
+                await self.snapshot()
+
+
+def load_story(story_path):
+    """runtime.Story from a JSON script or a compiled .nnb file. None if missing."""
+    if story_path.endswith(".nnb") and os.path.exists(story_path):
+        import storybin
+        return runtime.Story.from_tree(storybin.open_tree(story_path))
+    return runtime.Story.load(story_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a NarraNode story over HTTP and WebSocket.")
+    parser.add_argument("story", nargs="?", default="scripts/story_data.json")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--snapshot", help="Save sessions to this file periodically and on exit, and restore them at startup")
+    parser.add_argument("--snapshot-interval", type=float, default=30.0, help="Seconds between snapshots")
+    parser.add_argument("--watch", action="store_true", help="Reload edits to the story while serving")
+    parser.add_argument("--watch-interval", type=float, default=1.0, help="Seconds between checks for edits")
+    parser.add_argument("--locales", metavar="DIR", help="Directory of <locale>.nnl packs sessions can pick from")
+    args = parser.parse_args(argv)
+
+    story = load_story(args.story)
+    if story is None:
+        return 1
+    watcher = None
+    if args.watch:
+        try:
+            watcher = hotreload.StoryWatcher(args.story)
+        except hotreload.ReloadError as e:
+            print(f"[Server] {e}")
+            return 1
+    localizer = localization.Localizer(args.locales) if args.locales else None
+    server = DialogueServer(story, snapshot_path=args.snapshot, snapshot_interval=args.snapshot_interval,
+                            watcher=watcher, watch_interval=args.watch_interval, localizer=localizer)
+    restored = server.restore()
+    if restored:
+        print(f"[Server] Restored {restored} sessions from {args.snapshot}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        print("[Server] Stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    events.enable_console()
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Headless batch playthroughs for balance testing.
+
+Plays N sessions of a Story with a pluggable choice policy, spread across a
+multiprocessing pool, and aggregates node visits, endings, dead-end rate and
+final-stat histograms. Each worker receives the story once (pool initializer)
+and returns one partial aggregate per chunk, so the parent only merges counters.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter, namedtuple
+
+import events
+import runtime
+import traces
+
+# Playthrough outcomes (the same names trace files use, see traces.py)
+OUTCOME_ENDED = traces.OUTCOME_ENDED            # Reached a node with no choices and no next node
+OUTCOME_DEAD_END = traces.OUTCOME_DEAD_END      # "No valid choices available! (Game Over)"
+OUTCOME_MISSING = traces.OUTCOME_MISSING        # Followed a link to a node that does not exist
+OUTCOME_MAX_STEPS = traces.OUTCOME_MAX_STEPS    # Gave up (probably looping)
+
+DEFAULT_MAX_STEPS = 1000
+
+Playthrough = namedtuple("Playthrough", ["path", "outcome", "final_node_id", "state"])
+
+
+# --- CHOICE POLICIES ---
+class RandomPolicy:
+    """Picks uniformly among the unlocked choices."""
+    def choose(self, session, available, rng, step):
+        return rng.randrange(len(available))
+
+    def __repr__(self):
+        return "random"
+
+
+class GreedyPolicy:
+    """Picks the unlocked choice that leaves `stat` highest (first one on ties)."""
+    def __init__(self, stat):
+        self.stat = stat
+
+    def choose(self, session, available, rng, step):
+        best_index, best_value = 0, None
+        for index, choice in enumerate(available):
+            if self.stat not in choice.effects:
+                value = session.state.get(self.stat, 0)
+            else:
+                value = choice.apply({self.stat: session.state.get(self.stat, 0)})[self.stat]
+            if best_value is None or value > best_value:
+                best_index, best_value = index, value
+        return best_index
+
+    def __repr__(self):
+        return f"greedy:{self.stat}"
+
+
+class ScriptedPolicy:
+    """
+    Follows a fixed script of 0-based indices into the unlocked choices, one per
+    decision. Once the script runs out (or an index is not available), the
+    fallback policy decides; by default the first unlocked choice.
+    """
+    def __init__(self, script, fallback=None):
+        self.script = list(script)
+        self.fallback = fallback
+
+    def choose(self, session, available, rng, step):
+        if step < len(self.script) and 0 <= self.script[step] < len(available):
+            return self.script[step]
+        if self.fallback is not None:
+            return self.fallback.choose(session, available, rng, step)
+        return 0
+
+    def __repr__(self):
+        return "scripted:" + ",".join(str(i) for i in self.script)
+
+
+def parse_policy(spec):
+    """Builds a policy from 'random', 'greedy:<stat>' or 'scripted:<i>,<j>,...'."""
+    name, _, arg = spec.partition(":")
+    if name == "random":
+        return RandomPolicy()
+    if name == "greedy" and arg:
+        return GreedyPolicy(arg)
+    if name == "scripted":
+        return ScriptedPolicy(int(i) for i in arg.split(",") if i.strip())
+    raise ValueError(f"Unknown policy '{spec}' (use random, greedy:<stat> or scripted:<i>,<j>,...)")
+
+
+# --- SINGLE PLAYTHROUGH ---
+def play_session(story, start_node_id, policy, rng, max_steps=DEFAULT_MAX_STEPS, trace=None):
+    """
+    Plays one session to completion the way play_story would, without any I/O.
+    Pass a traces.TraceWriter as trace to record the session.
+    """
+    playthrough = _play(story, start_node_id, policy, rng, max_steps, trace)
+    if trace is not None:
+        trace.end(playthrough.outcome)
+    return playthrough
+
+
+def _play(story, start_node_id, policy, rng, max_steps, trace):
+    session = story.new_session(start_node_id)
+    path = []
+    decisions = 0
+    for _ in range(max_steps):
+        node = session.node
+        if node is None:
+            return Playthrough(path, OUTCOME_MISSING, session.node_id, session.state)
+        path.append(session.node_id)
+        if trace is not None:
+            trace.enter(session.node_id)
+
+        if not node.choices:
+            if not node.next_node_id:
+                return Playthrough(path, OUTCOME_ENDED, session.node_id, session.state)
+            session.node_id = node.next_node_id
+            continue
+
+        available = session.available_choices()
+        if not available:
+            return Playthrough(path, OUTCOME_DEAD_END, session.node_id, session.state)
+
+        selected = available[policy.choose(session, available, rng, decisions)]
+        if trace is not None:
+            # Traces store the choice's position in the node, not among the unlocked ones
+            trace.choose(next(i for i, choice in enumerate(node.choices) if choice is selected))
+        selected.apply(session.state)
+        session.node_id = selected.next_id
+        decisions += 1
+
+    return Playthrough(path, OUTCOME_MAX_STEPS, session.node_id, session.state)
+
+
+# --- AGGREGATION ---
+class SimulationResult:
+    """Mergeable counters describing a batch of playthroughs."""
+    def __init__(self):
+        self.runs = 0
+        self.node_visits = Counter()
+        self.outcomes = Counter()
+        self.endings = Counter()        # final node ID of runs that reached an ending
+        self.dead_ends = Counter()      # node ID where runs got stuck with every choice locked
+        self.stat_histograms = {}       # stat -> Counter(final value)
+
+    def record(self, playthrough):
+        self.runs += 1
+        self.node_visits.update(playthrough.path)
+        self.outcomes[playthrough.outcome] += 1
+        if playthrough.outcome == OUTCOME_ENDED:
+            self.endings[playthrough.final_node_id] += 1
+        elif playthrough.outcome == OUTCOME_DEAD_END:
+            self.dead_ends[playthrough.final_node_id] += 1
+        for stat, value in playthrough.state.items():
+            histogram = self.stat_histograms.get(stat)
+            if histogram is None:
+                histogram = self.stat_histograms[stat] = Counter()
+            histogram[value] += 1
+
+    def merge(self, other):
+        self.runs += other.runs
+        self.node_visits.update(other.node_visits)
+        self.outcomes.update(other.outcomes)
+        self.endings.update(other.endings)
+        self.dead_ends.update(other.dead_ends)
+        for stat, histogram in other.stat_histograms.items():
+            self.stat_histograms.setdefault(stat, Counter()).update(histogram)
+        return self
+
+    @property
+    def dead_end_rate(self):
+        return self.outcomes[OUTCOME_DEAD_END] / self.runs if self.runs else 0.0
+
+    def to_dict(self):
+        return {
+            "runs": self.runs,
+            "dead_end_rate": self.dead_end_rate,
+            "outcomes": dict(self.outcomes),
+            "endings": dict(self.endings.most_common()),
+            "dead_ends": dict(self.dead_ends.most_common()),
+            "node_visits": dict(self.node_visits.most_common()),
+            "stat_histograms": {
+                stat: {str(value): count for value, count in sorted(histogram.items())}
+                for stat, histogram in self.stat_histograms.items()
+            },
+        }
+
+    def summary(self, top=10):
+        lines = [f"Runs: {self.runs}   Dead-end rate: {self.dead_end_rate:.2%}"]
+        lines.append("Outcomes: " + ", ".join(f"{k}={v}" for k, v in self.outcomes.most_common()))
+        lines.append("Endings:")
+        for node_id, count in self.endings.most_common(top):
+            lines.append(f"   {node_id}: {count} ({count / self.runs:.1%})")
+        if self.dead_ends:
+            lines.append("Dead ends (No valid choices available):")
+            for node_id, count in self.dead_ends.most_common(top):
+                lines.append(f"   {node_id}: {count}")
+        lines.append("Final stats:")
+        for stat, histogram in sorted(self.stat_histograms.items()):
+            low, high = min(histogram), max(histogram)
+            lines.append(f"   {stat}: min {low}, max {high}, {len(histogram)} distinct values")
+        return "\n".join(lines)
+
+
+# --- PROCESS POOL ---
+_worker_story = None
+
+
+def _init_worker(story):
+    global _worker_story
+    _worker_story = story
+
+
+def _run_chunk(task):
+    start_node_id, policy, seed, count, max_steps, trace_path = task
+    rng = random.Random(seed)
+    result = SimulationResult()
+    trace = traces.TraceWriter(trace_path) if trace_path else None
+    try:
+        for _ in range(count):
+            result.record(play_session(_worker_story, start_node_id, policy, rng, max_steps, trace))
+    finally:
+        if trace is not None:
+            trace.close()
+    return result
+
+
+def run_batch(story, runs, start_node_id=None, policy=None, seed=0,
+              workers=None, chunk_size=None, max_steps=DEFAULT_MAX_STEPS, trace_dir=None):
+    """
+    Plays `runs` sessions and returns the merged SimulationResult.
+    workers=1 runs in-process; otherwise a pool of `workers` (default: CPU count).
+    Results are reproducible for a given seed and chunk_size.
+    With trace_dir, every chunk also writes its sessions to one trace file there.
+    """
+    policy = policy or RandomPolicy()
+    start_node_id = start_node_id if start_node_id is not None else story.first_node_id()
+    workers = workers or os.cpu_count() or 1
+    if chunk_size is None:
+        # A few chunks per worker keeps them all busy without flooding the parent with results
+        chunk_size = max(1, min(10000, -(-runs // (workers * 4))))
+
+    if trace_dir:
+        os.makedirs(trace_dir, exist_ok=True)
+    tasks = []
+    for index, first in enumerate(range(0, runs, chunk_size)):
+        trace_path = os.path.join(trace_dir, f"sim_{seed}_{index}{traces.TRACE_SUFFIX}") if trace_dir else None
+        tasks.append((start_node_id, policy, seed * 1000003 + index, min(chunk_size, runs - first), max_steps,
+                      trace_path))
+
+    result = SimulationResult()
+    if workers == 1:
+        _init_worker(story)
+        for task in tasks:
+            result.merge(_run_chunk(task))
+        return result
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(story,)) as pool:
+        for partial in pool.imap_unordered(_run_chunk, tasks):
+            result.merge(partial)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run headless NarraNode playthroughs.")
+    parser.add_argument("story", nargs="?", default="scripts/story_data.json")
+    parser.add_argument("-n", "--runs", type=int, default=10000)
+    parser.add_argument("--start", help="Start node ID (default: first node)")
+    parser.add_argument("--policy", default="random", help="random | greedy:<stat> | scripted:<i>,<j>,...")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count)")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS)
+    parser.add_argument("--json", action="store_true", help="Print the full result as JSON")
+    parser.add_argument("--trace-dir", help="Also write every playthrough to trace files here (see coverage.py)")
+    args = parser.parse_args(argv)
+    # With --json, stdout carries only the JSON document
+    events.enable_console(sys.stderr if args.json else None)
+
+    story = runtime.Story.load(args.story)
+    if story is None:
+        return 1
+    started = time.perf_counter()
+    result = run_batch(story, args.runs, start_node_id=args.start, policy=parse_policy(args.policy),
+                       seed=args.seed, workers=args.workers, max_steps=args.max_steps, trace_dir=args.trace_dir)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(result.to_dict(), indent=4))
+    else:
+        print(result.summary())
+        print(f"[System] {result.runs} playthroughs in {elapsed:.2f}s ({result.runs / elapsed:,.0f}/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Static stat-range analysis: which choices can never unlock?
+
+Propagates an interval [min, max] per stat from initial_state along every
+link until nothing changes: a choice's requirements narrow the ranges of the
+states that take it, then its effects shift (or set) them, and ranges meeting
+at a node are merged. A node whose ranges keep growing (a loop that adds gold)
+is widened to +/- infinity at the loop's head after a few rounds, so loops terminate quickly and
+the whole pass stays roughly linear in the number of links.
+
+The ranges over-approximate every real playthrough, so the findings are safe
+to act on: a choice reported as locked is locked in every playthrough. The
+converse does not hold ("$if" expressions, for one, are assumed satisfiable).
+"""
+import heapq
+import math
+import sys
+from collections import deque
+
+import conditions
+
+# Issue kinds
+LOCKED_CHOICE = "locked_choice"     # Requirements can never be met when the node is reached
+STUCK = "stuck"                     # Every choice is locked: always "No valid choices available!"
+DOOMED = "doomed"                   # Every way forward ends at a stuck node
+
+WIDEN_AFTER = 3     # Updates to a node before growing bounds jump to infinity
+
+_INF = math.inf
+
+
+def _numeric_tests(requirements):
+    """Tests that can narrow a range: plain per-stat entries only ($if may be an 'or')."""
+    if requirements and conditions.EXPRESSION_KEY in requirements:
+        requirements = {k: v for k, v in requirements.items() if k != conditions.EXPRESSION_KEY}
+    return conditions.requirement_tests(requirements)
+
+
+class StatRangeAnalysis:
+    """
+    Runs the analysis on construction. Results:
+        ranges      node_id -> (mins, maxes) tuples in `stats` order, for every reachable node
+        locked      [(node_id, choice index), ...] choices that can never unlock
+        stuck       node IDs where every choice is locked
+        doomed      node IDs (not stuck themselves) whose every way forward ends stuck
+    """
+    def __init__(self, tree, start_node_id=None):
+        self.tree = tree
+        self.start_node_id = start_node_id if start_node_id is not None else next(iter(tree.nodes), None)
+        self._compile()
+        self._solve()
+        self._classify()
+
+    # --- SETUP ---
+    def _compile(self):
+        """Per choice: (narrowing tests, effects) on slot indices of the tracked stats."""
+        tests_by_choice = {}
+        effects_by_choice = {}
+        stats = set()
+        for node_id, node in self.tree.nodes.items():
+            for index, choice in enumerate(node.choices):
+                tests = _numeric_tests(choice.get("requirements"))
+                tests_by_choice[(node_id, index)] = tests
+                stats.update(stat for stat, op, _ in tests if op is not None)
+                effects_by_choice[(node_id, index)] = conditions.effect_updates(choice.get("effects"))
+
+        # Only stats some requirement can be decided on are worth tracking
+        self.stats = sorted(stats)
+        slots = {stat: i for i, stat in enumerate(self.stats)}
+
+        # Whole-number stats let strict tests tighten by one (gold > 5 means gold >= 6)
+        integral = {stat: isinstance(self.tree.initial_state.get(stat, 0), int) for stat in self.stats}
+        for effects in effects_by_choice.values():
+            for stat, kind, amount in effects:
+                if stat in integral and not isinstance(amount, int):
+                    integral[stat] = False
+        self.integral = [integral[stat] for stat in self.stats]
+
+        self.choice_tests = {
+            key: [(slots[stat], op, value) for stat, op, value in tests if op is not None]
+            for key, tests in tests_by_choice.items()
+        }
+        self.choice_effects = {
+            key: [(slots[stat], kind, amount) for stat, kind, amount in effects if stat in slots]
+            for key, effects in effects_by_choice.items()
+        }
+
+    # --- INTERVAL OPERATIONS ---
+    # Ranges are a (lows, highs) pair of tuples indexed by stat slot, so merging
+    # two of them is a pair of C-level map() calls rather than a Python loop.
+    def _narrow(self, ranges, tests):
+        """Ranges restricted to states that pass every test, or None if none can."""
+        if not tests:
+            return ranges
+        lows, highs = list(ranges[0]), list(ranges[1])
+        for slot, op, value in tests:
+            low, high = lows[slot], highs[slot]
+            step = 1 if self.integral[slot] and isinstance(value, int) else 0
+            if op == ">=":
+                low = max(low, value)
+            elif op == ">":
+                low = max(low, value + step)
+            elif op == "<=":
+                high = min(high, value)
+            elif op == "<":
+                high = min(high, value - step)
+            elif op == "==":
+                low, high = max(low, value), min(high, value)
+            elif op == "!=":
+                if low == high == value:
+                    return None
+                if step and low == value:
+                    low += 1
+                elif step and high == value:
+                    high -= 1
+            if low > high:
+                return None
+            lows[slot], highs[slot] = low, high
+        return tuple(lows), tuple(highs)
+
+    @staticmethod
+    def _apply(ranges, effects):
+        if not effects:
+            return ranges
+        lows, highs = list(ranges[0]), list(ranges[1])
+        for slot, kind, amount in effects:
+            if kind == "set":
+                lows[slot] = highs[slot] = amount
+            else:
+                lows[slot] += amount
+                highs[slot] += amount
+        return tuple(lows), tuple(highs)
+
+    @staticmethod
+    def _join(old, new):
+        """Smallest ranges covering both."""
+        return tuple(map(min, old[0], new[0])), tuple(map(max, old[1], new[1]))
+
+    @staticmethod
+    def _widen(old, merged):
+        """Any bound that grew past old jumps to infinity."""
+        lows = tuple(-_INF if low < old_low else low for low, old_low in zip(merged[0], old[0]))
+        highs = tuple(_INF if high > old_high else high for high, old_high in zip(merged[1], old[1]))
+        return lows, highs
+
+    # --- FIXPOINT ---
+    def _successors(self, node):
+        if node.choices:
+            return [choice["next_id"] for choice in node.choices]
+        return [node.next_node_id] if node.next_node_id else []
+
+    def _reverse_postorder(self, start):
+        """node_id -> rank; visiting in rank order sees (non-loop) predecessors first."""
+        nodes = self.tree.nodes
+        order = []
+        visited = {start}
+        stack = [(start, iter(self._successors(nodes[start])))]
+        while stack:
+            node_id, successors = stack[-1]
+            for target_id in successors:
+                if target_id in nodes and target_id not in visited:
+                    visited.add(target_id)
+                    stack.append((target_id, iter(self._successors(nodes[target_id]))))
+                    break
+            else:
+                stack.pop()
+                order.append(node_id)
+        return {node_id: rank for rank, node_id in enumerate(reversed(order))}
+
+    def _solve(self):
+        nodes = self.tree.nodes
+        self.ranges = {}
+        updates = {}
+        start = self.start_node_id
+        if start not in nodes:
+            return
+        initial = tuple(self.tree.initial_state.get(stat, 0) for stat in self.stats)
+        self.ranges[start] = (initial, initial)
+        # Worklist in reverse postorder: outside of loops each node is processed once
+        rank = self._reverse_postorder(start)
+        queue = [(0, start)]
+        queued = {start}
+        while queue:
+            _, node_id = heapq.heappop(queue)
+            queued.discard(node_id)
+            node = nodes[node_id]
+            ranges = self.ranges[node_id]
+
+            if node.choices:
+                outgoing = []
+                for index, choice in enumerate(node.choices):
+                    passed = self._narrow(ranges, self.choice_tests[(node_id, index)])
+                    if passed is not None:
+                        outgoing.append((choice["next_id"], self._apply(passed, self.choice_effects[(node_id, index)])))
+            elif node.next_node_id:
+                outgoing = [(node.next_node_id, ranges)]
+            else:
+                outgoing = []
+
+            for target_id, target_ranges in outgoing:
+                if target_id not in nodes:
+                    continue
+                old = self.ranges.get(target_id)
+                if old is None:
+                    merged = target_ranges
+                elif old == target_ranges:
+                    continue
+                else:
+                    merged = self._join(old, target_ranges)
+                    if merged == old:
+                        continue
+                    if rank[target_id] <= rank[node_id]:
+                        # A loop back edge: widen once it has grown the loop head a few times
+                        count = updates.get(target_id, 0)
+                        if count >= WIDEN_AFTER:
+                            merged = self._widen(old, merged)
+                        updates[target_id] = count + 1
+                self.ranges[target_id] = merged
+                if target_id not in queued:
+                    queued.add(target_id)
+                    heapq.heappush(queue, (rank[target_id], target_id))
+
+    # --- FINDINGS ---
+    def _classify(self):
+        nodes = self.tree.nodes
+        self.locked = []
+        self.stuck = set()
+        may_go = {}     # node_id -> targets that some state can move on to
+        for node_id, ranges in self.ranges.items():
+            node = nodes[node_id]
+            if not node.choices:
+                may_go[node_id] = [node.next_node_id] if node.next_node_id in nodes else []
+                continue
+            open_targets = []
+            for index, choice in enumerate(node.choices):
+                if self._narrow(ranges, self.choice_tests[(node_id, index)]) is None:
+                    self.locked.append((node_id, index))
+                else:
+                    open_targets.append(choice["next_id"])
+            if not open_targets:
+                self.stuck.add(node_id)
+            may_go[node_id] = [t for t in open_targets if t in nodes]
+
+        # Backward fixpoint: doomed once every open way forward is doomed (or stuck)
+        remaining = {node_id: len(set(targets)) for node_id, targets in may_go.items()}
+        sources = {}
+        for node_id, targets in may_go.items():
+            for target in set(targets):
+                sources.setdefault(target, []).append(node_id)
+        doomed = set(self.stuck)
+        queue = deque(self.stuck)
+        while queue:
+            for source_id in sources.get(queue.popleft(), ()):
+                remaining[source_id] -= 1
+                if remaining[source_id] == 0 and source_id not in doomed:
+                    doomed.add(source_id)
+                    queue.append(source_id)
+        self.doomed = doomed - self.stuck
+
+    def range_of(self, node_id, stat):
+        """(min, max) of a stat on arrival at node_id, or None if the node is unreachable/untracked."""
+        ranges = self.ranges.get(node_id)
+        if ranges is None or stat not in self.stats:
+            return None
+        slot = self.stats.index(stat)
+        return ranges[0][slot], ranges[1][slot]
+
+    def _describe_ranges(self, node_id, stats):
+        parts = []
+        for stat in stats:
+            low, high = self.range_of(node_id, stat)
+            parts.append(f"{stat} in [{low}, {high}]")
+        return ", ".join(parts)
+
+    def issues(self):
+        """[(kind, node_id, detail), ...] in the same shape as StoryValidator.issues()."""
+        found = []
+        for node_id, index in self.locked:
+            choice = self.tree.nodes[node_id].choices[index]
+            stats = sorted({stat for stat, op, _ in _numeric_tests(choice.get("requirements"))
+                            if op is not None})
+            found.append((LOCKED_CHOICE, node_id,
+                          f"choice '{choice['text']}' never unlocks: requires {choice.get('requirements')} "
+                          f"but {self._describe_ranges(node_id, stats)}"))
+        for node_id in self.stuck:
+            found.append((STUCK, node_id, "every choice is always locked"))
+        for node_id in self.doomed:
+            found.append((DOOMED, node_id, "every way forward ends with no valid choices"))
+        return sorted(found, key=lambda issue: (issue[0], str(issue[1])))
+
+
+def analyze(tree, start_node_id=None):
+    """One-off analysis. Returns the issues list."""
+    return StatRangeAnalysis(tree, start_node_id).issues()
+
+
+if __name__ == "__main__":
+    import time
+    import events
+    import narranode as engine
+
+    story_path = sys.argv[1] if len(sys.argv) > 1 else "scripts/story_data.json"
+    events.enable_console()
+    tree = engine.DialogueTree()
+    if not tree.load_from_json(story_path):
+        sys.exit(1)
+    started = time.perf_counter()
+    issues = analyze(tree)
+    elapsed = time.perf_counter() - started
+    for kind, node_id, detail in issues:
+        print(f"[{kind}] {node_id}: {detail}")
+    print(f"[System] {len(issues)} issue(s) in {elapsed:.2f}s")
+    # Usable as a pre-commit hook: non-zero exit when anything is found
+    sys.exit(1 if issues else 0)
@@ -0,0 +1,268 @@
+"""
+Compiled binary story format (.nnb) with lazy, memory-mapped node loading.
+
+Layout (little-endian):
+    header   MAGIC, version, flags, node_count, index_offset, meta_offset, meta_length
+    records  per node, in file order: u32 id_length, id (utf-8), u32 body_length, body (compact JSON of to_dict())
+    index    node_count x u64 record offsets, sorted by node ID bytes (binary-searched in place)
+    meta     JSON: {"initial_state": {...}}
+
+Only the header and meta are read on open; a node is decoded the first time
+get_node() asks for it and then kept in a bounded LRU cache.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import events
+import narranode as engine
+
+MAGIC = b"NNB1"
+VERSION = 1
+FLAG_HAS_INITIAL_STATE = 0x1    # Source used the {"initial_state", "nodes"} layout
+
+_HEADER = struct.Struct("<4sHHIQQI")
+_U32 = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+
+DEFAULT_CACHE_SIZE = 1024
+
+
+def compile_nodes(nodes_data, filename, initial_state=None):
+    """
+    Writes {node_id: node_dict} (the JSON "nodes" section) to a binary story file.
+    Pass initial_state=None to record the old layout without an initial_state block.
+    Returns the number of nodes written.
+    """
+    records = []
+    index = []
+    offset = _HEADER.size
+    for node_id, node_data in nodes_data.items():
+        key = str(node_id).encode("utf-8")
+        body = json.dumps(node_data, separators=(",", ":")).encode("utf-8")
+        record = _U32.pack(len(key)) + key + _U32.pack(len(body)) + body
+        records.append(record)
+        index.append((key, offset))
+        offset += len(record)
+
+    index.sort()
+    index_offset = offset
+    meta_offset = index_offset + _OFFSET.size * len(index)
+    meta = json.dumps({"initial_state": initial_state or {}}).encode("utf-8")
+    flags = FLAG_HAS_INITIAL_STATE if initial_state is not None else 0
+
+    header = _HEADER.pack(MAGIC, VERSION, flags, len(records), index_offset, meta_offset, len(meta))
+    index_bytes = b"".join(_OFFSET.pack(rec_offset) for _, rec_offset in index)
+    engine.write_bytes_atomic(filename, [header, *records, index_bytes, meta], suffix=".nnb")
+    return len(records)
+
+
+def compile_tree(tree, filename):
+    """Compiles an in-memory DialogueTree."""
+    nodes_data = {node_id: node.to_dict() for node_id, node in tree.nodes.items()}
+    return compile_nodes(nodes_data, filename, initial_state=tree.initial_state)
+
+
+def compile_json(json_filename, filename):
+    """
+    Compiles a story_data.json file with its journal (editor saves since the
+    last full save) laid over it, keeping track of which layout it used.
+    """
+    with open(json_filename, "r") as f:
+        data = json.load(f)
+    if "nodes" in data and "initial_state" in data:
+        nodes_data, initial_state = data["nodes"], data["initial_state"]
+    else:
+        nodes_data, initial_state = data, None
+    overlay, journal_state = engine.read_journal_overlay(engine.journal_path(json_filename))
+    if overlay:
+        merged = {}
+        for node_id, node_data in nodes_data.items():
+            node_data = overlay.pop(node_id, node_data)
+            if node_data is not None:
+                merged[node_id] = node_data
+        # Created since the last full save
+        merged.update((node_id, node_data) for node_id, node_data in overlay.items() if node_data is not None)
+        nodes_data = merged
+    if journal_state is not None:
+        initial_state = journal_state
+    return compile_nodes(nodes_data, filename, initial_state=initial_state)
+
+
+class StoryFile(Mapping):
+    """
+    Read-only {node_id: DialogueNode} view of a compiled story file.
+    Lookups binary-search the on-disk index; decoded nodes live in an LRU of cache_size.
+    """
+    def __init__(self, filename, cache_size=DEFAULT_CACHE_SIZE):
+        self.filename = filename
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._file = open(filename, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self._file.close()
+            raise ValueError(f"'{filename}' is not a NarraNode binary story")
+
+        if len(self._mm) < _HEADER.size:
+            self.close()
+            raise ValueError(f"'{filename}' is not a NarraNode binary story")
+        magic, version, flags, count, index_offset, meta_offset, meta_length = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"'{filename}' is not a NarraNode binary story (v{VERSION})")
+
+        self.flags = flags
+        self._count = count
+        self._index_offset = index_offset
+        meta = json.loads(self._mm[meta_offset:meta_offset + meta_length])
+        self.initial_state = meta["initial_state"]
+
+    @property
+    def has_initial_state(self):
+        return bool(self.flags & FLAG_HAS_INITIAL_STATE)
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def copy(self):
+        """
+        The same file with a node cache of its own, for DialogueTree.snapshot():
+        the read-only mapping is shared across threads, the LRU isn't. It
+        stops working once this StoryFile is closed.
+        """
+        other = StoryFile.__new__(StoryFile)
+        other.__dict__.update(self.__dict__)
+        other._cache = OrderedDict()
+        return other
+
+    # --- RECORD ACCESS ---
+    def _read_key(self, offset):
+        (key_len,) = _U32.unpack_from(self._mm, offset)
+        start = offset + _U32.size
+        return self._mm[start:start + key_len], start + key_len
+
+    def _read_body(self, body_offset):
+        (body_len,) = _U32.unpack_from(self._mm, body_offset)
+        start = body_offset + _U32.size
+        return json.loads(self._mm[start:start + body_len])
+
+    def _find(self, key):
+        """Binary search over the sorted offset index. Returns the body offset or None."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (offset,) = _OFFSET.unpack_from(self._mm, self._index_offset + mid * _OFFSET.size)
+            mid_key, body_offset = self._read_key(offset)
+            if mid_key == key:
+                return body_offset
+            if mid_key < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _iter_records(self):
+        """Yields (node_id, body_offset) in original file order."""
+        offset = _HEADER.size
+        for _ in range(self._count):
+            key, body_offset = self._read_key(offset)
+            (body_len,) = _U32.unpack_from(self._mm, body_offset)
+            yield key.decode("utf-8"), body_offset
+            offset = body_offset + _U32.size + body_len
+
+    # --- MAPPING INTERFACE ---
+    def get_node(self, node_id):
+        node = self._cache.get(node_id)
+        if node is not None:
+            self._cache.move_to_end(node_id)
+            return node
+
+        if not isinstance(node_id, str):
+            return None
+        body_offset = self._find(node_id.encode("utf-8"))
+        if body_offset is None:
+            return None
+
+        node = engine.DialogueNode.from_dict(self._read_body(body_offset))
+        self._cache[node_id] = node
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return node
+
+    def __getitem__(self, node_id):
+        node = self.get_node(node_id)
+        if node is None:
+            raise KeyError(node_id)
+        return node
+
+    def __contains__(self, node_id):
+        return isinstance(node_id, str) and self._find(node_id.encode("utf-8")) is not None
+
+    def __iter__(self):
+        for node_id, _ in self._iter_records():
+            yield node_id
+
+    def __len__(self):
+        return self._count
+
+    def iter_node_dicts(self):
+        """Yields (node_id, node_dict) in file order without touching the LRU."""
+        for node_id, body_offset in self._iter_records():
+            yield node_id, self._read_body(body_offset)
+
+
+def open_tree(filename, cache_size=DEFAULT_CACHE_SIZE):
+    """
+    Returns a DialogueTree whose nodes are decoded lazily from a compiled file.
+    The tree plays like a loaded one (play_story, get_node) but its nodes are read-only.
+    """
+    started = time.perf_counter()
+    story_file = StoryFile(filename, cache_size=cache_size)
+    tree = engine.DialogueTree(initial_state=dict(story_file.initial_state))
+    tree.nodes = story_file
+    if tree.events.loaded:
+        tree.events.emit(events.LOADED, tree, filename, len(story_file), time.perf_counter() - started)
+    return tree
+
+
+def decompile(filename, json_filename):
+    """Writes a compiled story back out in the JSON layout it was compiled from. Returns the node count."""
+    with StoryFile(filename) as story_file:
+        nodes_data = dict(story_file.iter_node_dicts())
+        if story_file.has_initial_state:
+            data = {"initial_state": story_file.initial_state, "nodes": nodes_data}
+        else:
+            data = nodes_data
+    with open(json_filename, "w") as f:
+        json.dump(data, f, indent=4)
+    return len(nodes_data)
+
+
+if __name__ == "__main__":
+    usage = "Usage: python storybin.py compile <story.json> <story.nnb> | decompile <story.nnb> <story.json>"
+    if len(sys.argv) != 4 or sys.argv[1] not in ("compile", "decompile"):
+        print(usage)
+        sys.exit(1)
+    if sys.argv[1] == "compile":
+        count = compile_json(sys.argv[2], sys.argv[3])
+        print(f"[System] Compiled {count} nodes to {sys.argv[3]}")
+    else:
+        count = decompile(sys.argv[2], sys.argv[3])
+        print(f"[System] Decompiled {count} nodes to {sys.argv[3]}")
@@ -0,0 +1,294 @@
+"""
+Precompiled story cache: a loaded story kept next to its JSON in marshal form,
+so starting the engine on an unchanged story skips the JSON parse and the
+journal replay. Only loads that ask for it (load_from_json(cache=True), as the
+CLI engine does) read or write a cache; other tools leave no file behind.
+
+The cache ("<story file>.nncache") is keyed by the content of the story and
+of its journal: a blake2b digest of both. Their stamps (mtime, size) are kept
+too, so the usual check is two stat() calls; the files are only hashed when a
+stamp moved (a touch or a checkout leaves the digest as it was and the cache
+is re-stamped). Any edit, save or journal append makes the next load miss, and
+that load writes a new cache.
+
+Layout:
+    MAGIC (8 bytes), u32 header length
+    header   marshal: version, Python version, stamps, digest, initial_state
+    body     marshal: {node_id: record}, in story order; a record is one node
+             marshaled as (speaker, text, next_node_id, choices)
+
+Records are decoded one node at a time. A lazy load (the CLI engine) decodes
+only the nodes play reaches, so the first line of dialogue shows without
+building the other nodes; like storybin.open_tree, it leaves the reverse-link
+index empty. A full load decodes every node and builds the index, and is still
+quicker than parsing JSON. Stories smaller than MIN_SOURCE_BYTES aren't cached:
+they parse faster than the cache would pay back.
+
+marshal (not pickle) only holds plain data, so a cache file can't run code; it
+is tied to one Python version and is simply rebuilt under another one.
+
+    python storycache.py story.json            (builds the cache if it is missing or stale)
+    python storycache.py story.json --clear
+"""
+import gc
+import hashlib
+import json
+import marshal
+import os
+import struct
+import sys
+import time
+from collections.abc import MutableMapping
+
+import events
+import narranode as engine
+
+MAGIC = b"NNCACHE1"
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".nncache"
+MIN_SOURCE_BYTES = 256 * 1024
+
+_HEADER = struct.Struct("<8sI")
+
+
+def cache_path(filename):
+    return filename + CACHE_SUFFIX
+
+
+def _stamp(path):
+    """[mtime_ns, size], or None if the file is missing."""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return [info.st_mtime_ns, info.st_size]
+
+
+def _read_bytes(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return b""
+
+
+def _digest(source, journal):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(struct.pack("<Q", len(source)))
+    digest.update(source)
+    digest.update(journal)
+    return digest.hexdigest()
+
+
+# --- RECORDS ---
+def encode_node(node):
+    choices = tuple((choice["text"], choice["next_id"], choice["effects"], choice["requirements"])
+                    for choice in node.choices)
+    return marshal.dumps((node.speaker, node.text, node.next_node_id, choices))
+
+
+def decode_node(node_id, record):
+    speaker, text, next_node_id, choices = marshal.loads(record)
+    node = engine.DialogueNode(node_id, speaker, text, next_node_id=next_node_id)
+    for choice_text, next_id, effects, requirements in choices:
+        node.add_choice(choice_text, next_id, effects=effects, requirements=requirements)
+    return node
+
+
+class CachedNodes(MutableMapping):
+    """
+    {node_id: DialogueNode} over cache records, in story order. A node is
+    decoded the first time it is read; membership, len() and iteration never
+    decode. Nodes can be added, replaced and deleted like in a plain dict.
+    """
+    def __init__(self, records):
+        self._nodes = records   # node_id -> DialogueNode, or its record (bytes) until first read
+
+    def __getitem__(self, node_id):
+        node = self._nodes[node_id]
+        if type(node) is bytes:
+            node = self._nodes[node_id] = decode_node(node_id, node)
+        return node
+
+    def get(self, node_id, default=None):
+        if node_id not in self._nodes:
+            return default
+        return self[node_id]
+
+    def __setitem__(self, node_id, node):
+        self._nodes[node_id] = node
+
+    def __delitem__(self, node_id):
+        del self._nodes[node_id]
+
+    def __contains__(self, node_id):
+        return node_id in self._nodes
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @property
+    def decoded(self):
+        """How many nodes have been built so far."""
+        return sum(1 for node in self._nodes.values() if type(node) is not bytes)
+
+    def copy(self):
+        """A copy sharing the nodes (and records) decoded so far, like dict.copy() (see DialogueTree.snapshot)."""
+        return CachedNodes(self._nodes.copy())
+
+
+# --- CACHE ---
+class StoryCache:
+    """
+    The cache of one story JSON. DialogueTree.load_from_json(cache=True) calls
+    load(tree) first, and on a miss parse() for the data and store(tree) once
+    the tree is loaded.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = cache_path(filename)
+        self.journal = engine.journal_path(filename)
+        self._stamps = None
+        self._digest = None
+        self._source = None     # Story bytes read by load() or parse(), for parse() and store()
+
+    def _current_stamps(self):
+        # Taken before the files are read: a write after that leaves the stamp stale, never the digest
+        if self._stamps is None:
+            self._stamps = [_stamp(self.filename), _stamp(self.journal)]
+        return self._stamps
+
+    def _current_digest(self):
+        if self._digest is None:
+            self._current_stamps()
+            if self._source is None:
+                self._source = _read_bytes(self.filename)
+            self._digest = _digest(self._source, _read_bytes(self.journal))
+        return self._digest
+
+    @property
+    def worthwhile(self):
+        stamp = self._current_stamps()[0]
+        return stamp is not None and stamp[1] >= MIN_SOURCE_BYTES
+
+    def _read_header(self, f):
+        """The cache's header if it was written for this Python, else None."""
+        prefix = f.read(_HEADER.size)
+        if len(prefix) < _HEADER.size:
+            return None
+        magic, header_length = _HEADER.unpack(prefix)
+        if magic != MAGIC:
+            return None
+        header = marshal.loads(f.read(header_length))
+        if header.get("version") != CACHE_VERSION or header.get("python") != tuple(sys.version_info[:2]):
+            return None
+        return header
+
+    def load(self, tree, lazy=False):
+        """
+        Fills tree from the cache if it matches the story and journal on disk.
+        Returns False (tree untouched) when there is no current cache.
+        lazy=True installs CachedNodes and leaves the reverse index empty.
+        """
+        if not self.worthwhile:
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                header = self._read_header(f)
+                if header is None:
+                    return False
+                restamp = header["stamps"] != self._current_stamps()
+                if restamp and header["digest"] != self._current_digest():
+                    return False
+                body = f.read()
+            records = marshal.loads(body)
+        except (OSError, EOFError, ValueError, TypeError, KeyError, AttributeError):
+            return False    # Missing, torn or foreign: treated like no cache
+
+        if restamp:
+            # Same content under new stamps: next time the stat() check is enough again
+            header["stamps"] = self._current_stamps()
+            self._write(header, body)
+
+        tree.initial_state = header["initial_state"]
+        tree.state = tree.initial_state.copy()
+        if lazy:
+            tree.nodes = CachedNodes(records)
+            tree.referrers = {}
+            tree._targets = {}
+        else:
+            # Hundreds of thousands of small objects would otherwise trigger the cyclic GC over and over
+            gc_was_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                tree.nodes = {node_id: decode_node(node_id, record) for node_id, record in records.items()}
+            finally:
+                if gc_was_enabled:
+                    gc.enable()
+            tree.rebuild_index()
+        return True
+
+    def parse(self):
+        """The story's JSON data, from the bytes load() already read when it could."""
+        if self.worthwhile:
+            # Hashed before the journal is replayed: an append after this makes the cache stale, not wrong
+            self._current_digest()
+        elif self._source is None:
+            self._source = _read_bytes(self.filename)
+        return json.loads(self._source)
+
+    def store(self, tree):
+        """Writes the cache for tree, just loaded from the story. Returns False if it wasn't written."""
+        if not self.worthwhile:
+            return False
+        header = {
+            "version": CACHE_VERSION,
+            "python": tuple(sys.version_info[:2]),
+            "stamps": self._current_stamps(),
+            "digest": self._current_digest(),
+            "initial_state": tree.initial_state,
+        }
+        try:
+            body = marshal.dumps({node_id: encode_node(node) for node_id, node in tree.nodes.items()})
+            self._write(header, body)
+        except (OSError, ValueError):
+            return False    # Read-only folder, or data marshal can't hold: loads just stay uncached
+        return True
+
+    def _write(self, header, body):
+        header_bytes = marshal.dumps(header)
+        try:
+            engine.write_bytes_atomic(self.path, [_HEADER.pack(MAGIC, len(header_bytes)), header_bytes, body],
+                                      suffix=CACHE_SUFFIX)
+        except OSError:
+            pass
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or not os.path.isfile(sys.argv[1]):
+        print("Usage: python storycache.py <story.json> [--clear]")
+        sys.exit(1)
+    story_path = sys.argv[1]
+    story_cache = StoryCache(story_path)
+    if "--clear" in sys.argv[2:]:
+        story_cache.clear()
+        print(f"[System] Removed {story_cache.path}")
+        sys.exit(0)
+    if not story_cache.worthwhile:
+        print(f"[System] {story_path} is under {MIN_SOURCE_BYTES // 1024} KB; it isn't cached")
+        sys.exit(0)
+    tree = engine.DialogueTree()
+    started = time.perf_counter()
+    if story_cache.load(tree, lazy=True):
+        print(f"[System] Cache is current: {len(tree.nodes)} nodes in {time.perf_counter() - started:.3f}s")
+    else:
+        events.enable_console()
+        tree.load_from_json(story_path, cache=True)
+        print(f"[System] Cache written to {story_cache.path} ({os.path.getsize(story_cache.path)} bytes)")
@@ -0,0 +1,139 @@
+"""
+Synthetic story generator for benchmarks and stress tests.
+
+Builds stories shaped like real ones: node i always leads on to node i + 1
+(so everything is reachable from node_0), other links mostly jump a short way
+forward, and a tunable share of them loop back. Every knob is a keyword of
+generate_data() / generate_story(), and the same arguments and seed always
+give the same story.
+
+    python storygen.py out.json --nodes 50000 --branching 3 --cycles 0.1
+"""
+import argparse
+import random
+import sys
+
+import narranode as engine
+
+DEFAULTS = {
+    "nodes": 1000,
+    "branching": 3,             # Average choices per choice node
+    "linear_ratio": 0.3,        # Share of nodes that auto-advance (NextNode) instead of branching
+    "cycle_density": 0.05,      # Share of extra choice links that point back to an earlier node
+    "requirement_density": 0.2, # Share of choices with requirements
+    "effect_density": 0.3,      # Share of choices with effects
+    "stats": 4,                 # Numeric stats (plus as many flags)
+    "text_words": 12,           # Words per line of dialogue
+    "seed": 0,
+}
+
+SPEAKERS = ["Narrator", "Marcus", "Elena", "Guard", "Innkeeper", "Stranger"]
+WORDS = ("the a you we they gold door key night road river old king tower why never "
+         "quickly must should remember forget behind under bring take open closed "
+         "silver storm village promise secret blood bread fire stone").split()
+
+
+def _requirements(rng, stats, flags):
+    roll = rng.random()
+    stat = rng.choice(stats)
+    if roll < 0.5:
+        return {stat: rng.randint(1, 10)}
+    if roll < 0.7:
+        return {stat: f"{rng.choice(['<=', '<', '>', '!='])} {rng.randint(0, 10)}"}
+    if roll < 0.9:
+        return {rng.choice(flags): rng.random() < 0.8}
+    return {"$if": f"{stat} >= {rng.randint(1, 5)} and not {rng.choice(flags)}"}
+
+
+def _effects(rng, stats, flags):
+    roll = rng.random()
+    if roll < 0.6:
+        return {rng.choice(stats): rng.choice([-3, -2, -1, 1, 2, 3, 5])}
+    if roll < 0.75:
+        return {rng.choice(stats): f"= {rng.randint(0, 10)}"}
+    return {rng.choice(flags): rng.random() < 0.8}
+
+
+def generate_data(**options):
+    """A story as the dict load_from_json reads ({"initial_state", "nodes"})."""
+    unknown = set(options) - set(DEFAULTS)
+    if unknown:
+        raise TypeError(f"Unknown generator option(s): {', '.join(sorted(unknown))}")
+    opts = dict(DEFAULTS, **options)
+    rng = random.Random(opts["seed"])
+    count = max(1, opts["nodes"])
+    stats = [f"stat_{k}" for k in range(max(1, opts["stats"]))]
+    flags = [f"flag_{k}" for k in range(max(1, opts["stats"]))]
+    window = max(2, opts["branching"] * 4)
+
+    nodes = {}
+    for i in range(count):
+        node_id = f"node_{i}"
+        text = " ".join(rng.choice(WORDS) for _ in range(opts["text_words"])).capitalize() + "."
+        data = {"ID": node_id, "Speaker": rng.choice(SPEAKERS), "Text": text, "NextNode": None, "Choices": []}
+        nodes[node_id] = data
+        if i == count - 1:
+            continue    # The last node is an ending
+
+        if rng.random() < opts["linear_ratio"]:
+            data["NextNode"] = f"node_{i + 1}"
+            continue
+
+        choice_count = max(1, rng.randint(opts["branching"] - 1, opts["branching"] + 1))
+        for j in range(choice_count):
+            if j == 0:
+                target = i + 1
+            elif i > 0 and rng.random() < opts["cycle_density"]:
+                target = rng.randint(max(0, i - window * 4), i - 1)
+            else:
+                target = min(count - 1, i + rng.randint(1, window))
+            data["Choices"].append({
+                "text": f"Option {j + 1}",
+                "next_id": f"node_{target}",
+                "effects": _effects(rng, stats, flags) if rng.random() < opts["effect_density"] else {},
+                "requirements": (_requirements(rng, stats, flags)
+                                 if j > 0 and rng.random() < opts["requirement_density"] else {}),
+            })
+
+    initial_state = {stat: rng.randint(0, 5) for stat in stats}
+    return {"initial_state": initial_state, "nodes": nodes}
+
+
+def generate_story(**options):
+    """A DialogueTree built from generate_data(**options)."""
+    data = generate_data(**options)
+    tree = engine.DialogueTree(data["initial_state"])
+    for node_data in data["nodes"].values():
+        node = engine.DialogueNode.from_dict(node_data)
+        tree.nodes[node.node_id] = node
+    tree.rebuild_index()
+    return tree
+
+
+def add_arguments(parser):
+    """Generator options as --flags (shared with bench.py)."""
+    parser.add_argument("--nodes", type=int, default=DEFAULTS["nodes"])
+    parser.add_argument("--branching", type=int, default=DEFAULTS["branching"])
+    parser.add_argument("--linear", dest="linear_ratio", type=float, default=DEFAULTS["linear_ratio"])
+    parser.add_argument("--cycles", dest="cycle_density", type=float, default=DEFAULTS["cycle_density"])
+    parser.add_argument("--requirements", dest="requirement_density", type=float,
+                        default=DEFAULTS["requirement_density"])
+    parser.add_argument("--effects", dest="effect_density", type=float, default=DEFAULTS["effect_density"])
+    parser.add_argument("--stats", type=int, default=DEFAULTS["stats"])
+    parser.add_argument("--text-words", dest="text_words", type=int, default=DEFAULTS["text_words"])
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+
+
+def options_from_args(args):
+    return {name: getattr(args, name) for name in DEFAULTS}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic NarraNode story.")
+    parser.add_argument("output", help="Story JSON file to write")
+    add_arguments(parser)
+    args = parser.parse_args()
+    data = generate_data(**options_from_args(args))
+    engine.write_json_atomic(data, args.output)
+    print(f"[System] Wrote {len(data['nodes'])} nodes to {args.output}")
+    sys.exit(0)
@@ -0,0 +1,168 @@
+"""
+Compact playthrough traces: which nodes a session visited and which choices it took.
+
+A trace file holds one or more sessions (play_story writes one file per
+session; the simulator one file per chunk of sessions):
+
+    TRACE_MAGIC
+    per session, per node visited:
+        varint  node reference: 2 * id + 2 for a node ID seen before in this file,
+                or 1 followed by varint length + utf-8 ID to define the next ID
+        varint  choice taken there: original choice index + 1, or 0 (linear
+                flow, or the session ended at this node)
+    per session end:
+        varint  0, then u8 outcome code
+
+Node IDs are interned per file, so a typical step costs two or three bytes.
+"""
+import os
+import sys
+
+import varint
+
+TRACE_MAGIC = b"NNPT1"
+TRACE_SUFFIX = ".nnt"
+
+# Session outcomes: simulator.OUTCOME_* plus a player quitting mid-story
+OUTCOME_ENDED = "ended"
+OUTCOME_DEAD_END = "dead_end"
+OUTCOME_MISSING = "missing"
+OUTCOME_MAX_STEPS = "max_steps"
+OUTCOME_QUIT = "quit"
+OUTCOMES = (OUTCOME_ENDED, OUTCOME_DEAD_END, OUTCOME_MISSING, OUTCOME_MAX_STEPS, OUTCOME_QUIT)
+_OUTCOME_CODES = {outcome: code for code, outcome in enumerate(OUTCOMES)}
+
+_END = 0
+_DEFINE = 1
+
+
+class TraceError(ValueError):
+    """Raised for files that aren't traces or are cut short."""
+
+
+class TraceWriter:
+    """
+    Records sessions into one trace file. Call enter() for every node, choose()
+    after it for the choice taken, and end() once per session. Data is written
+    when a session ends (and on close), so a crash loses at most that session.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(TRACE_MAGIC)
+        self.buffer = bytearray()
+        self.ids = {}
+        self.sessions = 0
+        self._open_node = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def enter(self, node_id):
+        if self._open_node:
+            self.buffer.append(0)   # Left the previous node without a choice (linear flow)
+        ref = self.ids.get(node_id)
+        if ref is None:
+            self.ids[node_id] = len(self.ids)
+            data = str(node_id).encode("utf-8")
+            self.buffer.append(_DEFINE)
+            varint.encode(len(data), self.buffer)
+            self.buffer += data
+        else:
+            varint.encode(2 * ref + 2, self.buffer)
+        self._open_node = True
+
+    def choose(self, index):
+        varint.encode(index + 1, self.buffer)
+        self._open_node = False
+
+    def end(self, outcome):
+        if self._open_node:
+            self.buffer.append(0)
+            self._open_node = False
+        self.buffer.append(_END)
+        self.buffer.append(_OUTCOME_CODES[outcome])
+        self.sessions += 1
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write(self.buffer)
+            self.buffer.clear()
+            self.file.close()
+
+
+def read_sessions(path):
+    """Yields (steps, outcome) per session, steps being [(node_id, choice index or None), ...]."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(TRACE_MAGIC):
+        raise TraceError(f"'{path}' is not a playthrough trace")
+    names = []
+    steps = []
+    pos = len(TRACE_MAGIC)
+    decode = varint.decode
+    try:
+        while pos < len(data):
+            ref, pos = decode(data, pos)
+            if ref == _END:
+                yield steps, OUTCOMES[data[pos]]
+                pos += 1
+                steps = []
+                continue
+            if ref == _DEFINE:
+                length, pos = decode(data, pos)
+                names.append(data[pos:pos + length].decode("utf-8"))
+                pos += length
+                node_id = names[-1]
+            else:
+                node_id = names[(ref - 2) >> 1]
+            choice, pos = decode(data, pos)
+            steps.append((node_id, choice - 1 if choice else None))
+    except IndexError:
+        raise TraceError(f"'{path}' is truncated or corrupt")
+
+
+def session_trace_path(directory):
+    """A new, unique file name in directory for one session's trace."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = f"{os.getpid()}_{os.urandom(6).hex()}"
+    return os.path.join(directory, f"session_{stamp}{TRACE_SUFFIX}")
+
+
+class TraceListener:
+    """
+    events listener that traces play_story sessions into `directory`, one file
+    per session.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.writer = None
+
+    def on_node_entered(self, tree, node_id):
+        if self.writer is None:
+            self.writer = TraceWriter(session_trace_path(self.directory))
+        self.writer.enter(node_id)
+
+    def on_choice_taken(self, tree, node_id, index, choice):
+        if self.writer is not None:
+            self.writer.choose(index)
+
+    def on_session_ended(self, tree, node_id, outcome):
+        if self.writer is not None:
+            self.writer.end(outcome)
+            self.writer.close()
+            self.writer = None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python traces.py <trace file>")
+        sys.exit(1)
+    for number, (steps, outcome) in enumerate(read_sessions(sys.argv[1]), start=1):
+        path = " -> ".join(node_id if index is None else f"{node_id}[{index}]" for node_id, index in steps)
+        print(f"#{number} ({outcome}): {path}")
@@ -0,0 +1,202 @@
+"""
+Live story validation on top of DialogueTree's reverse-link index.
+
+StoryValidator subscribes to the tree's edge listeners and only re-checks the
+nodes a change touches: the edited node itself, plus the nodes that link to it
+when it is created or deleted. Reachability grows incrementally when links are
+added; removing links or nodes marks it stale and it is recomputed the next
+time it is asked for.
+"""
+import copy
+from collections import deque
+
+# Issue kinds
+DANGLING = "dangling"          # A link points at a node ID that does not exist
+UNREACHABLE = "unreachable"    # No path from the start node reaches this node
+DEAD_END = "dead_end"          # No choices and no next node (an ending, or a forgotten link)
+
+
+class StoryValidator:
+    """
+    Keeps a DialogueTree's dangling links, dead ends and unreachable nodes up to date.
+    start_node_id defaults to the first node, matching the CLI engine.
+    """
+    def __init__(self, tree, start_node_id=None):
+        self.tree = tree
+        self._start_node_id = start_node_id
+        self.dangling = {}      # source_id -> set of missing target IDs
+        self.dead_ends = set()
+        self._reachable = None
+        self._known = set()     # node IDs present as of the last update
+        tree.edge_listeners.append(self._on_edges)
+        self.rebuild()
+
+    def detach(self):
+        if self._on_edges in self.tree.edge_listeners:
+            self.tree.edge_listeners.remove(self._on_edges)
+
+    def frozen(self, snapshot):
+        """
+        A detached copy of the current findings over snapshot (taken from this
+        validator's tree just now), so issues() can run on another thread.
+        """
+        other = copy.copy(self)
+        other.tree = snapshot
+        other.dangling = dict(self.dangling)   # Its sets are replaced, never changed in place
+        other.dead_ends = set(self.dead_ends)
+        other._known = set(self._known)
+        other._reachable = set(self._reachable) if self._reachable is not None else None
+        return other
+
+    def adopt_reachable(self, frozen, snapshot):
+        """
+        Takes over the reachability a frozen copy worked out over snapshot,
+        caught up with the edits made to the tree since, so the next check
+        doesn't walk the whole story again. Does nothing if reachability is
+        already known here, or if the edits since removed links.
+        """
+        if self._reachable is not None or frozen._reachable is None:
+            return
+        if frozen.start_node_id != self.start_node_id:
+            return
+        self._reachable = frozen._reachable
+        for node_id, old_targets, new_targets in snapshot.changes_since(self.tree):
+            if node_id is None:
+                self._reachable = None
+            else:
+                self._update_reachable(node_id, old_targets, new_targets)
+            if self._reachable is None:
+                return
+
+    @property
+    def start_node_id(self):
+        if self._start_node_id is not None:
+            return self._start_node_id
+        return next(iter(self.tree.nodes), None)
+
+    @start_node_id.setter
+    def start_node_id(self, node_id):
+        self._start_node_id = node_id
+        self._reachable = None
+
+    # --- UPDATES ---
+    def rebuild(self):
+        """Full check: O(nodes + links)."""
+        self.dangling = {}
+        self.dead_ends = set()
+        self._known = set(self.tree.nodes)
+        for node_id in self.tree.nodes:
+            self._check_node(node_id)
+        self._reachable = None
+
+    def _check_node(self, node_id):
+        node = self.tree.nodes.get(node_id)
+        self.dangling.pop(node_id, None)
+        self.dead_ends.discard(node_id)
+        if node is None:
+            return
+        missing = {t for t in node.targets() if t not in self.tree.nodes}
+        if missing:
+            self.dangling[node_id] = missing
+        if not node.choices and not node.next_node_id:
+            self.dead_ends.add(node_id)
+
+    def _on_edges(self, node_id, old_targets, new_targets):
+        if node_id is None:
+            self.rebuild()
+            return
+
+        self._check_node(node_id)
+        exists = node_id in self.tree.nodes
+        if exists != (node_id in self._known):
+            # Created or deleted: links pointing here change dangling status
+            if exists:
+                self._known.add(node_id)
+            else:
+                self._known.discard(node_id)
+            for source_id in self.tree.referrers.get(node_id, ()):
+                self._check_node(source_id)
+            if node_id == self._start_node_id or self._start_node_id is None:
+                # The default start node may have changed
+                self._reachable = None
+        self._update_reachable(node_id, old_targets, new_targets)
+
+    def _update_reachable(self, node_id, old_targets, new_targets):
+        """Grows the reachable set for added links; removed links or nodes make it stale."""
+        if self._reachable is None:
+            return
+        exists = node_id in self.tree.nodes
+        removed = set(old_targets) - set(new_targets)
+        if removed or not exists:
+            self._reachable = None
+        elif node_id in self._reachable:
+            self._extend_reachable(set(new_targets) - set(old_targets))
+        elif exists and self.tree.referrers.get(node_id, {}).keys() & self._reachable:
+            # A new node that reachable nodes were already linking to
+            self._extend_reachable([node_id])
+
+    # --- REACHABILITY ---
+    def _extend_reachable(self, frontier):
+        """BFS from frontier, only visiting nodes not already known reachable."""
+        nodes = self.tree.nodes
+        queue = deque(t for t in frontier if t in nodes and t not in self._reachable)
+        self._reachable.update(queue)
+        while queue:
+            node = nodes[queue.popleft()]
+            for target in node.targets():
+                if target in nodes and target not in self._reachable:
+                    self._reachable.add(target)
+                    queue.append(target)
+
+    @property
+    def reachable(self):
+        if self._reachable is None:
+            self._reachable = set()
+            start = self.start_node_id
+            if start is not None:
+                self._extend_reachable([start])
+        return self._reachable
+
+    @property
+    def unreachable(self):
+        reachable = self.reachable
+        return [node_id for node_id in self.tree.nodes if node_id not in reachable]
+
+    # --- REPORTING ---
+    def issues(self):
+        """[(kind, node_id, detail), ...] sorted by kind then node ID."""
+        found = []
+        for source_id, targets in self.dangling.items():
+            for target in sorted(targets, key=str):
+                found.append((DANGLING, source_id, f"links to missing node '{target}'"))
+        for node_id in self.unreachable:
+            found.append((UNREACHABLE, node_id, f"not reachable from '{self.start_node_id}'"))
+        for node_id in self.dead_ends:
+            found.append((DEAD_END, node_id, "no choices and no next node"))
+        return sorted(found, key=lambda issue: (issue[0], str(issue[1])))
+
+
+def validate(tree, start_node_id=None):
+    """One-off validation of a tree. Returns the issues list."""
+    validator = StoryValidator(tree, start_node_id)
+    try:
+        return validator.issues()
+    finally:
+        validator.detach()
+
+
+if __name__ == "__main__":
+    import sys
+    import events
+    import narranode as engine
+
+    story_path = sys.argv[1] if len(sys.argv) > 1 else "scripts/story_data.json"
+    events.enable_console()
+    tree = engine.DialogueTree()
+    if not tree.load_from_json(story_path):
+        sys.exit(1)
+    issues = validate(tree)
+    for kind, node_id, detail in issues:
+        print(f"[{kind}] {node_id}: {detail}")
+    # Dead ends are usually endings, so only dangling/unreachable fail the check
+    sys.exit(1 if any(kind != DEAD_END for kind, _, _ in issues) else 0)
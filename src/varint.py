@@ -0,0 +1,46 @@
+"""
+LEB128 variable-length integers: 7 bits per byte, high bit set on every byte
+but the last, so values under 128 take one byte. Signed values go through
+zigzag encoding first (0, -1, 1, -2, ... -> 0, 1, 2, 3, ...).
+"""
+
+
+def zigzag(value):
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def encode(value, out):
+    """Appends unsigned value to the bytearray out."""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_signed(value, out):
+    encode(zigzag(value), out)
+
+
+def decode(data, pos):
+    """Returns (value, next position) for the varint at data[pos]."""
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    value = byte & 0x7F
+    shift = 7
+    while True:
+        pos += 1
+        byte = data[pos]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos + 1
+        shift += 7
+
+
+def decode_signed(data, pos):
+    value, pos = decode(data, pos)
+    return unzigzag(value), pos
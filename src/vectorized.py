@@ -0,0 +1,256 @@
+"""
+NumPy batch mode for evaluating many players at once.
+
+A population's stats live in one 2-D array (rows = players, columns = stats,
+see StatSchema). Checking a choice's requirements for the whole population is
+one masked comparison and applying its effects is one vectorized add, with the
+same rules as DialogueTree: a missing stat is 0 and a requirement is ">=".
+"""
+import sys
+import time
+
+import numpy as np
+
+import conditions
+import events
+import narranode as engine
+import runtime
+
+NO_NODE = -1    # Node index for links to IDs that are not in the story
+
+# run_random() outcome codes (names match simulator.OUTCOME_*)
+OUTCOME_RUNNING = 0
+OUTCOME_ENDED = 1
+OUTCOME_DEAD_END = 2
+OUTCOME_MISSING = 3
+OUTCOME_MAX_STEPS = 4
+OUTCOME_NAMES = {
+    OUTCOME_ENDED: "ended",
+    OUTCOME_DEAD_END: "dead_end",
+    OUTCOME_MISSING: "missing",
+    OUTCOME_MAX_STEPS: "max_steps",
+}
+
+
+class StatSchema:
+    """Maps stat names to column indices."""
+    def __init__(self, stats=()):
+        self.columns = {}
+        for stat in stats:
+            self.add(stat)
+
+    def add(self, stat):
+        if stat not in self.columns:
+            self.columns[stat] = len(self.columns)
+        return self.columns[stat]
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    @classmethod
+    def from_story(cls, story):
+        """Every stat named in initial_state, effects or requirements, in first-seen order."""
+        schema = cls(story.initial_state)
+        for node in story.nodes.values():
+            for choice in node.choices:
+                for stat in choice.requirements:
+                    schema.add(stat)
+                for stat in choice.effects:
+                    schema.add(stat)
+        return schema
+
+    def row(self, state, dtype=np.float64):
+        """A state dict as one row (missing stats are 0)."""
+        values = np.zeros(len(self.columns), dtype=dtype)
+        for stat, value in state.items():
+            values[self.columns[stat]] = value
+        return values
+
+    def to_dict(self, row):
+        """One row back into a state dict (every column in the schema is included)."""
+        return {stat: row[col].item() for stat, col in self.columns.items()}
+
+
+class CompiledChoice:
+    """A choice's requirements and effects as column-index / value arrays."""
+    __slots__ = ("choice", "req_cols", "req_vals", "eff_cols", "eff_vals")
+
+    def __init__(self, schema, choice, dtype=np.float64):
+        if not (conditions.is_simple_requirements(choice.requirements)
+                and conditions.is_simple_effects(choice.effects)):
+            raise ValueError(f"Batch mode only supports numeric '>=' requirements and '+' effects "
+                             f"(choice '{choice.text}' -> {choice.next_id})")
+        self.choice = choice
+        self.req_cols = np.array([schema.columns[s] for s in choice.requirements], dtype=np.intp)
+        self.req_vals = np.array(list(choice.requirements.values()), dtype=dtype)
+        self.eff_cols = np.array([schema.columns[s] for s in choice.effects], dtype=np.intp)
+        self.eff_vals = np.array(list(choice.effects.values()), dtype=dtype)
+
+    def unlocked(self, values):
+        """Boolean mask: which rows of values meet every requirement."""
+        if not len(self.req_cols):
+            return np.ones(len(values), dtype=bool)
+        return (values[:, self.req_cols] >= self.req_vals).all(axis=1)
+
+    def apply(self, values, rows=None):
+        """Adds the effects to every row (or only to the given row indices / boolean mask)."""
+        if not len(self.eff_cols):
+            return
+        if rows is None:
+            values[:, self.eff_cols] += self.eff_vals
+        else:
+            if rows.dtype == bool:
+                rows = np.flatnonzero(rows)
+            values[np.ix_(rows, self.eff_cols)] += self.eff_vals
+
+
+class BatchEngine:
+    """
+    Precompiles a Story for population-wide evaluation. Each node's choices are
+    also packed into a dense effects matrix so rows that picked different
+    choices at the same node are updated in a single add.
+    """
+    def __init__(self, story, schema=None, dtype=np.float64):
+        self.story = story
+        self.dtype = dtype
+        self.schema = schema or StatSchema.from_story(story)
+        self.node_ids = list(story.nodes)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.choices = {}
+        self.effect_matrices = {}
+        for node_id, node in story.nodes.items():
+            compiled = [CompiledChoice(self.schema, c, dtype) for c in node.choices]
+            self.choices[node_id] = compiled
+            matrix = np.zeros((len(compiled), len(self.schema)), dtype=dtype)
+            for j, c in enumerate(compiled):
+                matrix[j, c.eff_cols] = c.eff_vals
+            self.effect_matrices[node_id] = matrix
+
+    def population(self, size, state=None):
+        """size copies of state (default: the story's initial_state) as a (size, stats) array."""
+        row = self.schema.row(self.story.initial_state if state is None else state, self.dtype)
+        return np.tile(row, (size, 1))
+
+    def unlocked(self, values, node_id):
+        """(rows, choices) boolean matrix of which choices each row may take at node_id."""
+        compiled = self.choices[node_id]
+        mask = np.ones((len(values), len(compiled)), dtype=bool)
+        for j, c in enumerate(compiled):
+            if len(c.req_cols):
+                mask[:, j] = c.unlocked(values)
+        return mask
+
+    def apply_choices(self, values, node_id, picks, rows=None):
+        """
+        Applies choice picks[i] of node_id to row rows[i] (all rows if rows is None).
+        picks index the node's full choice list, not just the unlocked ones.
+        """
+        delta = self.effect_matrices[node_id][picks]
+        if rows is None:
+            values += delta
+        else:
+            values[rows] += delta
+
+    def _target(self, node_id):
+        return self.node_index.get(node_id, NO_NODE)
+
+    def run_random(self, size, start_node_id=None, seed=0, max_steps=1000):
+        """
+        Random-policy playthroughs for a whole population. Every step, running
+        rows are grouped by their current node and each group is evaluated and
+        advanced with array operations.
+        Returns (values, node_indices, outcomes): outcomes holds OUTCOME_* codes.
+        """
+        rng = np.random.default_rng(seed)
+        start_node_id = start_node_id if start_node_id is not None else self.story.first_node_id()
+        targets = self._choice_targets()
+        values = self.population(size)
+        current = np.full(size, self._target(start_node_id), dtype=np.intp)
+        outcomes = np.full(size, OUTCOME_RUNNING, dtype=np.int8)
+        outcomes[current == NO_NODE] = OUTCOME_MISSING
+
+        for _ in range(max_steps):
+            running = np.flatnonzero(outcomes == OUTCOME_RUNNING)
+            if not len(running):
+                break
+            order = np.argsort(current[running], kind="stable")
+            running = running[order]
+            node_indices, starts = np.unique(current[running], return_index=True)
+            for node_idx, rows in zip(node_indices, np.split(running, starts[1:])):
+                node_id = self.node_ids[node_idx]
+                node = self.story.nodes[node_id]
+                if not node.choices:
+                    if node.next_node_id:
+                        current[rows] = self._target(node.next_node_id)
+                    else:
+                        outcomes[rows] = OUTCOME_ENDED
+                    continue
+
+                mask = self.unlocked(values[rows], node_id)
+                has_choice = mask.any(axis=1)
+                outcomes[rows[~has_choice]] = OUTCOME_DEAD_END
+                rows, mask = rows[has_choice], mask[has_choice]
+                # Uniform pick among unlocked choices: highest random key wins, locked keys can't
+                keys = rng.random(mask.shape)
+                keys[~mask] = -1.0
+                picks = keys.argmax(axis=1)
+                self.apply_choices(values, node_id, picks, rows)
+                current[rows] = targets[node_id][picks]
+            outcomes[(outcomes == OUTCOME_RUNNING) & (current == NO_NODE)] = OUTCOME_MISSING
+
+        outcomes[outcomes == OUTCOME_RUNNING] = OUTCOME_MAX_STEPS
+        return values, current, outcomes
+
+    def _choice_targets(self):
+        return {
+            node_id: np.array([self._target(c.next_id) for c in node.choices], dtype=np.intp)
+            for node_id, node in self.story.nodes.items()
+        }
+
+
+def _benchmark(story, size, node_id):
+    """Times requirement checks at one node: dict path vs. one masked comparison."""
+    batch = BatchEngine(story)
+    values = batch.population(size)
+    rng = np.random.default_rng(0)
+    values += rng.integers(0, 10, size=values.shape)
+    states = [batch.schema.to_dict(row) for row in values]
+    node = story.get_node(node_id)
+
+    started = time.perf_counter()
+    expected = [[engine.check_state_requirements(s, c.requirements) for c in node.choices] for s in states]
+    dict_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    mask = batch.unlocked(values, node_id)
+    vector_time = time.perf_counter() - started
+
+    assert mask.tolist() == expected, "vectorized results differ from DialogueTree semantics"
+    print(f"[Batch] {size} players x {len(node.choices)} choices at '{node_id}'")
+    print(f"   dict path:  {dict_time * 1000:8.2f} ms")
+    print(f"   vectorized: {vector_time * 1000:8.2f} ms ({dict_time / max(vector_time, 1e-9):,.0f}x)")
+
+
+if __name__ == "__main__":
+    import compact
+
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    if len(sys.argv) > 1 and sys.argv[1] != "-":
+        events.enable_console()
+        story = runtime.Story.load(sys.argv[1])
+    else:
+        story = runtime.Story.from_tree(compact._build_sample_tree(1000))
+    # Benchmark the node with the most requirement checks
+    node_id = max(story.nodes, key=lambda n: sum(len(c.requirements) for c in story.nodes[n].choices))
+    _benchmark(story, size, node_id)
+
+    batch = BatchEngine(story)
+    started = time.perf_counter()
+    _, _, outcomes = batch.run_random(size, max_steps=100)
+    elapsed = time.perf_counter() - started
+    counts = {OUTCOME_NAMES[code]: int(n) for code, n in zip(*np.unique(outcomes, return_counts=True))}
+    print(f"[Batch] {size} random playthroughs in {elapsed:.2f}s: {counts}")
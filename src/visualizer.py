@@ -1,11 +1,275 @@
+import json
+import math
+import os
+import sys
+from collections import deque
+
 import networkx as nx
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Above this many nodes the map drops labels/arrows so it stays readable and fast
+LARGE_GRAPH = 300
+
+LAYOUT_VERSION = 1
+BARYCENTER_SWEEPS = 4
+MAX_FIGURE_INCHES = 60   # Headless renders beyond this mostly cost PNG encoding time
+
+
+def _node_links(tree, node_id):
+    node = tree.get_node(node_id)
+    return node.targets() if node is not None else ()
+
+
+def neighborhood(tree, center_id, hops=2):
+    """Node IDs within `hops` links of center_id, following links in both directions."""
+    seen = {center_id}
+    frontier = [center_id]
+    for _ in range(hops):
+        next_frontier = []
+        for node_id in frontier:
+            linked = list(_node_links(tree, node_id)) + tree.referrers_of(node_id)
+            for other in linked:
+                if other not in seen and other in tree.nodes:
+                    seen.add(other)
+                    next_frontier.append(other)
+        frontier = next_frontier
+    return seen
+
 
-def visualize_story(tree):
+class StoryLayout:
     """
-    Generates a visual map of the dialogue tree using NetworkX and Matplotlib.
+    Layered (Sugiyama-style) layout for dialogue graphs.
+    Layers come from a BFS from the start node, so story flow reads top to
+    bottom and loops point back up. Within a layer, nodes are ordered by
+    barycenter sweeps to reduce crossings. update() keeps the order of nodes
+    whose layer did not change, and given the edits since the last layout it
+    only re-layers the nodes downstream of the links they changed.
     """
-    # 1. Create a Directed Graph (DiGraph)
+    def __init__(self):
+        self.layers = {}    # node_id -> layer number
+        self.order = {}     # node_id -> position within its layer
+        self._members = None    # layer -> node_ids by position, built on first update (not cached on disk)
+
+    # --- LAYERING ---
+    @staticmethod
+    def compute_layers(tree, start_node_id=None):
+        """BFS depth from the start node, then from any remaining roots."""
+        nodes = tree.nodes
+        starts = [start_node_id] if start_node_id is not None else []
+        starts += [n for n in nodes if not tree.referrers.get(n)]
+        starts += list(nodes)   # Anything left is only reachable through a cycle
+        layers = {}
+        for start in starts:
+            if start in layers or start not in nodes:
+                continue
+            layers[start] = 0
+            queue = deque([start])
+            while queue:
+                node_id = queue.popleft()
+                for target in nodes[node_id].targets():
+                    if target in nodes and target not in layers:
+                        layers[target] = layers[node_id] + 1
+                        queue.append(target)
+        return layers
+
+    def relayer(self, tree, changes, start_node_id=None):
+        """
+        New layers for the nodes an edit can move, as {node_id: layer} (None for
+        deleted nodes). changes are edge-listener calls (node_id, old_targets,
+        new_targets), see DialogueTree.edge_listeners. Only nodes downstream of
+        an added or removed link are visited: O(that part of the story). The
+        layers match compute_layers, except below roots a deletion leaves
+        behind (there the nearest root wins, not the first one).
+        """
+        nodes = tree.nodes
+        moved = {}
+        seeds = []
+        for node_id, old, new in changes:
+            if node_id not in nodes:
+                if node_id in self.layers:
+                    moved[node_id] = None
+            elif node_id not in self.layers:
+                seeds.append(node_id)
+            seeds.extend(set(old).symmetric_difference(new))
+
+        # Layers outside this region can't depend on anything inside it
+        region = {}
+        queue = deque(n for n in seeds if n in nodes)
+        while queue:
+            node_id = queue.popleft()
+            if node_id in region:
+                continue
+            region[node_id] = None
+            queue.extend(t for t in nodes[node_id].targets() if t in nodes and t not in region)
+
+        # Each node starts one below its nearest referrer outside the region, then a BFS within it
+        best = {}
+        for node_id in region:
+            referrers = tree.referrers.get(node_id)
+            if node_id == start_node_id or not referrers:
+                best[node_id] = 0
+                continue
+            outside = [self.layers[n] + 1 for n in referrers if n not in region and n in self.layers]
+            if outside:
+                best[node_id] = min(outside)
+        buckets = {}
+        for node_id, layer in best.items():
+            buckets.setdefault(layer, []).append(node_id)
+        placed = {}
+        leftovers = iter(region)
+        while len(placed) < len(region):
+            if not buckets:
+                # Only reachable through a cycle inside the region: a new root, as in compute_layers
+                node_id = next(n for n in leftovers if n not in placed)
+                best[node_id] = 0
+                buckets[0] = [node_id]
+            layer = min(buckets)
+            for node_id in buckets.pop(layer):
+                if node_id in placed or best[node_id] != layer:
+                    continue
+                placed[node_id] = layer
+                for target in nodes[node_id].targets():
+                    if target in region and target not in placed and best.get(target, layer + 2) > layer + 1:
+                        best[target] = layer + 1
+                        buckets.setdefault(layer + 1, []).append(target)
+
+        for node_id, layer in placed.items():
+            if self.layers.get(node_id) != layer:
+                moved[node_id] = layer
+        return moved
+
+    def _grouped(self):
+        grouped = {}
+        for node_id, layer in self.layers.items():
+            grouped.setdefault(layer, []).append(node_id)
+        for members in grouped.values():
+            members.sort(key=lambda n: self.order.get(n, 0))
+        return grouped
+
+    def _renumber(self, grouped):
+        self.order = {}
+        for members in grouped.values():
+            for i, node_id in enumerate(members):
+                self.order[node_id] = i
+
+    # --- LAYOUT ---
+    def full_layout(self, tree, start_node_id=None):
+        """Recomputes layers and crossing-reduced order from scratch. O(sweeps * links)."""
+        self.layers = self.compute_layers(tree, start_node_id)
+        self.order = {}
+        grouped = {}
+        for node_id, layer in self.layers.items():
+            grouped.setdefault(layer, []).append(node_id)
+        self._renumber(grouped)
+
+        depth = max(grouped) + 1 if grouped else 0
+        for sweep in range(BARYCENTER_SWEEPS):
+            downward = sweep % 2 == 0
+            for layer in (range(1, depth) if downward else range(depth - 2, -1, -1)):
+                neighbor_layer = layer - 1 if downward else layer + 1
+
+                def barycenter(node_id):
+                    if downward:
+                        linked = tree.referrers.get(node_id, ())
+                    else:
+                        linked = tree.nodes[node_id].targets()
+                    positions = [self.order[n] for n in linked if self.layers.get(n) == neighbor_layer]
+                    return sum(positions) / len(positions) if positions else self.order[node_id]
+
+                grouped[layer].sort(key=barycenter)
+                for i, node_id in enumerate(grouped[layer]):
+                    self.order[node_id] = i
+        self._members = grouped
+        return self.positions()
+
+    def update(self, tree, start_node_id=None, changes=None):
+        """
+        Incremental refresh after edits: nodes that kept their layer keep their
+        place, and new or moved nodes are appended to the end of their layer.
+        changes (see relayer) limits the re-layering to what the edits reach;
+        without them every layer is recomputed (one BFS over the story).
+        Returns the IDs of the nodes that changed layer (positions() has the
+        coordinates).
+        """
+        if not self.layers:
+            self.full_layout(tree, start_node_id)
+            return set(self.layers)
+        if changes is None or any(node_id is None for node_id, _, _ in changes):
+            new_layers = self.compute_layers(tree, start_node_id)
+            moved = {node_id: new_layers.get(node_id) for node_id in self.layers
+                     if new_layers.get(node_id) != self.layers[node_id]}
+            moved.update((node_id, layer) for node_id, layer in new_layers.items() if node_id not in self.layers)
+        else:
+            moved = self.relayer(tree, changes, start_node_id)
+        if not moved:
+            return set()
+
+        if self._members is None:
+            self._members = self._grouped()
+        leaving = {}
+        for node_id, layer in moved.items():
+            if node_id in self.layers:
+                leaving.setdefault(self.layers[node_id], set()).add(node_id)
+        for layer, gone in leaving.items():
+            self._members[layer] = [n for n in self._members[layer] if n not in gone]
+        for node_id, layer in moved.items():
+            if layer is None:
+                del self.layers[node_id]
+                del self.order[node_id]
+            else:
+                self.layers[node_id] = layer
+                self._members.setdefault(layer, []).append(node_id)
+        # Only the layers nodes left or joined are renumbered
+        for layer in set(leaving) | {layer for layer in moved.values() if layer is not None}:
+            members = self._members[layer]
+            if not members:
+                del self._members[layer]
+            for i, node_id in enumerate(members):
+                self.order[node_id] = i
+        return set(moved)
+
+    def positions(self, node_ids=None):
+        """{node_id: (x, y)} with each layer centered on x = 0."""
+        if self._members is not None:
+            widths = {layer: len(members) for layer, members in self._members.items()}
+        else:
+            widths = {}
+            for layer in self.layers.values():
+                widths[layer] = widths.get(layer, 0) + 1
+        ids = self.layers if node_ids is None else [n for n in node_ids if n in self.layers]
+        return {n: (self.order[n] - (widths[self.layers[n]] - 1) / 2, -self.layers[n]) for n in ids}
+
+    # --- DISK CACHE ---
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"version": LAYOUT_VERSION, "layers": self.layers, "order": self.order}, f)
+
+    @classmethod
+    def load(cls, path):
+        """Returns the cached layout, or an empty one if the cache is missing/outdated."""
+        layout = cls()
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == LAYOUT_VERSION:
+                    layout.layers = data["layers"]
+                    layout.order = data["order"]
+            except (ValueError, KeyError):
+                pass
+        return layout
+
+
+def layout_cache_path(story_filename):
+    if os.path.isdir(story_filename):
+        return os.path.join(story_filename, ".layout.json")
+    return os.path.splitext(story_filename)[0] + ".layout.json"
+
+
+def _build_graph(tree, node_ids):
+    """DiGraph of the given nodes plus edge lists/labels split by kind."""
     G = nx.DiGraph()
 
     # Track edge types for different visual styles
@@ -13,18 +277,20 @@ def visualize_story(tree):
     linear_edges = []
     edge_labels = {}
 
-    # 2. Add Data to Graph
-    for node_id, node in tree.nodes.items():
+    for node_id in node_ids:
+        node = tree.nodes[node_id]
         G.add_node(node_id)
 
         # Add edges for linear flow (next_node_id)
-        if node.next_node_id:
+        if node.next_node_id in node_ids:
             G.add_edge(node_id, node.next_node_id)
             linear_edges.append((node_id, node.next_node_id))
             edge_labels[(node_id, node.next_node_id)] = "[auto]"
 
         # Add edges (arrows) for every choice
         for choice in node.choices:
+            if choice['next_id'] not in node_ids:
+                continue
             # We use the choice text as the label for the arrow
             # We truncate it to 15 chars so the graph isn't messy
             label_text = choice['text'][:15] + "..." if len(choice['text']) > 15 else choice['text']
@@ -33,41 +299,170 @@ def visualize_story(tree):
             choice_edges.append((node_id, choice['next_id']))
             edge_labels[(node_id, choice['next_id'])] = label_text
 
-    # 3. Setup Layout (Spring layout tries to space nodes out naturally)
-    pos = nx.spring_layout(G, seed=42, k=0.5) 
+    return G, choice_edges, linear_edges, edge_labels
 
-    # 4. Draw the Nodes
-    plt.figure(figsize=(12, 8)) # Window size
-    
-    # Draw nodes
-    nx.draw_networkx_nodes(G, pos, node_size=2000, node_color='lightblue', edgecolors='black')
-    
-    # Draw labels (ID names inside circles)
-    nx.draw_networkx_labels(G, pos, font_size=10, font_weight="bold")
 
-    # 5. Draw the Edges (Arrows)
-    # Draw choice edges in gray (branching paths)
-    if choice_edges:
-        nx.draw_networkx_edges(G, pos, edgelist=choice_edges, edge_color='gray',
-                               arrowstyle='->', arrowsize=20, width=2)
+def _coverage_colors(counts, keys, cold):
+    """Green shades by visit count (log scale), `cold` for anything never visited."""
+    from matplotlib import colormaps
+
+    shades = colormaps["Greens"]
+    peak = math.log1p(max((counts.get(k, 0) for k in keys), default=0)) or 1.0
+    return [shades(0.2 + 0.6 * math.log1p(counts[k]) / peak) if counts.get(k) else cold for k in keys]
+
+
+class StoryMap:
+    """What draw_story puts on screen, worked out ahead of drawing (see prepare_map)."""
+    def __init__(self, layout, center, hops, graph, choice_edges, linear_edges, edge_labels):
+        self.layout = layout
+        self.center = center
+        self.hops = hops
+        self.graph = graph
+        self.choice_edges = choice_edges
+        self.linear_edges = linear_edges
+        self.edge_labels = edge_labels
+        self.pos = layout.positions(graph.nodes)
 
-    # Draw linear flow edges in blue with dashed style (auto-advance)
-    if linear_edges:
-        nx.draw_networkx_edges(G, pos, edgelist=linear_edges, edge_color='blue',
-                               arrowstyle='->', arrowsize=20, width=2, style='dashed')
 
-    # Draw edge labels (Choice text and [auto] markers on the arrows)
-    nx.draw_networkx_edge_labels(G, pos, edge_labels=edge_labels, font_size=8)
+def prepare_map(tree, layout=None, center=None, hops=2, changes=None):
+    """
+    Updates the layout (with the edits in changes, see StoryLayout.update) and
+    builds the graph draw_story needs. It only reads the tree and never touches
+    matplotlib, so the editor runs it on a worker thread over a snapshot
+    (DialogueTree.snapshot).
+    """
+    if layout is None:
+        layout = StoryLayout()
+        layout.full_layout(tree)
+    else:
+        layout.update(tree, changes=changes)
+    node_ids = neighborhood(tree, center, hops) if center is not None else set(tree.nodes)
+    return StoryMap(layout, center, hops, *_build_graph(tree, node_ids))
 
-    # 6. Add Legend
+
+def draw_story(ax, tree, layout=None, center=None, hops=2, highlight=None, coverage=None, story_map=None):
+    """
+    Draws the story map (or the `hops` neighborhood of `center`) onto a matplotlib Axes.
+    coverage ({"nodes": {id: visits}, "edges": {(source, target): count}}, see
+    coverage.Coverage.overlay) shades what playthroughs used and marks the rest red.
+    A story_map from prepare_map is drawn as is (tree, layout, center and hops are ignored).
+    Returns the layout used, so callers can keep it for the next incremental redraw.
+    """
     from matplotlib.lines import Line2D
+
+    if story_map is None:
+        story_map = prepare_map(tree, layout, center, hops)
+    G, pos = story_map.graph, story_map.pos
+    choice_edges, linear_edges, edge_labels = story_map.choice_edges, story_map.linear_edges, story_map.edge_labels
+    center, hops = story_map.center, story_map.hops
+    large = len(G) > LARGE_GRAPH
+
+    # Draw nodes
+    if coverage is not None:
+        node_colors = _coverage_colors(coverage["nodes"], list(G.nodes), '#ff9999')
+        choice_colors = _coverage_colors(coverage["edges"], choice_edges, 'red')
+        linear_colors = _coverage_colors(coverage["edges"], linear_edges, 'red')
+    else:
+        node_colors = ['gold' if n == center or (highlight and n in highlight) else 'lightblue' for n in G.nodes]
+        choice_colors, linear_colors = 'gray', 'blue'
+    nx.draw_networkx_nodes(G, pos, ax=ax, node_size=30 if large else 2000,
+                           node_color=node_colors, edgecolors='black')
+    if not large:
+        # Draw labels (ID names inside circles)
+        nx.draw_networkx_labels(G, pos, ax=ax, font_size=10, font_weight="bold")
+
+    # Draw the Edges: choice edges in gray (branching), linear flow blue dashed (auto-advance)
+    # Large maps draw plain line segments, which matplotlib batches into one collection
+    edge_style = dict(arrows=False) if large else dict(arrowstyle='->', arrowsize=20)
+    if choice_edges:
+        nx.draw_networkx_edges(G, pos, ax=ax, edgelist=choice_edges, edge_color=choice_colors,
+                               width=0.5 if large else 2, **edge_style)
+    if linear_edges:
+        nx.draw_networkx_edges(G, pos, ax=ax, edgelist=linear_edges, edge_color=linear_colors,
+                               width=0.5 if large else 2, style='dashed', **edge_style)
+    if not large:
+        # Draw edge labels (Choice text and [auto] markers on the arrows)
+        nx.draw_networkx_edge_labels(G, pos, ax=ax, edge_labels=edge_labels, font_size=8)
+
+    # Add Legend
     legend_elements = [
         Line2D([0], [0], color='gray', linewidth=2, label='Choice (branching)'),
         Line2D([0], [0], color='blue', linewidth=2, linestyle='--', label='Linear flow (auto-advance)')
     ]
-    plt.legend(handles=legend_elements, loc='upper left')
+    if coverage is not None:
+        legend_elements = [
+            Line2D([0], [0], color='green', linewidth=2, label='Played (darker = more often)'),
+            Line2D([0], [0], color='red', linewidth=2, label='Never played'),
+            Line2D([0], [0], color='gray', linewidth=2, linestyle='--', label='Linear flow (auto-advance)')
+        ]
+    ax.legend(handles=legend_elements, loc='upper left')
+    title = "Story Logic Map" if center is None else f"Story Logic Map: {hops} hops around '{center}'"
+    ax.set_title(title)
+    ax.axis('off')  # Hide X/Y axis
+    return story_map.layout
+
+
+def _figure_size(layout, center):
+    if center is not None or not layout.layers:
+        return (12, 8)
+    widest = max(layout.order.values(), default=0) + 1
+    depth = max(layout.layers.values(), default=0) + 1
+    return (min(MAX_FIGURE_INCHES, max(12, widest * 0.3)), min(MAX_FIGURE_INCHES, max(8, depth * 0.4)))
+
+
+def visualize_story(tree, layout=None, center=None, hops=2, coverage=None, story_map=None):
+    """
+    Generates a visual map of the dialogue tree using NetworkX and Matplotlib.
+    Pass the layout returned by the previous call to only re-place what changed;
+    pass center to show only the nodes within `hops` links of it, or a
+    story_map prepared in the background to only draw it.
+    """
+    plt.figure(figsize=(12, 8))  # Window size
+    layout = draw_story(plt.gca(), tree, layout=layout, center=center, hops=hops, coverage=coverage,
+                        story_map=story_map)
+    plt.show()
+    return layout
+
+
+def render_story(tree, output_path, layout=None, center=None, hops=2, dpi=100, coverage=None):
+    """
+    Headless render to SVG/PNG/PDF (format from the file extension), e.g. for CI
+    artifacts. Uses the Agg canvas directly, so no display is needed.
+    """
+    if layout is None:
+        layout = StoryLayout()
+        layout.full_layout(tree)
+    fig = Figure(figsize=_figure_size(layout, center))
+    FigureCanvasAgg(fig)
+    fig.subplots_adjust(left=0.01, right=0.99, bottom=0.01, top=0.95)
+    draw_story(fig.add_subplot(), tree, layout=layout, center=center, hops=hops, coverage=coverage)
+    fig.savefig(output_path, dpi=dpi)
+    return layout
+
+
+if __name__ == "__main__":
+    import argparse
+    import events
+    import narranode as engine
+
+    parser = argparse.ArgumentParser(description="Render a NarraNode story map without a display.")
+    parser.add_argument("story")
+    parser.add_argument("output", help="Image path (.svg, .png or .pdf)")
+    parser.add_argument("--center", help="Only draw the neighborhood of this node")
+    parser.add_argument("--hops", type=int, default=2)
+    parser.add_argument("--no-cache", action="store_true", help="Ignore the cached layout")
+    args = parser.parse_args()
 
-    # 7. Show the Window
-    plt.title("Story Logic Map")
-    plt.axis('off') # Hide X/Y axis
-    plt.show()
\ No newline at end of file
+    events.enable_console()
+    tree = engine.DialogueTree()
+    if not tree.load_from_json(args.story):
+        sys.exit(1)
+    cache_path = layout_cache_path(args.story)
+    layout = StoryLayout() if args.no_cache else StoryLayout.load(cache_path)
+    if layout.layers:
+        layout.update(tree)
+    else:
+        layout.full_layout(tree)
+    render_story(tree, args.output, layout=layout, center=args.center, hops=args.hops)
+    layout.save(cache_path)
+    print(f"[System] Rendered {args.output}")